@@ -0,0 +1,747 @@
+# Prompt Master: Gemini APIとの通信と強化結果のキャッシュ。
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from config_manager import ConfigManager
+from constants import Constants
+from metrics import CallStatus, MetricsStore
+
+logger = logging.getLogger(__name__)
+
+
+def _load_genai():
+    """google.generativeai を初回使用時に読み込みます（grpc/protobufの読み込みに時間がかかるため）。"""
+    import google.generativeai as genai
+
+    return genai
+
+
+class ResponseCache:
+    """強化結果を、リクエスト内容のハッシュをキーにSQLiteへ保存する永続キャッシュです。
+
+    件数と合計サイズに上限を持ち、超えた分は最後に使われた時刻が古いものから削除します。
+    `ttl_seconds` を指定すると、それより古い結果はヒットとして扱いません。
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_entries: int = Constants.Storage.RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = Constants.Storage.RESPONSE_CACHE_MAX_MEGABYTES * 2**20,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used);
+            """
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config_manager: ConfigManager, db_path: Path = Constants.RESPONSE_CACHE_FILE) -> Optional["ResponseCache"]:
+        """cache_settings に従ってキャッシュを作成します。無効化されていればNoneを返します。"""
+        settings = config_manager.config.get("cache_settings", {})
+        if not settings.get("enabled", True):
+            return None
+        ttl_hours = settings.get("ttl_hours") or 0
+        return cls(
+            db_path,
+            max_entries=settings.get("max_entries", Constants.Storage.RESPONSE_CACHE_MAX_ENTRIES),
+            max_bytes=int(settings.get("max_megabytes", Constants.Storage.RESPONSE_CACHE_MAX_MEGABYTES) * 2**20),
+            ttl_seconds=ttl_hours * 3600 if ttl_hours > 0 else None,
+        )
+
+    @staticmethod
+    def make_key(model_name: str, system_prompt: str, user_prompt: str) -> str:
+        """リクエスト内容（モデル・システムプロンプト・接頭辞・ユーザープロンプト）のハッシュを返します。"""
+        payload = json.dumps(
+            [model_name, system_prompt, Constants.USER_PROMPT_PREFIX, user_prompt], ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """キャッシュされた強化結果を返します。なければ（または期限切れなら）Noneを返します。"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model_name: str, response: str):
+        """強化結果を保存し、上限を超えていれば古いものから削除します。"""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, response, size, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        excess_count = max(0, count - self.max_entries)
+        excess_bytes = total - self.max_bytes
+        removed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if excess_count <= 0 and excess_bytes <= 0:
+                break
+            removed.append((key,))
+            excess_count -= 1
+            excess_bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", removed)
+
+    def clear(self):
+        """全てのキャッシュを削除します。"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ContextCache:
+    """システムプロンプトをGeminiのコンテキストキャッシュ (cached content) に登録し、モデルごとに使い回します。
+
+    登録したシステムプロンプトはリクエストごとに送らずに済み、入力トークンのうちその分はキャッシュ済みとして
+    扱われます。登録は `ttl_seconds` で失効するため、失効の少し前に登録し直します。トークン数が下限に
+    満たない・モデルが対応していないなどで登録できなかった組は記録し、以降は通常のリクエストで送ります。
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = Constants.Requests.CONTEXT_CACHE_TTL_SECONDS,
+        refresh_margin: float = Constants.Requests.CONTEXT_CACHE_REFRESH_MARGIN_SECONDS,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = refresh_margin
+        self.registered = 0
+        self.cached_requests = 0
+        self.saved_tokens = 0
+        self.last_error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        # (モデル名, システムプロンプトのハッシュ) -> (登録したキャッシュ, 失効する時刻)
+        self._entries: Dict[Tuple[str, str], Tuple[Any, float]] = {}
+        self._unsupported: Set[Tuple[str, str]] = set()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+    @classmethod
+    def from_config(cls, config_manager: ConfigManager) -> Optional["ContextCache"]:
+        """api_settings.use_context_cache が偽ならNoneを返します。"""
+        if not config_manager.get_setting("api_settings", "use_context_cache", True):
+            return None
+        return cls()
+
+    @staticmethod
+    def _key(model_name: str, system_prompt: str) -> Tuple[str, str]:
+        return model_name, hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+
+    def _current(self, key: Tuple[str, str]) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] - self.refresh_margin > time.monotonic():
+            return entry[0]
+        return None
+
+    def get(self, model_name: str, system_prompt: str) -> Optional[Any]:
+        """登録済みのキャッシュを返します。なければ登録し、登録できなければNoneを返します。"""
+        key = self._key(model_name, system_prompt)
+        with self._lock:
+            if key in self._unsupported:
+                return None
+            cached = self._current(key)
+            if cached is not None:
+                return cached
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # 同じ組を複数のスレッドが同時に登録しないよう、組ごとのロックで登録を1回にする
+        with key_lock:
+            with self._lock:
+                cached = self._current(key)
+                if cached is not None or key in self._unsupported:
+                    return cached
+            try:
+                cached = self._create(model_name, system_prompt)
+            except Exception as e:
+                with self._lock:
+                    self.last_error = e
+                    if self._is_permanent(e):
+                        self._unsupported.add(key)
+                return None
+            with self._lock:
+                self._entries[key] = (cached, time.monotonic() + self.ttl_seconds)
+                self.registered += 1
+            return cached
+
+    def is_valid(self, cached: Any) -> bool:
+        """登録したキャッシュが破棄されておらず、失効間近でもなければTrueを返します。"""
+        with self._lock:
+            return any(self._current(key) is cached for key, entry in self._entries.items() if entry[0] is cached)
+
+    def discard(self, cached: Any, unsupported: bool = False):
+        """キャッシュの登録を破棄します。`unsupported` が真なら、その組は以降登録しません。"""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry[0] is cached:
+                    del self._entries[key]
+                    if unsupported:
+                        self._unsupported.add(key)
+
+    def record(self, cached_tokens: Optional[int]):
+        """1回のリクエストでキャッシュ済みとして扱われた入力トークン数を集計します。"""
+        if cached_tokens:
+            with self._lock:
+                self.cached_requests += 1
+                self.saved_tokens += cached_tokens
+
+    def clear(self, wait: bool = False):
+        """全ての登録を破棄し、サーバー側のキャッシュを削除します。`wait` が偽なら削除はバックグラウンドで行います。"""
+        with self._lock:
+            entries = [entry[0] for entry in self._entries.values()]
+            self._entries.clear()
+            self._unsupported.clear()
+            self._key_locks.clear()
+        if not entries:
+            return
+        if wait:
+            self._delete(entries)
+        else:
+            threading.Thread(target=self._delete, args=(entries,), daemon=True).start()
+
+    def _create(self, model_name: str, system_prompt: str) -> Any:
+        return _load_genai().caching.CachedContent.create(
+            model=model_name,
+            display_name=Constants.APP_TITLE,
+            system_instruction=system_prompt,
+            ttl=datetime.timedelta(seconds=self.ttl_seconds),
+        )
+
+    @staticmethod
+    def _delete(entries: List[Any]):
+        for cached in entries:
+            try:
+                cached.delete()
+            except Exception:
+                # 失効済みなどで削除できなくても、サーバー側で期限が来れば消える
+                pass
+
+    @staticmethod
+    def _is_permanent(error: BaseException) -> bool:
+        """レート制限や一時的な障害でなく、登録し直しても失敗する（トークン数の不足や非対応のモデルなどの）エラーか。"""
+        code = getattr(error, "code", None)
+        return isinstance(code, int) and 400 <= code < 500 and code != 429
+
+
+class FakeUsage:
+    """FakeResponseのトークン数です。4文字を1トークンとして見積もります。"""
+
+    def __init__(self, prompt_text: str, output_text: str):
+        self.prompt_token_count = max(1, len(prompt_text) // 4)
+        self.candidates_token_count = max(1, len(output_text) // 4)
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class FakeResponse:
+    """FakeGenerativeModelが返す応答（またはストリーミングのチャンク）です。"""
+
+    def __init__(self, text: str, usage_metadata: Optional[FakeUsage] = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class ImproveResult:
+    """1回の強化リクエストの結果と、所要時間・トークン数です。トークン数はキャッシュから返した場合などはNoneです。
+
+    `cached_tokens` は入力トークン (`prompt_tokens`) のうち、コンテキストキャッシュから読み込まれた分です。
+    `ttfb_ms` は最初の応答を受け取るまでの時間で、ストリーミングでない場合は `latency_ms` と同じです。
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        text: str,
+        latency_ms: float,
+        prompt_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+        cached: bool = False,
+        cached_tokens: int = 0,
+        ttfb_ms: Optional[float] = None,
+    ):
+        self.model_name = model_name
+        self.text = text
+        self.latency_ms = latency_ms
+        self.ttfb_ms = latency_ms if ttfb_ms is None else ttfb_ms
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+        self.cached = cached
+        self.cached_tokens = cached_tokens
+
+    @classmethod
+    def from_usage(
+        cls, model_name: str, text: str, latency_ms: float, usage: Any, ttfb_ms: Optional[float] = None
+    ) -> "ImproveResult":
+        """APIの応答の usage_metadata からトークン数を読み取ります。"""
+        return cls(
+            model_name,
+            text,
+            latency_ms,
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            output_tokens=getattr(usage, "candidates_token_count", None),
+            cached_tokens=getattr(usage, "cached_content_token_count", None) or 0,
+            ttfb_ms=ttfb_ms,
+        )
+
+    @property
+    def output_chars(self) -> int:
+        return len(self.text)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "latency_ms": round(self.latency_ms, 1),
+            "ttfb_ms": round(self.ttfb_ms, 1),
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "output_chars": self.output_chars,
+            "cached_tokens": self.cached_tokens,
+            "cached": self.cached,
+            "text": self.text,
+        }
+
+
+class FakeGenerativeModel:
+    """Gemini APIを呼び出さずに応答を模倣する、オフライン検証用のモデルです。"""
+
+    DEFAULT_CHUNK_DELAY = 0.05
+    CHUNK_SIZE = 24
+
+    def __init__(
+        self, model_name: str, system_instruction: Optional[str] = None, chunk_delay: float = DEFAULT_CHUNK_DELAY
+    ):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.chunk_delay = chunk_delay
+
+    def _compose(self, contents: List[str]) -> str:
+        user_prompt = contents[-1] if contents else ""
+        return f"# 命令書\n\n（{self.model_name} による疑似応答）\n\n{user_prompt}\n"
+
+    def generate_content(self, contents: List[str], stream: bool = False, request_options: Optional[Dict[str, Any]] = None):
+        text = self._compose(contents)
+        if not stream:
+            time.sleep(self.chunk_delay)
+            return FakeResponse(text, FakeUsage("".join(contents), text))
+        return self._stream(text)
+
+    def _stream(self, text: str) -> Iterator[FakeResponse]:
+        for start in range(0, len(text), self.CHUNK_SIZE):
+            time.sleep(self.chunk_delay)
+            yield FakeResponse(text[start:start + self.CHUNK_SIZE])
+
+
+class ApiService:
+    """Gemini APIとの通信ロジックをカプセル化します。
+
+    `genai.configure` はAPIキーが変わったときだけ実行し、生成モデルは
+    (APIキー, モデル名, システムプロンプト) ごとに生成して使い回します。
+    システムプロンプトはモデルの `system_instruction` として渡すため、
+    リクエストごとに送る内容はユーザープロンプトのみになります。`context_cache` を渡すと、
+    システムプロンプトはサーバー側のコンテキストキャッシュに登録して参照し、登録できなければ
+    `system_instruction` で送ります。
+    config.json の api_settings.api_endpoint を指定すると、RESTでそのエンドポイント（ローカルのスタブなど）に接続します。
+    `metrics` を渡すと、呼び出しごとのトークン数・応答時間・再試行回数・キャッシュヒットを記録します。
+    """
+
+    MODEL_CACHE_SIZE = 8
+    # これらの設定が変わると、キャッシュ済みのモデルを破棄する
+    INVALIDATING_SETTINGS = ("api_key", "api_endpoint", "default_model", "system_prompt", "use_default_system_prompt")
+    # コンテキストキャッシュを参照するリクエストがこれらのステータスで失敗したら、キャッシュを使わずにやり直す
+    CONTEXT_CACHE_ERROR_CODES = (400, 403, 404)
+
+    def __init__(
+        self,
+        config_manager: Optional[ConfigManager] = None,
+        model_factory: Optional[Callable[[str, str], Any]] = None,
+        transport: Optional[str] = None,
+        api_endpoint: Optional[str] = None,
+        response_cache: Optional[ResponseCache] = None,
+        context_cache: Optional[ContextCache] = None,
+        metrics: Optional[MetricsStore] = None,
+    ):
+        self.response_cache = response_cache
+        self.context_cache = context_cache
+        self.metrics = metrics
+        self._model_factory = model_factory
+        if api_endpoint is None and config_manager is not None:
+            api_endpoint = config_manager.get_setting("api_settings", "api_endpoint") or None
+        self._transport = transport or ("rest" if api_endpoint else None)
+        self._api_endpoint = api_endpoint
+        self._lock = threading.Lock()
+        self._configured_key: Optional[str] = None
+        self._models: "OrderedDict[Tuple[str, str, str], Any]" = OrderedDict()
+        # コンテキストキャッシュを参照するモデルのキーと、参照しているキャッシュ
+        self._context_models: Dict[Tuple[str, str, str], Any] = {}
+        self.models_created = 0
+        self._config_manager = config_manager
+        if config_manager is not None:
+            config_manager.subscribe(self._on_setting_changed)
+
+    def close(self):
+        """設定変更の購読を解除し、キャッシュ済みのモデルを破棄します。"""
+        if self._config_manager is not None:
+            self._config_manager.unsubscribe(self._on_setting_changed)
+            self._config_manager = None
+        self.invalidate()
+        if self.context_cache is not None:
+            self.context_cache.clear(wait=True)
+        if self.response_cache is not None:
+            self.response_cache.close()
+        if self.metrics is not None:
+            self.metrics.close()
+
+    def invalidate(self, reset_client: bool = False):
+        """キャッシュ済みのモデルを破棄します。`reset_client` が真なら次回に再設定します。"""
+        with self._lock:
+            self._models.clear()
+            self._context_models.clear()
+            if reset_client:
+                self._configured_key = None
+
+    def _on_setting_changed(self, primary_key: str, secondary_key: str, value: Any):
+        if primary_key == "api_settings" and secondary_key == "api_endpoint":
+            self._api_endpoint = value or None
+            self._transport = "rest" if value else None
+        if primary_key == "api_settings" and secondary_key in self.INVALIDATING_SETTINGS:
+            self.invalidate(reset_client=secondary_key in ("api_key", "api_endpoint"))
+            if self.context_cache is not None and secondary_key != "default_model":
+                # システムプロンプトが変わったら、古いプロンプトの登録を削除して次のリクエストで登録し直す
+                self.context_cache.clear()
+
+    @staticmethod
+    def _validate(api_key: str, user_prompt: str):
+        if not api_key:
+            raise ValueError("APIキーが設定されていません。")
+        if not user_prompt:
+            raise ValueError("「ベースプロンプト」が入力されていません。")
+
+    def _configure(self, api_key: str):
+        """APIキーが前回と異なる場合のみクライアントを設定し直します。"""
+        if self._configured_key == api_key:
+            return
+        options: Dict[str, Any] = {"api_key": api_key}
+        if self._transport:
+            options["transport"] = self._transport
+        if self._api_endpoint:
+            options["client_options"] = {"api_endpoint": self._api_endpoint}
+        _load_genai().configure(**options)
+        self._configured_key = api_key
+        self._models.clear()
+
+    def _uses_fake_model(self) -> bool:
+        return self._model_factory is not None or bool(os.environ.get(Constants.FAKE_API_ENV))
+
+    def _create_model(self, api_key: str, model_name: str, system_prompt: str, cached_content: Any = None):
+        """生成モデルを作成します。環境変数で疑似モデルが指定されていればそちらを返します。"""
+        if self._model_factory is not None:
+            return self._model_factory(model_name, system_prompt)
+        fake_setting = os.environ.get(Constants.FAKE_API_ENV)
+        if fake_setting:
+            try:
+                return FakeGenerativeModel(model_name, system_prompt, chunk_delay=float(fake_setting))
+            except ValueError:
+                return FakeGenerativeModel(model_name, system_prompt)
+        self._configure(api_key)
+        if cached_content is not None:
+            return _load_genai().GenerativeModel.from_cached_content(cached_content)
+        return _load_genai().GenerativeModel(model_name, system_instruction=system_prompt or None)
+
+    def _context_for(self, api_key: str, model_name: str, system_prompt: str) -> Any:
+        """システムプロンプトのコンテキストキャッシュを返します。使わない・登録できない場合はNoneです。
+
+        登録はAPI呼び出しを伴うため、モデルのキャッシュのロックの外で行います。
+        """
+        if self.context_cache is None or not system_prompt or self._uses_fake_model():
+            return None
+        with self._lock:
+            self._configure(api_key)
+        return self.context_cache.get(model_name, system_prompt)
+
+    def get_model(self, api_key: str, model_name: str, system_prompt: str):
+        """キャッシュ済みの生成モデルを返します。なければ作成してキャッシュします。
+
+        コンテキストキャッシュを参照するモデルは、キャッシュが失効間近になると作り直します。
+        """
+        key = (api_key, model_name, system_prompt)
+        with self._lock:
+            model = self._cached_model(key)
+            if model is not None:
+                return model
+        cached_content = self._context_for(api_key, model_name, system_prompt)
+        with self._lock:
+            model = self._cached_model(key)
+            if model is not None:
+                return model
+            model = self._create_model(api_key, model_name, system_prompt, cached_content)
+            self.models_created += 1
+            self._models[key] = model
+            if cached_content is not None:
+                self._context_models[key] = cached_content
+            while len(self._models) > self.MODEL_CACHE_SIZE:
+                evicted, _ = self._models.popitem(last=False)
+                self._context_models.pop(evicted, None)
+            return model
+
+    def _cached_model(self, key: Tuple[str, str, str]) -> Any:
+        model = self._models.get(key)
+        if model is None:
+            return None
+        cached_content = self._context_models.get(key)
+        if cached_content is not None and not self.context_cache.is_valid(cached_content):
+            del self._models[key]
+            del self._context_models[key]
+            return None
+        self._models.move_to_end(key)
+        return model
+
+    def _generate(
+        self, api_key: str, model_name: str, system_prompt: str, user_prompt: str, stream: bool, timeout: Optional[float]
+    ):
+        """モデルにリクエストします。参照したコンテキストキャッシュが使えなければ、キャッシュを使わずにやり直します。"""
+        key = (api_key, model_name, system_prompt)
+        contents = [Constants.USER_PROMPT_PREFIX, user_prompt]
+        model = self.get_model(api_key, model_name, system_prompt)
+        try:
+            return model.generate_content(contents, stream=stream, request_options=self._request_options(timeout))
+        except Exception as e:
+            with self._lock:
+                cached_content = self._context_models.get(key) if self._models.get(key) is model else None
+            code = getattr(e, "code", None)
+            if cached_content is None or code not in self.CONTEXT_CACHE_ERROR_CODES:
+                raise
+            # 失効したキャッシュ (404) は次回に登録し直し、それ以外は以降このモデルでは使わない
+            self.context_cache.discard(cached_content, unsupported=code != 404)
+            with self._lock:
+                self._models.pop(key, None)
+                self._context_models.pop(key, None)
+        model = self.get_model(api_key, model_name, system_prompt)
+        return model.generate_content(contents, stream=stream, request_options=self._request_options(timeout))
+
+    def _record_usage(self, result: ImproveResult, attempt: int, streaming: bool):
+        if self.context_cache is not None:
+            self.context_cache.record(result.cached_tokens)
+        if self.metrics is not None:
+            self._record_metrics(
+                result.model_name,
+                CallStatus.OK,
+                result.latency_ms,
+                attempt,
+                streaming,
+                ttfb_ms=result.ttfb_ms,
+                prompt_tokens=result.prompt_tokens,
+                output_tokens=result.output_tokens,
+                cached_tokens=result.cached_tokens,
+                cache_hit=result.cached,
+            )
+
+    def _record_failure(
+        self,
+        model_name: str,
+        status: str,
+        started_at: float,
+        attempt: int,
+        streaming: bool,
+        error: Optional[BaseException] = None,
+        ttfb_ms: Optional[float] = None,
+    ):
+        if self.metrics is None:
+            return
+        message = None
+        if error is not None:
+            code = getattr(error, "code", None)
+            message = f"{code} {type(error).__name__}" if isinstance(code, int) else type(error).__name__
+        latency_ms = (time.perf_counter() - started_at) * 1000
+        self._record_metrics(model_name, status, latency_ms, attempt, streaming, ttfb_ms=ttfb_ms, error=message)
+
+    def _record_metrics(self, model_name: str, status: str, latency_ms: float, attempt: int, streaming: bool, **fields):
+        try:
+            self.metrics.record(model_name, status, latency_ms, retries=attempt - 1, streaming=streaming, **fields)
+        except sqlite3.Error as e:
+            # 計測値を記録できなくても強化自体は失敗させない
+            logger.warning("計測値の記録に失敗しました: %s", e)
+
+    def cached_response(self, model_name: str, system_prompt: str, user_prompt: str) -> Optional[str]:
+        """同じリクエストの強化結果がキャッシュにあれば返します。ヒットは計測値にも記録します。"""
+        if self.response_cache is None or not user_prompt:
+            return None
+        started_at = time.perf_counter()
+        cached = self.response_cache.get(ResponseCache.make_key(model_name, system_prompt, user_prompt))
+        if cached is not None and self.metrics is not None:
+            latency_ms = (time.perf_counter() - started_at) * 1000
+            self._record_metrics(model_name, CallStatus.OK, latency_ms, 1, False, cache_hit=True)
+        return cached
+
+    def _store_response(self, model_name: str, system_prompt: str, user_prompt: str, result_text: str):
+        if self.response_cache is not None and result_text:
+            key = ResponseCache.make_key(model_name, system_prompt, user_prompt)
+            self.response_cache.put(key, model_name, result_text)
+
+    @staticmethod
+    def _request_options(timeout: Optional[float]) -> Optional[Dict[str, Any]]:
+        """タイムアウトを指定した呼び出しのオプションです。再試行は呼び出し側に任せ、クライアントの自動再試行は無効にします。"""
+        if timeout is None:
+            return None
+        return {"timeout": timeout, "retry": None}
+
+    def improve_prompt(
+        self,
+        api_key: str,
+        model_name: str,
+        system_prompt: str,
+        user_prompt: str,
+        force_refresh: bool = False,
+        timeout: Optional[float] = None,
+        attempt: int = 1,
+    ) -> str:
+        """APIにプロンプト強化をリクエストし、結果を返します。
+
+        キャッシュに同じリクエストの結果があればAPIを呼び出さずに返します。
+        `force_refresh` が真ならキャッシュを参照せずに再生成し、結果でキャッシュを更新します。
+        `timeout` (秒) を指定すると、応答がなければ例外を送出します。
+        `attempt` は呼び出し側で再試行している場合の試行回数で、計測値の再試行回数として記録します。
+        """
+        return self.improve_prompt_detailed(
+            api_key, model_name, system_prompt, user_prompt, force_refresh=force_refresh, timeout=timeout,
+            attempt=attempt,
+        ).text
+
+    def improve_prompt_detailed(
+        self,
+        api_key: str,
+        model_name: str,
+        system_prompt: str,
+        user_prompt: str,
+        force_refresh: bool = False,
+        timeout: Optional[float] = None,
+        attempt: int = 1,
+    ) -> ImproveResult:
+        """`improve_prompt` と同じリクエストを行い、結果を所要時間とトークン数とともに返します。"""
+        self._validate(api_key, user_prompt)
+        started_at = time.perf_counter()
+        if not force_refresh:
+            cached = self.cached_response(model_name, system_prompt, user_prompt)
+            if cached is not None:
+                return ImproveResult(model_name, cached, (time.perf_counter() - started_at) * 1000, cached=True)
+        try:
+            response = self._generate(api_key, model_name, system_prompt, user_prompt, False, timeout)
+            result_text = response.text.strip()
+        except Exception as e:
+            self._record_failure(model_name, CallStatus.ERROR, started_at, attempt, False, error=e)
+            raise
+        latency_ms = (time.perf_counter() - started_at) * 1000
+        self._store_response(model_name, system_prompt, user_prompt, result_text)
+        result = ImproveResult.from_usage(model_name, result_text, latency_ms, getattr(response, "usage_metadata", None))
+        self._record_usage(result, attempt, streaming=False)
+        return result
+
+    def improve_prompt_stream(
+        self,
+        api_key: str,
+        model_name: str,
+        system_prompt: str,
+        user_prompt: str,
+        cancel_event: Optional[threading.Event] = None,
+        force_refresh: bool = False,
+        timeout: Optional[float] = None,
+        on_result: Optional[Callable[[ImproveResult], None]] = None,
+        attempt: int = 1,
+    ) -> Iterator[str]:
+        """APIにプロンプト強化をリクエストし、生成されたテキストを届いた順にチャンク単位で返します。
+
+        `cancel_event` がセットされると、次のチャンクを受け取った時点で打ち切ります。
+        キャッシュにヒットした場合は結果全体を1チャンクで返し、最後まで受信できた結果のみキャッシュします。
+        最後まで受信できると、所要時間とトークン数を `on_result(result)` で渡します。
+        途中で打ち切られた・失敗した呼び出しも計測値として記録します。
+        """
+        self._validate(api_key, user_prompt)
+        started_at = time.perf_counter()
+        if not force_refresh:
+            cached = self.cached_response(model_name, system_prompt, user_prompt)
+            if cached is not None:
+                yield cached
+                if on_result is not None:
+                    on_result(ImproveResult(model_name, cached, (time.perf_counter() - started_at) * 1000, cached=True))
+                return
+        received: List[str] = []
+        usage = None
+        ttfb_ms: Optional[float] = None
+        try:
+            for chunk in self._generate(api_key, model_name, system_prompt, user_prompt, True, timeout):
+                if ttfb_ms is None:
+                    ttfb_ms = (time.perf_counter() - started_at) * 1000
+                if cancel_event is not None and cancel_event.is_set():
+                    self._record_failure(model_name, CallStatus.CANCELLED, started_at, attempt, True, ttfb_ms=ttfb_ms)
+                    return
+                # トークン数は最後のチャンクに全体の集計が入る
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                text = chunk.text
+                if text:
+                    received.append(text)
+                    yield text
+        except GeneratorExit:
+            self._record_failure(model_name, CallStatus.CANCELLED, started_at, attempt, True, ttfb_ms=ttfb_ms)
+            raise
+        except Exception as e:
+            self._record_failure(model_name, CallStatus.ERROR, started_at, attempt, True, error=e, ttfb_ms=ttfb_ms)
+            raise
+        result_text = "".join(received).strip()
+        self._store_response(model_name, system_prompt, user_prompt, result_text)
+        latency_ms = (time.perf_counter() - started_at) * 1000
+        result = ImproveResult.from_usage(model_name, result_text, latency_ms, usage, ttfb_ms=ttfb_ms)
+        self._record_usage(result, attempt, streaming=True)
+        if on_result is not None:
+            on_result(result)
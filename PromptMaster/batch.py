@@ -0,0 +1,318 @@
+# Prompt Master: 多数のプロンプトの一括強化。
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from api_service import ApiService
+from config_manager import ConfigManager
+from constants import Constants
+from persistence import atomic_open
+from scheduler import RequestScheduler, backoff_delay
+from storage import PromptStorageManager
+
+
+class RateLimiter:
+    """1分あたりのリクエスト数を制限するトークンバケットです。スレッドセーフです。"""
+
+    _shared: Dict[str, "RateLimiter"] = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def for_model(cls, model_name: str, requests_per_minute: float) -> "RateLimiter":
+        """モデルごとに共有されるレートリミッターを返します。"""
+        with cls._shared_lock:
+            limiter = cls._shared.get(model_name)
+            if limiter is None or limiter.capacity != max(1.0, float(requests_per_minute)):
+                limiter = cls._shared[model_name] = cls(requests_per_minute)
+            return limiter
+
+    def __init__(self, requests_per_minute: float):
+        self.capacity = max(1.0, float(requests_per_minute))
+        self.rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cancel_event: Optional[threading.Event] = None) -> bool:
+        """リクエスト1回分の枠が空くまで待ちます。待機中に中止された場合はFalseを返します。"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return True
+                wait = (1.0 - self._tokens) / self.rate
+            if cancel_event is None:
+                time.sleep(wait)
+            elif cancel_event.wait(wait):
+                return False
+
+
+class BatchItem:
+    """一括強化の対象となる1件のベースプロンプトです。"""
+
+    def __init__(self, original: str, prompt_id: Optional[str] = None):
+        self.original = original
+        # セーブ済みプロンプトを再強化する場合はそのID（結果は上書き保存される）
+        self.prompt_id = prompt_id
+
+    def key(self, model_name: str, system_prompt: str) -> str:
+        """再開時に同じ入力を識別するためのキーを返します。"""
+        payload = json.dumps([model_name, system_prompt, self.prompt_id, self.original], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class BatchReport:
+    """一括強化の進捗と結果の集計です。"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.succeeded = 0
+        self.skipped = 0
+        self.failures: List[Tuple[BatchItem, str]] = []
+        self.cancelled = False
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + self.skipped + len(self.failures)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def throughput_per_minute(self) -> float:
+        """スキップした分を除いた、1分あたりの処理件数です。"""
+        completed = self.succeeded + len(self.failures)
+        return completed * 60.0 / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        text = (
+            f"成功 {self.succeeded} / 失敗 {len(self.failures)} / スキップ {self.skipped} "
+            f"({self.elapsed:.1f} 秒, {self.throughput_per_minute:.1f} 件/分)"
+        )
+        return f"{text} - 中止しました" if self.cancelled else text
+
+
+def read_batch_inputs(lines: Iterable[str]) -> List[BatchItem]:
+    """一括強化の入力を読み込みます。
+
+    各行はJSON（文字列、または "original"/"prompt" を持つオブジェクト）か、1行1件のテキストです。
+    JSONとして解釈できない行はそのままベースプロンプトとして扱い、空行は無視します。
+    """
+    items = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            data = line
+        if isinstance(data, dict):
+            original = data.get("original") or data.get("prompt") or ""
+            prompt_id = data.get("id")
+        else:
+            original, prompt_id = str(data), None
+        if original.strip():
+            items.append(BatchItem(original.strip(), prompt_id))
+    return items
+
+
+class BatchImprover:
+    """多数のベースプロンプトを、同時実行数とモデルごとのレート制限を守って強化します。
+
+    1回の呼び出しは `timeout` 秒で打ち切り、レート制限 (429) やサーバーエラー (5xx)、接続の失敗は
+    `RequestScheduler` と同じ条件で、指数バックオフを挟んで `max_retries` 回まで再試行します。
+
+    APIの呼び出しはワーカースレッドで行い、結果の保存 (`sink`) は `run()` を呼んだ
+    スレッドで完了した順に行います。処理状況は `state_path` にJSON Linesで追記され、
+    中断後に同じ入力で再実行すると完了済みの項目はスキップされます。
+    """
+
+    def __init__(
+        self,
+        api_service: ApiService,
+        api_key: str,
+        model_name: str,
+        system_prompt: str,
+        sink: Callable[[BatchItem, str], None],
+        state_path: Optional[Path] = None,
+        max_workers: int = Constants.Batch.MAX_WORKERS,
+        rate_limiter: Optional[RateLimiter] = None,
+        force_refresh: bool = False,
+        timeout: Optional[float] = Constants.Requests.TIMEOUT_SECONDS,
+        max_retries: int = Constants.Requests.MAX_RETRIES,
+    ):
+        self.api_service = api_service
+        self.api_key = api_key
+        self.model_name = model_name
+        self.system_prompt = system_prompt
+        self.sink = sink
+        self.state_path = state_path
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = rate_limiter
+        self.force_refresh = force_refresh
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.max_retries = max(0, max_retries)
+        self.cancel_event = threading.Event()
+
+    @classmethod
+    def from_config(
+        cls,
+        config_manager: ConfigManager,
+        api_service: ApiService,
+        sink: Callable[[BatchItem, str], None],
+        model_name: Optional[str] = None,
+        state_path: Optional[Path] = Constants.BATCH_STATE_FILE,
+        force_refresh: bool = False,
+    ) -> "BatchImprover":
+        """config.json の api_settings と batch_settings に従って作成します。
+
+        タイムアウトと再試行回数は、対話的な強化と同じ api_settings の値を使います。
+        """
+        model_name = model_name or config_manager.get_setting("api_settings", "default_model")
+        settings = config_manager.config.get("batch_settings", {})
+        requests_per_minute = settings.get("requests_per_minute", {}).get(
+            model_name, settings.get("default_requests_per_minute", Constants.Batch.REQUESTS_PER_MINUTE)
+        )
+        return cls(
+            api_service,
+            config_manager.get_setting("api_settings", "api_key"),
+            model_name,
+            config_manager.get_active_system_prompt(),
+            sink,
+            state_path=state_path,
+            max_workers=settings.get("max_workers", Constants.Batch.MAX_WORKERS),
+            rate_limiter=RateLimiter.for_model(model_name, requests_per_minute),
+            force_refresh=force_refresh,
+            timeout=config_manager.get_setting(
+                "api_settings", "request_timeout_seconds", Constants.Requests.TIMEOUT_SECONDS
+            ),
+            max_retries=config_manager.get_setting("api_settings", "max_retries", Constants.Requests.MAX_RETRIES),
+        )
+
+    @staticmethod
+    def storage_sink(storage: PromptStorageManager) -> Callable[[BatchItem, str], None]:
+        """結果をプロンプトストレージへ保存するsinkを返します。IDのある項目は上書きします。"""
+
+        def sink(item: BatchItem, improved: str):
+            if item.prompt_id and storage.get_prompt_by_id(item.prompt_id):
+                storage.update_prompt(item.prompt_id, item.original, improved)
+            else:
+                storage.add_prompt(item.original, improved)
+
+        return sink
+
+    def cancel(self):
+        """未着手の項目を打ち切ります。実行中のリクエストは完了を待ちます。"""
+        self.cancel_event.set()
+
+    def _read_state(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """状態ファイルの行と、その記録を順に返します。書き込み途中で中断された行は飛ばします。"""
+        if not self.state_path or not self.state_path.exists():
+            return
+        with self.state_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict):
+                    yield line, record
+
+    def _load_completed_keys(self) -> Set[str]:
+        return {record.get("key") for _, record in self._read_state() if record.get("status") == "done"}
+
+    def _discard_state(self, keys: Set[str]):
+        """状態ファイルから `keys` の記録を取り除きます。
+
+        状態ファイルは全ての一括強化で共有するため、中断した別の入力の記録は残します。
+        残る記録がなければファイルを削除します。
+        """
+        remaining = [line for line, record in self._read_state() if record.get("key") not in keys]
+        if remaining:
+            with atomic_open(self.state_path) as f:
+                f.writelines(remaining)
+        elif self.state_path and self.state_path.exists():
+            self.state_path.unlink()
+
+    def _improve(self, item: BatchItem) -> str:
+        attempt = 1
+        while True:
+            if self.rate_limiter is not None and not self.rate_limiter.acquire(self.cancel_event):
+                raise InterruptedError("中止されました。")
+            if self.cancel_event.is_set():
+                raise InterruptedError("中止されました。")
+            try:
+                return self.api_service.improve_prompt(
+                    self.api_key, self.model_name, self.system_prompt, item.original,
+                    force_refresh=self.force_refresh, timeout=self.timeout, attempt=attempt,
+                )
+            except Exception as e:
+                if attempt > self.max_retries or not RequestScheduler.is_retryable(e):
+                    raise
+            if self.cancel_event.wait(backoff_delay(attempt)):
+                raise InterruptedError("中止されました。")
+            attempt += 1
+
+    def run(
+        self, items: Sequence[BatchItem], on_progress: Optional[Callable[[BatchReport], None]] = None
+    ) -> BatchReport:
+        """全項目を処理し、集計結果を返します。全件成功した場合は、この入力の再開用の記録を状態ファイルから削除します。"""
+        report = BatchReport(len(items))
+        completed_keys = self._load_completed_keys()
+        pending = []
+        for item in items:
+            if item.key(self.model_name, self.system_prompt) in completed_keys:
+                report.skipped += 1
+            else:
+                pending.append(item)
+        state_file = self.state_path.open("a", encoding="utf-8") if self.state_path else None
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {executor.submit(self._improve, item): item for item in pending}
+            for future in as_completed(futures):
+                item = futures[future]
+                record = {"key": item.key(self.model_name, self.system_prompt)}
+                try:
+                    improved = future.result()
+                    self.sink(item, improved)
+                    report.succeeded += 1
+                    record["status"] = "done"
+                except InterruptedError:
+                    report.cancelled = True
+                    continue
+                except Exception as e:
+                    message = str(e).splitlines()[0] if str(e) else type(e).__name__
+                    report.failures.append((item, message))
+                    record.update(status="failed", error=message)
+                if state_file is not None:
+                    state_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    state_file.flush()
+                if on_progress is not None:
+                    on_progress(report)
+        except BaseException:
+            # Ctrl-C などで中断された場合は、未着手の項目を実行せず、実行中の呼び出しも待たずに戻る
+            self.cancel_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        else:
+            executor.shutdown()
+        finally:
+            if state_file is not None:
+                state_file.close()
+            report.finished_at = time.perf_counter()
+        report.cancelled = report.cancelled or self.cancel_event.is_set()
+        if self.state_path and not report.failures and not report.cancelled:
+            self._discard_state({item.key(self.model_name, self.system_prompt) for item in items})
+        return report
@@ -0,0 +1,606 @@
+# Prompt Master: GUIを使わずにプロンプトの強化・管理を行うコマンドラインツール。
+#
+# 使い方:
+#     python PromptMaster/cli.py improve "ブログ記事を書いて"
+#     python PromptMaster/cli.py compare "ブログ記事を書いて" --models gemini-2.5-flash gemini-2.5-pro
+#     python PromptMaster/cli.py list --limit 20
+#     python PromptMaster/cli.py search 命令書
+#     python PromptMaster/cli.py export library.jsonl.gz
+#     python PromptMaster/cli.py import library.jsonl.gz
+#     python PromptMaster/cli.py batch prompts.txt
+#     python PromptMaster/cli.py stats --days 7
+#     python PromptMaster/cli.py stats --export metrics.csv
+#     python PromptMaster/cli.py history PROMPT_ID --diff 1 3
+#     python PromptMaster/cli.py similar PROMPT_ID
+#     python PromptMaster/cli.py dedupe --threshold 0.8
+#     python PromptMaster/cli.py template save blog template.txt
+#     python PromptMaster/cli.py template render blog variables.csv --output prompts.jsonl
+#
+# customtkinter と google.generativeai はここでは読み込まない（後者はAPIを呼ぶコマンドでのみ読み込まれる）ため、
+# ディスプレイのない環境でも動作し、list などは短時間で起動します。
+
+import argparse
+import json
+import sys
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+from config_manager import ConfigManager, get_base_path
+from constants import Constants
+from storage import PromptStorageManager, create_prompt_storage
+
+if TYPE_CHECKING:
+    from batch import BatchItem
+
+
+def _read_text(value: str) -> str:
+    """引数の値を返します。`-` なら標準入力の内容を返します。"""
+    return sys.stdin.read() if value == "-" else value
+
+
+def _print_prompts(prompts: Iterable[Dict[str, Any]], as_json: bool):
+    for prompt in prompts:
+        if as_json:
+            print(json.dumps(prompt, ensure_ascii=False))
+        else:
+            favorite = Constants.Icons.FAVORITE_FILLED if prompt.get("favorite") else " "
+            print(f"{prompt.get('id', '')}\t{prompt.get('timestamp', '')}\t{favorite}\t{prompt.get('title', '')}")
+
+
+def _create_api_service(config_manager: ConfigManager, use_cache: bool = True):
+    from api_service import ApiService, ContextCache, ResponseCache
+    from metrics import MetricsStore
+
+    response_cache = ResponseCache.from_config(config_manager) if use_cache else None
+    return ApiService(
+        config_manager,
+        response_cache=response_cache,
+        context_cache=ContextCache.from_config(config_manager),
+        metrics=MetricsStore.from_config(config_manager),
+    )
+
+
+def cmd_improve(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    user_prompt = _read_text(args.prompt).strip()
+    api_service = _create_api_service(config_manager)
+    try:
+        model_name = args.model or config_manager.get_setting("api_settings", "default_model")
+        result = api_service.improve_prompt_detailed(
+            config_manager.get_setting("api_settings", "api_key"),
+            model_name,
+            config_manager.get_active_system_prompt(),
+            user_prompt,
+            force_refresh=args.force_refresh,
+        )
+    finally:
+        api_service.close()
+    result_text = result.text
+    print(result_text)
+    if result.cached_tokens and result.prompt_tokens:
+        print(f"入力 {result.prompt_tokens:,} トークンのうち {result.cached_tokens:,} はキャッシュ済みです。", file=sys.stderr)
+    if args.save:
+        storage = create_prompt_storage(config_manager, get_base_path())
+        try:
+            if not storage.add_prompt(user_prompt, result_text):
+                print("このプロンプトは既にセーブ済みです。", file=sys.stderr)
+        finally:
+            storage.close()
+    return 0
+
+
+def cmd_compare(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    from comparison import ModelComparison, describe_result
+    from scheduler import JobStatus, RequestScheduler
+
+    user_prompt = _read_text(args.prompt).strip()
+    model_names = args.models or config_manager.get_setting("api_settings", "available_models", [])
+    if args.save and args.save not in model_names:
+        raise ValueError(f"--save のモデル {args.save} が比較対象に含まれていません。")
+    api_service = _create_api_service(config_manager)
+    scheduler = RequestScheduler.from_config(config_manager)
+    scheduler.max_workers = max(scheduler.max_workers, len(model_names))
+    comparison = ModelComparison(scheduler, api_service)
+    try:
+        comparison.start(
+            config_manager.get_setting("api_settings", "api_key"),
+            model_names,
+            config_manager.get_active_system_prompt(),
+            user_prompt,
+            force_refresh=args.force_refresh,
+        )
+        try:
+            comparison.wait()
+        except KeyboardInterrupt:
+            comparison.cancel()
+            raise
+    finally:
+        scheduler.shutdown()
+        api_service.close()
+    for model_name, job in comparison.jobs.items():
+        if args.json:
+            record = job.result.to_dict() if job.status == JobStatus.DONE else {"model": model_name}
+            record["status"] = job.status
+            if job.status != JobStatus.DONE:
+                record["error"] = str(job.error)
+            print(json.dumps(record, ensure_ascii=False))
+        else:
+            print(f"=== {model_name} ({describe_result(job)})")
+            if job.status == JobStatus.DONE:
+                print(job.result.text)
+            print()
+    print(comparison.summary(), file=sys.stderr)
+    if args.save:
+        result = comparison.result(args.save)
+        if result is None:
+            raise ValueError(f"{args.save} の強化に失敗したため保存できません。")
+        storage = create_prompt_storage(config_manager, get_base_path())
+        try:
+            if not storage.add_prompt(user_prompt, result.text):
+                print("このプロンプトは既にセーブ済みです。", file=sys.stderr)
+        finally:
+            storage.close()
+    return 0 if comparison.results() else 1
+
+
+def cmd_list(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    storage = create_prompt_storage(config_manager, get_base_path())
+    try:
+        _print_prompts(storage.list_prompts(args.offset, args.limit, args.order), args.json)
+    finally:
+        storage.close()
+    return 0
+
+
+def cmd_search(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    storage = create_prompt_storage(config_manager, get_base_path())
+    try:
+        _print_prompts(storage.search(args.query, limit=args.limit), args.json)
+    finally:
+        storage.close()
+    return 0
+
+
+def cmd_similar(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    """内容の似たプロンプトを、推定類似度の高い順に表示します。"""
+    storage = create_prompt_storage(config_manager, get_base_path())
+    try:
+        if storage.get_prompt_by_id(args.prompt_id) is None:
+            raise ValueError(f"プロンプト {args.prompt_id} はありません。")
+        storage.build_similarity_index(background=False)
+        for prompt, score in storage.find_similar(args.prompt_id, args.threshold, args.limit):
+            if args.json:
+                print(json.dumps(dict(prompt, similarity=round(score, 3)), ensure_ascii=False))
+            else:
+                print(f"{score:.2f}\t{prompt['id']}\t{prompt.get('timestamp', '')}\t{prompt.get('title', '')}")
+    finally:
+        storage.close()
+    return 0
+
+
+def cmd_dedupe(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    """ほぼ重複するプロンプトのグループを、件数の多い順に一覧するレポートを表示します。"""
+    storage = create_prompt_storage(config_manager, get_base_path())
+    try:
+        groups = storage.near_duplicate_groups(args.threshold)
+    finally:
+        storage.close()
+    for number, group in enumerate(groups, 1):
+        if args.json:
+            members = [{"id": p["id"], "title": p.get("title", ""), "similarity": round(score, 3)} for p, score in group]
+            print(json.dumps({"group": number, "prompts": members}, ensure_ascii=False))
+            continue
+        print(f"# グループ {number} ({len(group)} 件)")
+        for prompt, score in group:
+            print(f"{score:.2f}\t{prompt['id']}\t{prompt.get('timestamp', '')}\t{prompt.get('title', '')}")
+    duplicates = sum(len(group) - 1 for group in groups)
+    print(f"{len(groups)} グループ、削除候補 {duplicates} 件（各グループの先頭が最新）", file=sys.stderr)
+    return 0
+
+
+def _library_format(args: argparse.Namespace) -> Optional[str]:
+    """--format の指定がなければ拡張子から判定します。標準入出力は従来どおり saved_prompts.json 形式です。"""
+    from library_io import FORMAT_JSON
+
+    return args.format or (FORMAT_JSON if args.file == "-" else None)
+
+
+def cmd_export(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    from library_io import export_library
+
+    storage = create_prompt_storage(config_manager, get_base_path())
+    try:
+        count = export_library(storage, args.file, _library_format(args))
+    finally:
+        storage.close()
+    print(f"{count} 件をエクスポートしました。", file=sys.stderr)
+    return 0
+
+
+def cmd_import(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    from library_io import import_library
+
+    storage = create_prompt_storage(config_manager, get_base_path())
+    try:
+        report = import_library(storage, args.file, _library_format(args))
+    finally:
+        storage.close()
+    print(report.summary(), file=sys.stderr)
+    return 0
+
+
+def cmd_batch(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    """一括強化を実行し、結果をプロンプトストレージへ保存します。"""
+    from batch import read_batch_inputs
+
+    if args.file == "-":
+        items = read_batch_inputs(sys.stdin)
+    else:
+        with open(args.file, "r", encoding="utf-8") as f:
+            items = read_batch_inputs(f)
+    return _run_batch(args, config_manager, items)
+
+
+def _run_batch(args: argparse.Namespace, config_manager: ConfigManager, items: List["BatchItem"]) -> int:
+    from batch import BatchImprover, BatchReport
+
+    storage = create_prompt_storage(config_manager, get_base_path())
+    api_service = _create_api_service(config_manager)
+    batch = BatchImprover.from_config(
+        config_manager,
+        api_service,
+        BatchImprover.storage_sink(storage),
+        model_name=args.model,
+        force_refresh=args.force_refresh,
+    )
+    if args.workers:
+        batch.max_workers = args.workers
+
+    def print_progress(report: BatchReport):
+        print(f"\r{report.processed}/{report.total} (失敗 {len(report.failures)})", end="", file=sys.stderr, flush=True)
+
+    try:
+        report = batch.run(items, on_progress=print_progress)
+    except KeyboardInterrupt:
+        batch.cancel()
+        print("\n中断しました。同じ入力で再実行すると続きから処理します。", file=sys.stderr)
+        return 130
+    finally:
+        storage.close()
+        api_service.close()
+    print(file=sys.stderr)
+    for item, error in report.failures:
+        print(f"失敗: {PromptStorageManager.make_title(item.original)}: {error}", file=sys.stderr)
+    print(report.summary())
+    return 1 if report.failures else 0
+
+
+def cmd_history(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    """プロンプトの版の一覧・指定した版の本文・2つの版の差分を表示します。"""
+    from revisions import RevisionStore
+
+    store = RevisionStore(get_base_path() / Constants.REVISIONS_FILE)
+    try:
+        if args.diff:
+            sys.stdout.writelines(store.diff(args.prompt_id, args.diff[0], args.diff[1], args.field))
+            return 0
+        if args.show is not None:
+            revision = store.get(args.prompt_id, args.show)
+            if revision is None:
+                raise ValueError(f"版 {args.show} はありません。")
+            print(json.dumps(revision.to_dict(), ensure_ascii=False) if args.json else getattr(revision, args.field))
+            return 0
+        infos = store.list_revisions(args.prompt_id)
+    finally:
+        store.close()
+    if not infos:
+        print("このプロンプトの履歴はありません。", file=sys.stderr)
+    for info in infos:
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(info.created_at))
+        kind = "snapshot" if info.snapshot else "delta"
+        print(f"{info.number}\t{created}\t{kind}\t{info.size}\t{info.stored_bytes}")
+    return 0
+
+
+def _open_templates():
+    from templates import TemplateStore
+
+    return TemplateStore(get_base_path() / Constants.TEMPLATES_FILE)
+
+
+def _get_template(store, name: str):
+    template = store.get(name)
+    if template is None:
+        raise ValueError(f"テンプレート {name} はありません。")
+    return template
+
+
+def cmd_template_save(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    if args.file == "-":
+        text = sys.stdin.read()
+    else:
+        with open(args.file, "r", encoding="utf-8") as f:
+            text = f.read()
+    store = _open_templates()
+    try:
+        template = store.save(args.name, text.strip())
+    finally:
+        store.close()
+    print(f"テンプレート {args.name} を保存しました（変数: {', '.join(template.variables)}）。", file=sys.stderr)
+    return 0
+
+
+def cmd_template_list(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    store = _open_templates()
+    try:
+        templates = store.list_templates()
+    finally:
+        store.close()
+    for info in templates:
+        if args.json:
+            print(json.dumps(info, ensure_ascii=False))
+        else:
+            print(f"{info['name']}\t{info['updated_at']}\t{info['size']}\t{', '.join(info['variables'])}")
+    return 0
+
+
+def cmd_template_show(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    store = _open_templates()
+    try:
+        print(_get_template(store, args.name).text)
+    finally:
+        store.close()
+    return 0
+
+
+def cmd_template_delete(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    store = _open_templates()
+    try:
+        if not store.delete(args.name):
+            raise ValueError(f"テンプレート {args.name} はありません。")
+    finally:
+        store.close()
+    print(f"テンプレート {args.name} を削除しました。", file=sys.stderr)
+    return 0
+
+
+def cmd_template_render(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    """変数の組のファイルを1件ずつ読みながらテンプレートを展開し、JSON Linesで書き出すか一括強化します。
+
+    書き出す各行は {"prompt": 展開したテキスト, "variables": 変数の組} で、そのまま batch の入力に使えます。
+    """
+    from library_io import open_library
+    from templates import detect_variables_format, read_variable_sets, render_all
+
+    store = _open_templates()
+    try:
+        template = _get_template(store, args.name)
+    finally:
+        store.close()
+    fmt = args.format or detect_variables_format(args.variables)
+    skipped = []
+
+    def on_error(number, error):
+        skipped.append(number)
+        print(f"スキップ: {number} 件目: {error}", file=sys.stderr)
+
+    def on_read_error(line_number, error):
+        skipped.append(line_number)
+        print(f"スキップ: {error}", file=sys.stderr)
+
+    with open_library(args.variables, "r") as f:
+        if args.skip_invalid:
+            rendered = render_all(template, read_variable_sets(f, fmt, on_read_error), on_error)
+        else:
+            rendered = render_all(template, read_variable_sets(f, fmt))
+        if args.improve:
+            from batch import BatchItem
+
+            items = [BatchItem(text) for _, _, text in rendered if text.strip()]
+            print(f"{len(items)} 件を展開しました。一括強化を開始します。", file=sys.stderr)
+            return _run_batch(args, config_manager, items)
+        count = 0
+        with open_library(args.output, "w") as out:
+            for _, values, text in rendered:
+                out.write(json.dumps({"prompt": text, "variables": values}, ensure_ascii=False))
+                out.write("\n")
+                count += 1
+    skipped_text = f"（スキップ {len(skipped)} 件）" if skipped else ""
+    print(f"{count} 件を展開しました{skipped_text}。", file=sys.stderr)
+    return 0
+
+
+def cmd_template_match(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    """ベースプロンプトがテンプレートを展開したものと一致するセーブ済みプロンプトの、変数の組を書き出します。
+
+    既定の出力は render の入力にそのまま使えるJSON Linesです。--json ではプロンプトのIDも出力します。
+    """
+    store = _open_templates()
+    try:
+        template = _get_template(store, args.name)
+    finally:
+        store.close()
+    storage = create_prompt_storage(config_manager, get_base_path())
+    count = 0
+    try:
+        for prompt in storage.iter_prompts():
+            values = template.extract(prompt.get("original", ""))
+            if values is None:
+                continue
+            count += 1
+            record = {"id": prompt["id"], "variables": values} if args.json else values
+            print(json.dumps(record, ensure_ascii=False))
+    finally:
+        storage.close()
+    print(f"{count} 件のプロンプトがテンプレート {args.name} と一致しました。", file=sys.stderr)
+    return 0
+
+
+def _format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:,.0f}"
+
+
+def cmd_stats(args: argparse.Namespace, config_manager: ConfigManager) -> int:
+    """記録したAPI呼び出しの計測値をモデルごとに集計して表示、またはファイルへ書き出します。"""
+    from library_io import open_library
+    from metrics import EXPORT_CSV, EXPORT_JSONL, MetricsStore
+
+    store = MetricsStore.from_config(config_manager)
+    if store is None:
+        raise ValueError("計測値の記録は無効になっています（config.json の metrics_settings.enabled）。")
+    since = time.time() - args.days * 86400 if args.days else None
+    try:
+        if args.export:
+            fmt = args.format or (EXPORT_JSONL if ".jsonl" in args.export.lower() else EXPORT_CSV)
+            with open_library(args.export, "w") as f:
+                count = store.export(f, fmt, since)
+            print(f"{count} 件をエクスポートしました。", file=sys.stderr)
+            return 0
+        stats = store.model_stats(since)
+    finally:
+        store.close()
+    if args.json:
+        for model in stats:
+            print(json.dumps(model.to_dict(), ensure_ascii=False))
+        return 0
+    if not stats:
+        print("記録がありません。", file=sys.stderr)
+        return 0
+    print("モデル\t呼び出し\t失敗\tキャッシュ\tp50 ms\tp95 ms\tTTFB p50\tTTFB p95\t入力\t出力\tキャッシュ済み入力")
+    for model in stats:
+        print(
+            f"{model.model}\t{model.calls}\t{model.errors}\t{model.cache_hits}"
+            f"\t{_format_ms(model.latency(0.5))}\t{_format_ms(model.latency(0.95))}"
+            f"\t{_format_ms(model.ttfb(0.5))}\t{_format_ms(model.ttfb(0.95))}"
+            f"\t{model.prompt_tokens:,}\t{model.output_tokens:,}\t{model.cached_tokens:,}"
+        )
+    return 0
+
+
+def add_batch_arguments(parser: argparse.ArgumentParser):
+    """一括強化のオプションを追加します。main.py の --batch と共有します。"""
+    parser.add_argument("--model", help="使用するモデル（既定: config.json の default_model）")
+    parser.add_argument("--workers", type=int, help="同時実行数（既定: batch_settings.max_workers）")
+    parser.add_argument("--force-refresh", action="store_true", help="キャッシュを使わずに再生成する")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description=f"{Constants.APP_TITLE} のコマンドラインツール")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    improve = sub.add_parser("improve", help="プロンプトを強化して標準出力に書き出す")
+    improve.add_argument("prompt", help="ベースプロンプト（- で標準入力）")
+    improve.add_argument("--model", help="使用するモデル（既定: config.json の default_model）")
+    improve.add_argument("--force-refresh", action="store_true", help="キャッシュを使わずに再生成する")
+    improve.add_argument("--save", action="store_true", help="結果をセーブ済みプロンプトに保存する")
+    improve.set_defaults(handler=cmd_improve)
+
+    compare = sub.add_parser("compare", help="複数のモデルで同時に強化し、所要時間・トークン数を比較する")
+    compare.add_argument("prompt", help="ベースプロンプト（- で標準入力）")
+    compare.add_argument("--models", nargs="+", help="比較するモデル（既定: config.json の available_models）")
+    compare.add_argument("--force-refresh", action="store_true", help="キャッシュを使わずに再生成する")
+    compare.add_argument("--save", metavar="MODEL", help="指定したモデルの結果をセーブ済みプロンプトに保存する")
+    compare.add_argument("--json", action="store_true", help="モデルごとに1行のJSONで出力する")
+    compare.set_defaults(handler=cmd_compare)
+
+    list_parser = sub.add_parser("list", help="セーブ済みプロンプトを一覧表示する")
+    list_parser.add_argument("--offset", type=int, default=0)
+    list_parser.add_argument("--limit", type=int)
+    list_parser.add_argument("--order", choices=Constants.Storage.ORDERS, default="default")
+    list_parser.add_argument("--json", action="store_true", help="1行1件のJSONで出力する")
+    list_parser.set_defaults(handler=cmd_list)
+
+    search = sub.add_parser("search", help="セーブ済みプロンプトを全文検索する")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=Constants.UI.SEARCH_RESULT_LIMIT)
+    search.add_argument("--json", action="store_true", help="1行1件のJSONで出力する")
+    search.set_defaults(handler=cmd_search)
+
+    similar = sub.add_parser("similar", help="内容の似たセーブ済みプロンプトを似ている順に表示する")
+    similar.add_argument("prompt_id")
+    similar.add_argument("--threshold", type=float, default=Constants.Similarity.SIMILAR_THRESHOLD, help="推定類似度の下限 (0〜1)")
+    similar.add_argument("--limit", type=int, default=20)
+    similar.add_argument("--json", action="store_true", help="JSON Lines で出力する")
+    similar.set_defaults(handler=cmd_similar)
+
+    dedupe = sub.add_parser("dedupe", help="ほぼ重複するセーブ済みプロンプトのグループを一覧する")
+    dedupe.add_argument("--threshold", type=float, default=Constants.Similarity.DUPLICATE_THRESHOLD, help="推定類似度の下限 (0〜1)")
+    dedupe.add_argument("--json", action="store_true", help="グループごとに JSON Lines で出力する")
+    dedupe.set_defaults(handler=cmd_dedupe)
+
+    export = sub.add_parser("export", help="セーブ済みプロンプトをファイルに書き出す")
+    export.add_argument("file", help="出力先。.jsonl / .json、圧縮は .gz / .zst（- で標準出力）")
+    export.add_argument("--format", choices=("json", "jsonl"), help="形式（既定: 拡張子から判定）")
+    export.set_defaults(handler=cmd_export)
+
+    import_parser = sub.add_parser("import", help="ファイルから取り込む（重複はお気に入りとタイトルを統合）")
+    import_parser.add_argument("file", help="入力ファイル。.jsonl / .json、圧縮は .gz / .zst（- で標準入力）")
+    import_parser.add_argument("--format", choices=("json", "jsonl"), help="形式（既定: 拡張子から判定）")
+    import_parser.set_defaults(handler=cmd_import)
+
+    batch = sub.add_parser("batch", help="ファイルのプロンプトを一括強化して保存する")
+    batch.add_argument("file", help="1行1件のテキストまたはJSON Lines（- で標準入力）")
+    add_batch_arguments(batch)
+    batch.set_defaults(handler=cmd_batch)
+
+    stats = sub.add_parser("stats", help="API呼び出しの応答時間・トークン数をモデルごとに集計する")
+    stats.add_argument("--days", type=float, help="直近の日数に絞り込む（既定: 全期間）")
+    stats.add_argument("--json", action="store_true", help="モデルごとに1行のJSONで出力する")
+    stats.add_argument("--export", metavar="FILE", help="集計せずに全記録を書き出す。圧縮は .gz / .zst（- で標準出力）")
+    stats.add_argument("--format", choices=("csv", "jsonl"), help="書き出す形式（既定: 拡張子から判定、それ以外はCSV）")
+    stats.set_defaults(handler=cmd_stats)
+
+    history = sub.add_parser("history", help="プロンプトの版の一覧・本文・差分を表示する")
+    history.add_argument("prompt_id")
+    history.add_argument("--show", type=int, metavar="N", help="版 N の本文を表示する")
+    history.add_argument("--diff", type=int, nargs=2, metavar=("A", "B"), help="版 A から版 B への差分を表示する")
+    history.add_argument("--field", choices=("improved", "original"), default="improved", help="表示する項目（既定: improved）")
+    history.add_argument("--json", action="store_true", help="--show の結果をJSONで出力する")
+    history.set_defaults(handler=cmd_history)
+
+    template = sub.add_parser("template", help="{{変数}} を含むテンプレートの保存と、変数の組による一括展開")
+    template_sub = template.add_subparsers(dest="action", required=True)
+    template_save = template_sub.add_parser("save", help="テンプレートを保存する（同じ名前は置き換え）")
+    template_save.add_argument("name")
+    template_save.add_argument("file", help="テンプレートの本文のファイル（- で標準入力）")
+    template_save.set_defaults(handler=cmd_template_save)
+    template_list = template_sub.add_parser("list", help="保存済みのテンプレートを一覧表示する")
+    template_list.add_argument("--json", action="store_true", help="1行1件のJSONで出力する")
+    template_list.set_defaults(handler=cmd_template_list)
+    template_show = template_sub.add_parser("show", help="テンプレートの本文を表示する")
+    template_show.add_argument("name")
+    template_show.set_defaults(handler=cmd_template_show)
+    template_delete = template_sub.add_parser("delete", help="テンプレートを削除する")
+    template_delete.add_argument("name")
+    template_delete.set_defaults(handler=cmd_template_delete)
+    template_render = template_sub.add_parser("render", help="変数の組ごとにテンプレートを展開する")
+    template_render.add_argument("name")
+    template_render.add_argument("variables", help="変数の組。.csv / .tsv（1行目が変数名）か JSON Lines、圧縮は .gz / .zst（- で標準入力）")
+    template_render.add_argument("--format", choices=("csv", "tsv", "jsonl"), help="変数の組の形式（既定: 拡張子から判定）")
+    template_render.add_argument("--output", default="-", help="JSON Lines の出力先。圧縮は .gz / .zst（既定: 標準出力）")
+    template_render.add_argument("--skip-invalid", action="store_true", help="変数の足りない組や読み込めない行を飛ばして続ける")
+    template_render.add_argument("--improve", action="store_true", help="書き出す代わりに一括強化して保存する")
+    add_batch_arguments(template_render)
+    template_render.set_defaults(handler=cmd_template_render)
+    template_match = template_sub.add_parser("match", help="テンプレートと一致するセーブ済みプロンプトの変数の組を書き出す")
+    template_match.add_argument("name")
+    template_match.add_argument("--json", action="store_true", help="プロンプトのIDと変数の組を出力する")
+    template_match.set_defaults(handler=cmd_template_match)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    config_manager = ConfigManager(get_base_path())
+    try:
+        return args.handler(args, config_manager)
+    except ValueError as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+    except Exception as e:
+        message = str(e).splitlines()[0] if str(e) else type(e).__name__
+        print(f"エラー: {message}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# Prompt Master: 同じベースプロンプトを複数のモデルで同時に強化し、結果を比較する。
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+from api_service import ApiService, ImproveResult
+from scheduler import Job, JobStatus, RequestScheduler
+from storage import PromptStorageManager
+
+
+def describe_result(job: Job) -> str:
+    """比較の1モデル分の結果を、所要時間・トークン数・文字数の1行にまとめます。"""
+    if not job.finished:
+        return JobStatus.LABELS.get(job.status, job.status)
+    if job.status != JobStatus.DONE:
+        message = str(job.error).splitlines()[0] if job.error and str(job.error) else type(job.error).__name__
+        return f"{JobStatus.LABELS.get(job.status, job.status)}: {message}"
+    result: ImproveResult = job.result
+    if result.cached:
+        return f"キャッシュ / {result.output_chars:,} 文字"
+    tokens = "-" if result.output_tokens is None else f"{result.prompt_tokens or 0:,} → {result.output_tokens:,}"
+    if result.cached_tokens:
+        tokens += f" (キャッシュ済み {result.cached_tokens:,})"
+    retries = f" / 再試行 {job.attempts - 1} 回" if job.attempts > 1 else ""
+    return f"{result.latency_ms:,.0f} ms / トークン {tokens} / {result.output_chars:,} 文字{retries}"
+
+
+class ModelComparison:
+    """同じベースプロンプトを複数のモデルへ同時にリクエストし、結果を集めます。
+
+    モデルごとに1つのジョブを RequestScheduler に投入するため、ワーカー数がモデル数以上あれば
+    全体の所要時間は最も遅いモデルの応答時間で決まります。`on_update(comparison)` はモデルの結果が
+    揃うたびにジョブを実行したスレッドから呼ばれます。
+    """
+
+    def __init__(
+        self,
+        scheduler: RequestScheduler,
+        api_service: ApiService,
+        on_update: Optional[Callable[["ModelComparison"], None]] = None,
+    ):
+        self.scheduler = scheduler
+        self.api_service = api_service
+        self.on_update = on_update
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.user_prompt = ""
+        self.started_at = 0.0
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def start(
+        self,
+        api_key: str,
+        model_names: Sequence[str],
+        system_prompt: str,
+        user_prompt: str,
+        force_refresh: bool = False,
+    ):
+        """モデルごとのジョブを投入します。入力が不正な場合はジョブを投入せずにValueErrorを送出します。"""
+        ApiService._validate(api_key, user_prompt)
+        model_names = list(OrderedDict.fromkeys(model_names))
+        if not model_names:
+            raise ValueError("比較するモデルがありません。")
+        self.user_prompt = user_prompt
+        self.started_at = time.perf_counter()
+        title = PromptStorageManager.make_title(user_prompt)
+        # キャッシュから即座に返るジョブが、残りのジョブの投入前に「全て完了」と判定しないよう、
+        # 全てのジョブを登録し終えるまで完了の判定を待たせる
+        with self._lock:
+            for model_name in model_names:
+                self.jobs[model_name] = self.scheduler.submit(
+                    f"{model_name}: {title}",
+                    self._make_task(api_key, model_name, system_prompt, user_prompt, force_refresh),
+                    on_done=self._on_job_done,
+                )
+
+    def _make_task(
+        self, api_key: str, model_name: str, system_prompt: str, user_prompt: str, force_refresh: bool
+    ) -> Callable[[Job], ImproveResult]:
+        def task(job: Job) -> ImproveResult:
+            return self.api_service.improve_prompt_detailed(
+                api_key,
+                model_name,
+                system_prompt,
+                user_prompt,
+                force_refresh=force_refresh,
+                timeout=job.remaining(),
+                attempt=job.attempts,
+            )
+
+        return task
+
+    def _on_job_done(self, job: Job):
+        with self._lock:
+            if self.finished_at is None and all(j.finished for j in self.jobs.values()):
+                self.finished_at = time.perf_counter()
+                self._done.set()
+        if self.on_update is not None:
+            self.on_update(self)
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """全てのモデルの結果が揃うまで待ちます。揃えばTrueを返します。"""
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        for job in self.jobs.values():
+            self.scheduler.cancel(job)
+
+    def result(self, model_name: str) -> Optional[ImproveResult]:
+        """モデルの強化結果を返します。完了していなければNoneです。"""
+        job = self.jobs.get(model_name)
+        return job.result if job is not None and job.status == JobStatus.DONE else None
+
+    def results(self) -> List[ImproveResult]:
+        return [job.result for job in self.jobs.values() if job.status == JobStatus.DONE]
+
+    @property
+    def wall_ms(self) -> float:
+        return ((self.finished_at or time.perf_counter()) - self.started_at) * 1000
+
+    def summary(self) -> str:
+        """全体の所要時間と、各モデルの所要時間の合計（順に実行した場合の目安）を返します。"""
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        states = "、".join(f"{JobStatus.LABELS.get(status, status)} {count}" for status, count in counts.items())
+        total_ms = sum(result.latency_ms for result in self.results())
+        return f"{len(self.jobs)} モデル ({states}) 所要 {self.wall_ms:,.0f} ms / 各モデルの合計 {total_ms:,.0f} ms"
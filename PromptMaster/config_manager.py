@@ -0,0 +1,131 @@
+# Prompt Master: config.json の読み書き。
+
+import json
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from constants import Constants
+from persistence import WriteBehindQueue, atomic_write_text
+
+
+class ConfigManager:
+    """config.jsonの読み書きと設定値の管理を行います。"""
+
+    def __init__(self, base_path: Path, write_queue: Optional[WriteBehindQueue] = None):
+        self.config_path = base_path / Constants.CONFIG_FILE
+        # 指定された場合、保存はこのキューで遅延・集約される（連続した変更でも書き込みは1回）
+        self.write_queue = write_queue
+        self.config = self._load_config()
+        self._listeners: List[Callable[[str, str, Any], None]] = []
+
+    def subscribe(self, listener: Callable[[str, str, Any], None]):
+        """設定値が変更されたときに `listener(primary_key, secondary_key, value)` を呼び出すよう登録します。"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[str, str, Any], None]):
+        """登録済みのリスナーを解除します。"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _load_config(self) -> Dict[str, Any]:
+        """設定ファイルを読み込みます。ファイルが存在しないか不正な場合はデフォルト設定を返します。"""
+        if not self.config_path.exists():
+            default_config = self._get_default_config()
+            self.save_config(default_config)
+            return default_config
+        try:
+            with self.config_path.open("r", encoding="utf-8") as f:
+                config_data = json.load(f)
+                if "use_default_system_prompt" not in config_data.get("api_settings", {}):
+                    config_data["api_settings"]["use_default_system_prompt"] = True
+                return config_data
+        except (json.JSONDecodeError, IOError):
+            return self._get_default_config()
+
+    def save_config(self, config_data: Optional[Dict[str, Any]] = None):
+        """現在の設定をファイルに保存します。書き込みは一時ファイルからの置き換えで行います。"""
+        if config_data is None:
+            config_data = self.config
+        text = json.dumps(config_data, indent=2, ensure_ascii=False)
+        if self.write_queue is None:
+            atomic_write_text(self.config_path, text)
+        else:
+            self.write_queue.schedule(self.config_path, lambda: atomic_write_text(self.config_path, text))
+
+    def flush(self):
+        """遅延中の保存を直ちに書き込みます。"""
+        if self.write_queue is not None:
+            self.write_queue.flush()
+
+    def get_setting(self, primary_key: str, secondary_key: str, default: Any = None) -> Any:
+        """ネストした設定値を取得します。"""
+        return self.config.get(primary_key, {}).get(secondary_key, default)
+
+    def set_setting(self, primary_key: str, secondary_key: str, value: Any):
+        """ネストした設定値を設定し、ファイルに保存します。"""
+        if primary_key not in self.config:
+            self.config[primary_key] = {}
+        changed = self.config[primary_key].get(secondary_key) != value
+        self.config[primary_key][secondary_key] = value
+        self.save_config()
+        if changed:
+            for listener in list(self._listeners):
+                listener(primary_key, secondary_key, value)
+
+    def get_active_system_prompt(self) -> str:
+        """現在アクティブなシステムプロンプト（デフォルトまたはカスタム）を取得します。"""
+        use_default = self.get_setting("api_settings", "use_default_system_prompt", True)
+        return Constants.DEFAULT_SYSTEM_PROMPT if use_default else self.get_setting("api_settings", "system_prompt", Constants.DEFAULT_SYSTEM_PROMPT)
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """デフォルトの設定オブジェクトを生成します。"""
+        return {
+            "api_settings": {
+                "api_key": "",
+                "default_model": "gemini-2.5-flash",
+                "available_models": ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-2.0-flash"],
+                "system_prompt": Constants.DEFAULT_SYSTEM_PROMPT,
+                "use_default_system_prompt": True,
+                "use_streaming": True,
+                "use_context_cache": True,
+            },
+            "ui_settings": {
+                "window_geometry": Constants.UI.DEFAULT_GEOMETRY,
+                "font_family": Constants.UI.DEFAULT_FONT_FAMILY,
+                "show_diff": False,
+            },
+            "storage_settings": {
+                "backend": Constants.Storage.BACKEND_JOURNAL,
+            },
+            "cache_settings": {
+                "enabled": True,
+                "max_entries": Constants.Storage.RESPONSE_CACHE_MAX_ENTRIES,
+                "max_megabytes": Constants.Storage.RESPONSE_CACHE_MAX_MEGABYTES,
+                "ttl_hours": 0,
+            },
+            "metrics_settings": {
+                "enabled": True,
+                "retention_days": Constants.Metrics.RETENTION_DAYS,
+                "max_records": Constants.Metrics.MAX_RECORDS,
+            },
+            "revision_settings": {
+                "enabled": True,
+                "max_revisions": Constants.Revisions.MAX_PER_PROMPT,
+                "snapshot_interval": Constants.Revisions.SNAPSHOT_INTERVAL,
+                "retention_days": 0,
+            },
+            "batch_settings": {
+                "max_workers": Constants.Batch.MAX_WORKERS,
+                "requests_per_minute": {},
+                "default_requests_per_minute": Constants.Batch.REQUESTS_PER_MINUTE,
+            },
+        }
+
+
+def get_base_path() -> Path:
+    """実行ファイル（またはこのスクリプト）のあるディレクトリを返します。"""
+    if getattr(sys, 'frozen', False):
+        return Path(sys.executable).parent
+    return Path(__file__).parent
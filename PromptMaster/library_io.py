@@ -0,0 +1,125 @@
+# Prompt Master: プロンプトライブラリのエクスポートとインポート。
+#
+# JSON Lines（1行1件）形式で、全件をメモリに展開せずに1件ずつ読み書きします。
+# ファイル名が .gz で終わる場合はgzip、.zst / .zstd で終わる場合はzstdで圧縮します。
+# 拡張子が .json のファイルは従来の saved_prompts.json 形式として扱います。
+
+import gzip
+import io
+import json
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator, Optional
+
+from storage import ImportReport
+
+FORMAT_JSON = "json"
+FORMAT_JSONL = "jsonl"
+FORMATS = (FORMAT_JSON, FORMAT_JSONL)
+
+_GZIP_SUFFIXES = (".gz", ".gzip")
+_ZSTD_SUFFIXES = (".zst", ".zstd")
+
+
+def detect_format(path: str) -> str:
+    """ファイル名から形式を判定します。圧縮の拡張子を除いた拡張子が .json なら従来形式、それ以外はJSON Linesです。"""
+    name = Path(path).name.lower()
+    for suffix in _GZIP_SUFFIXES + _ZSTD_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+            break
+    return FORMAT_JSON if name.endswith(".json") else FORMAT_JSONL
+
+
+def _open_zstd(path: str, mode: str) -> IO[str]:
+    """zstd圧縮ファイルをテキストモードで開きます。標準ライブラリ (3.14以降) かzstandardパッケージを使います。"""
+    try:
+        from compression import zstd
+
+        return zstd.open(path, mode + "t", encoding="utf-8")
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd形式を扱うには zstandard パッケージをインストールしてください（pip install zstandard）。")
+    raw = open(path, mode + "b")
+    if mode == "w":
+        stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+    else:
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+@contextmanager
+def open_library(path: str, mode: str = "r") -> Iterator[IO[str]]:
+    """ライブラリファイルを拡張子に応じた圧縮形式のテキストストリームとして開きます。`-` は標準入出力です。"""
+    if path == "-":
+        yield sys.stdin if mode == "r" else sys.stdout
+        return
+    lower = path.lower()
+    if lower.endswith(_GZIP_SUFFIXES):
+        f = gzip.open(path, mode + "t", encoding="utf-8")
+    elif lower.endswith(_ZSTD_SUFFIXES):
+        f = _open_zstd(path, mode)
+    else:
+        f = open(path, mode, encoding="utf-8")
+    with f:
+        yield f
+
+
+def write_prompts(prompts: Iterable[Any], f: IO[str], fmt: str = FORMAT_JSONL) -> int:
+    """プロンプトを1件ずつ書き出し、書き出した件数を返します。"""
+    count = 0
+    if fmt == FORMAT_JSON:
+        f.write('{"saved_prompts": [')
+        for prompt in prompts:
+            f.write(",\n  " if count else "\n  ")
+            f.write(json.dumps(prompt, ensure_ascii=False))
+            count += 1
+        f.write("\n]}\n")
+        return count
+    for prompt in prompts:
+        f.write(json.dumps(prompt, ensure_ascii=False))
+        f.write("\n")
+        count += 1
+    return count
+
+
+def read_prompts(f: IO[str], fmt: str = FORMAT_JSONL) -> Iterator[Any]:
+    """ライブラリファイルのレコードを1件ずつ返します。
+
+    JSON Linesは1行ずつ読み込みます。解釈できない行は None として返し、取り込み時に不正な形式として数えます。
+    従来形式 (saved_prompts.json) はファイル全体を読み込むため、大きなライブラリにはJSON Linesを使ってください。
+    """
+    if fmt == FORMAT_JSON:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError:
+            raise ValueError("saved_prompts.json 形式のファイルではありません。")
+        if not isinstance(data, dict) or not isinstance(data.get("saved_prompts"), list):
+            raise ValueError("saved_prompts.json 形式のファイルではありません。")
+        yield from data["saved_prompts"]
+        return
+    for line in f:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            yield None
+
+
+def export_library(storage, path: str, fmt: Optional[str] = None) -> int:
+    """ストレージの全てのプロンプトをファイルへ書き出し、件数を返します。"""
+    fmt = fmt or detect_format(path)
+    with open_library(path, "w") as f:
+        return write_prompts(storage.iter_prompts(), f, fmt)
+
+
+def import_library(storage, path: str, fmt: Optional[str] = None) -> ImportReport:
+    """ファイルのプロンプトをストレージへ取り込みます。同じ内容のプロンプトはお気に入りとタイトルだけを統合します。"""
+    fmt = fmt or detect_format(path)
+    with open_library(path, "r") as f:
+        return storage.import_prompts(read_prompts(f, fmt))
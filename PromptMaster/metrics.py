@@ -0,0 +1,249 @@
+# Prompt Master: API呼び出しの計測値（トークン数・応答時間・再試行・キャッシュヒット）の記録と集計。
+
+import csv
+import json
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence
+
+from config_manager import ConfigManager
+from constants import Constants
+
+EXPORT_CSV = "csv"
+EXPORT_JSONL = "jsonl"
+EXPORT_FORMATS = (EXPORT_CSV, EXPORT_JSONL)
+
+COLUMNS = (
+    "timestamp",
+    "model",
+    "status",
+    "streaming",
+    "cache_hit",
+    "retries",
+    "prompt_tokens",
+    "output_tokens",
+    "cached_tokens",
+    "ttfb_ms",
+    "latency_ms",
+    "error",
+)
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> Optional[float]:
+    """昇順に並んだ値の百分位数を最近傍順位法で返します。値がなければNoneです。"""
+    if not sorted_values:
+        return None
+    rank = math.ceil(round(fraction * len(sorted_values), 9))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class CallStatus:
+    """記録するAPI呼び出しの結果です。"""
+
+    OK = "ok"
+    ERROR = "error"
+    CANCELLED = "cancelled"
+
+
+class ModelStats:
+    """1モデル分の集計です。応答時間はキャッシュヒットを除いた成功した呼び出しから求めます。"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.cache_hits = 0
+        self.retried = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.latencies: List[float] = []
+        self.ttfbs: List[float] = []
+
+    def latency(self, fraction: float) -> Optional[float]:
+        return percentile(self.latencies, fraction)
+
+    def ttfb(self, fraction: float) -> Optional[float]:
+        return percentile(self.ttfbs, fraction)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "calls": self.calls,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "cache_hits": self.cache_hits,
+            "retried": self.retried,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_tokens": self.cached_tokens,
+            "latency_p50_ms": self.latency(0.5),
+            "latency_p95_ms": self.latency(0.95),
+            "ttfb_p50_ms": self.ttfb(0.5),
+            "ttfb_p95_ms": self.ttfb(0.95),
+        }
+
+
+class MetricsStore:
+    """API呼び出しごとの計測値をSQLiteに記録する、期間と件数に上限のあるストアです。
+
+    書き込みは呼び出し元のスレッドで行いますが、1件の挿入だけなので強化の所要時間には影響しません。
+    `retention_days` より古い記録と、`max_records` を超えた古い記録は、最初の記録時とその後一定件数ごとに
+    削除します。開くだけ（集計・エクスポート）では削除しません。
+    """
+
+    PRUNE_INTERVAL = 200
+
+    def __init__(
+        self,
+        db_path: Path,
+        retention_days: float = Constants.Metrics.RETENTION_DAYS,
+        max_records: int = Constants.Metrics.MAX_RECORDS,
+    ):
+        self.retention_days = retention_days
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        # 最初の記録で古い記録を削除する
+        self._inserts_since_prune = self.PRUNE_INTERVAL - 1
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS api_calls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp REAL NOT NULL,
+                model TEXT NOT NULL,
+                status TEXT NOT NULL,
+                streaming INTEGER NOT NULL,
+                cache_hit INTEGER NOT NULL,
+                retries INTEGER NOT NULL,
+                prompt_tokens INTEGER,
+                output_tokens INTEGER,
+                cached_tokens INTEGER,
+                ttfb_ms REAL,
+                latency_ms REAL NOT NULL,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_api_calls_timestamp ON api_calls (timestamp);
+            """
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config_manager: ConfigManager, db_path: Path = Constants.METRICS_FILE) -> Optional["MetricsStore"]:
+        """metrics_settings に従ってストアを作成します。無効化されていればNoneを返します。"""
+        settings = config_manager.config.get("metrics_settings", {})
+        if not settings.get("enabled", True):
+            return None
+        return cls(
+            db_path,
+            retention_days=settings.get("retention_days", Constants.Metrics.RETENTION_DAYS),
+            max_records=settings.get("max_records", Constants.Metrics.MAX_RECORDS),
+        )
+
+    def record(
+        self,
+        model: str,
+        status: str,
+        latency_ms: float,
+        ttfb_ms: Optional[float] = None,
+        prompt_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+        cached_tokens: int = 0,
+        retries: int = 0,
+        cache_hit: bool = False,
+        streaming: bool = False,
+        error: Optional[str] = None,
+    ):
+        """1回のAPI呼び出し（または強化結果キャッシュのヒット）を記録します。"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO api_calls (timestamp, model, status, streaming, cache_hit, retries, prompt_tokens,"
+                " output_tokens, cached_tokens, ttfb_ms, latency_ms, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time.time(), model, status, int(streaming), int(cache_hit), retries, prompt_tokens,
+                    output_tokens, cached_tokens, ttfb_ms, latency_ms, error,
+                ),
+            )
+            self._conn.commit()
+            self._inserts_since_prune += 1
+            if self._inserts_since_prune >= self.PRUNE_INTERVAL:
+                self._prune_locked()
+
+    def _prune_locked(self):
+        self._inserts_since_prune = 0
+        if self.retention_days and self.retention_days > 0:
+            self._conn.execute("DELETE FROM api_calls WHERE timestamp < ?", (time.time() - self.retention_days * 86400,))
+        if self.max_records and self.max_records > 0:
+            self._conn.execute(
+                "DELETE FROM api_calls WHERE id <= (SELECT MAX(id) FROM api_calls) - ?", (self.max_records,)
+            )
+        self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM api_calls").fetchone()[0]
+
+    def iter_records(self, since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """`since` (UNIX時刻) 以降の記録を古い順に返します。"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM api_calls WHERE timestamp >= ? ORDER BY id", (since or 0,)
+            ).fetchall()
+        for row in rows:
+            yield dict(zip(COLUMNS, row))
+
+    def model_stats(self, since: Optional[float] = None) -> List[ModelStats]:
+        """`since` (UNIX時刻) 以降の記録をモデルごとに集計し、呼び出し回数の多い順に返します。"""
+        stats: Dict[str, ModelStats] = {}
+        for record in self.iter_records(since):
+            model = stats.get(record["model"])
+            if model is None:
+                model = stats[record["model"]] = ModelStats(record["model"])
+            model.calls += 1
+            if record["status"] == CallStatus.ERROR:
+                model.errors += 1
+                continue
+            if record["status"] == CallStatus.CANCELLED:
+                model.cancelled += 1
+                continue
+            if record["cache_hit"]:
+                model.cache_hits += 1
+                continue
+            if record["retries"]:
+                model.retried += 1
+            model.prompt_tokens += record["prompt_tokens"] or 0
+            model.output_tokens += record["output_tokens"] or 0
+            model.cached_tokens += record["cached_tokens"] or 0
+            model.latencies.append(record["latency_ms"])
+            if record["ttfb_ms"] is not None:
+                model.ttfbs.append(record["ttfb_ms"])
+        for model in stats.values():
+            model.latencies.sort()
+            model.ttfbs.sort()
+        return sorted(stats.values(), key=lambda model: -model.calls)
+
+    def export(self, f: IO[str], fmt: str = EXPORT_CSV, since: Optional[float] = None) -> int:
+        """記録をCSVまたはJSON Linesで書き出し、件数を返します。時刻はISO 8601 (UTC) で出力します。"""
+        count = 0
+        writer = None
+        if fmt == EXPORT_CSV:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+        for record in self.iter_records(since):
+            record["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(record["timestamp"]))
+            if writer is not None:
+                writer.writerow(record)
+            else:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+        return count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,170 @@
+# Prompt Master: ファイルへの安全な書き込みと、書き込みの遅延・集約。
+
+import atexit
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Hashable, Iterator, Optional, TextIO
+
+from constants import Constants
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def atomic_open(path: Path) -> Iterator[TextIO]:
+    """書き込み用の一時ファイルを開き、正常に閉じられたときだけ `path` と置き換えます。
+
+    書き込み途中でプロセスが終了したり例外が発生したりしても、`path` は元の内容のまま残ります。
+    """
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, str(path))
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(path.parent)
+
+
+def atomic_write_text(path: Path, text: str):
+    """テキストを `atomic_open` で書き込みます。"""
+    with atomic_open(path) as f:
+        f.write(text)
+
+
+def _fsync_directory(directory: Path):
+    """置き換え（リネーム）自体を永続化します。ディレクトリを開けないOSでは何もしません。"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    try:
+        fd = os.open(str(directory), os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class WriteBehindQueue:
+    """書き込みをバックグラウンドスレッドで遅延実行し、同じキーへの連続した書き込みを1回にまとめます。
+
+    `schedule()` の最後の呼び出しから `delay` 秒経つ（または最初の呼び出しから `max_delay` 秒経つ）と、
+    キーごとに最新の書き込み関数だけを実行します。`flush()` で待機中の書き込みを直ちに実行でき、
+    プロセス終了時にも自動的に実行されます。書き込みに失敗すると `on_error(例外)` を書き込みを
+    実行したスレッドで呼び出します（省略した場合はログに記録します）。
+    """
+
+    def __init__(
+        self,
+        delay: float = Constants.Storage.WRITE_BEHIND_DELAY_MS / 1000,
+        max_delay: float = Constants.Storage.WRITE_BEHIND_MAX_DELAY_MS / 1000,
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ):
+        self.delay = delay
+        self.max_delay = max_delay
+        self.on_error = on_error
+        self.writes_executed = 0
+        self.last_error: Optional[BaseException] = None
+        self._pending: "OrderedDict[Hashable, Callable[[], None]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._first_scheduled_at = 0.0
+        self._last_scheduled_at = 0.0
+        self._busy = False
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        atexit.register(self.close)
+
+    def schedule(self, key: Hashable, write: Callable[[], None]):
+        """書き込みを予約します。同じキーの未実行の書き込みは置き換えられます。"""
+        with self._cond:
+            closed = self._closed
+            if not closed:
+                self._enqueue(key, write)
+        if closed:
+            write()
+
+    def _enqueue(self, key: Hashable, write: Callable[[], None]):
+        now = time.monotonic()
+        if not self._pending:
+            self._first_scheduled_at = now
+        self._pending.pop(key, None)
+        self._pending[key] = write
+        self._last_scheduled_at = now
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+        self._cond.notify_all()
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                due = min(self._last_scheduled_at + self.delay, self._first_scheduled_at + self.max_delay)
+                remaining = due - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                writes = self._take_pending()
+            self._execute(writes)
+
+    def _take_pending(self):
+        """待機中の書き込みを取り出します。実行中の書き込みが終わるまで待ってから呼び出されます。"""
+        while self._busy:
+            self._cond.wait()
+        writes = list(self._pending.values())
+        self._pending.clear()
+        self._busy = True
+        return writes
+
+    def _execute(self, writes):
+        try:
+            for write in writes:
+                try:
+                    write()
+                    self.writes_executed += 1
+                except Exception as e:
+                    self.last_error = e
+                    if self.on_error is not None:
+                        self.on_error(e)
+                    else:
+                        logger.warning("書き込みに失敗しました: %s", e)
+        finally:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def flush(self):
+        """待機中の書き込みを呼び出し元のスレッドで直ちに実行し、完了を待ちます。"""
+        with self._cond:
+            writes = self._take_pending()
+        self._execute(writes)
+
+    def close(self):
+        """待機中の書き込みを実行し、バックグラウンドスレッドを停止します。以降の書き込みは即時に行います。"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.flush()
+        atexit.unregister(self.close)
@@ -0,0 +1,346 @@
+# Prompt Master: 保存済みプロンプトの版の履歴を、前の版との差分として圧縮して保存する。
+
+import difflib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config_manager import ConfigManager
+from constants import Constants
+
+FIELDS = ("original", "improved")
+# zlibのプリセット辞書に使える最大の長さ（スライディングウィンドウの大きさ）
+_ZDICT_SIZE = 32768
+
+Fields = Tuple[str, str]
+
+
+class Revision:
+    """プロンプトの1つの版です。`number` は1から始まる版番号です。"""
+
+    def __init__(self, number: int, created_at: float, original: str, improved: str):
+        self.number = number
+        self.created_at = created_at
+        self.original = original
+        self.improved = improved
+
+    @property
+    def fields(self) -> Fields:
+        return self.original, self.improved
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "revision": self.number,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.created_at)),
+            "original": self.original,
+            "improved": self.improved,
+        }
+
+
+class RevisionInfo:
+    """版の一覧に表示する情報です。`stored_bytes` は保存形式（圧縮後）の大きさです。"""
+
+    def __init__(self, number: int, created_at: float, snapshot: bool, stored_bytes: int, size: int):
+        self.number = number
+        self.created_at = created_at
+        self.snapshot = snapshot
+        self.stored_bytes = stored_bytes
+        self.size = size
+
+
+def _zdict(fields: Fields) -> bytes:
+    """差分の圧縮に使うプリセット辞書です。前の版の本文を辞書にすることで、書き換えた行も前の版を参照して圧縮されます。"""
+    return "".join(fields).encode("utf-8")[-_ZDICT_SIZE:]
+
+
+def encode_snapshot(fields: Fields) -> bytes:
+    return zlib.compress(json.dumps(dict(zip(FIELDS, fields)), ensure_ascii=False).encode("utf-8"), 9)
+
+
+def decode_snapshot(data: bytes) -> Fields:
+    record = json.loads(zlib.decompress(data).decode("utf-8"))
+    return record["original"], record["improved"]
+
+
+def encode_delta(old: Fields, new: Fields) -> bytes:
+    """前の版から新しい版を再構成するための差分を返します。
+
+    行単位の差分を、前の版の行範囲のコピー `[開始, 終了]` と、追加する文字数 `[文字数]` の列で表し、
+    追加する本文はまとめて後ろに置きます。全体を前の版をプリセット辞書としたzlibで圧縮します。
+    """
+    ops: Dict[str, List[List[int]]] = {}
+    inserted: List[str] = []
+    for key, old_text, new_text in zip(FIELDS, old, new):
+        old_lines = old_text.splitlines(keepends=True)
+        new_lines = new_text.splitlines(keepends=True)
+        field_ops: List[List[int]] = []
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                field_ops.append([i1, i2])
+            elif j2 > j1:
+                text = "".join(new_lines[j1:j2])
+                field_ops.append([len(text)])
+                inserted.append(text)
+        ops[key] = field_ops
+    data = (json.dumps(ops, separators=(",", ":")) + "\n" + "".join(inserted)).encode("utf-8")
+    compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS, 9, zlib.Z_DEFAULT_STRATEGY, _zdict(old))
+    return compressor.compress(data) + compressor.flush()
+
+
+def apply_delta(old: Fields, data: bytes) -> Fields:
+    """`encode_delta` の差分を前の版に適用し、新しい版を返します。"""
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS, _zdict(old))
+    header, inserted = (decompressor.decompress(data) + decompressor.flush()).decode("utf-8").split("\n", 1)
+    ops = json.loads(header)
+    position = 0
+    result = []
+    for key, old_text in zip(FIELDS, old):
+        old_lines = old_text.splitlines(keepends=True)
+        parts = []
+        for op in ops[key]:
+            if len(op) == 2:
+                parts.extend(old_lines[op[0]:op[1]])
+            else:
+                parts.append(inserted[position:position + op[0]])
+                position += op[0]
+        result.append("".join(parts))
+    return result[0], result[1]
+
+
+class RevisionStore:
+    """保存済みプロンプトの版の履歴をSQLiteに保存します。
+
+    各版は前の版との差分として保存し、`snapshot_interval` 版ごと（と差分の方が大きくなる場合）に
+    全文のスナップショットを保存します。版の復元は直前のスナップショットから差分を順に適用するため、
+    適用する差分の数は `snapshot_interval` 未満に収まります。
+    プロンプトごとに `max_revisions` 版を超えた古い版と、`retention_days` より古い版は削除します（最新の版は残します）。
+    """
+
+    SNAPSHOT = 0
+    DELTA = 1
+    # 最新の版の内容を保持するプロンプトの数（差分の作成時に前の版を復元し直さないため）
+    LATEST_CACHE_SIZE = 64
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_revisions: int = Constants.Revisions.MAX_PER_PROMPT,
+        snapshot_interval: int = Constants.Revisions.SNAPSHOT_INTERVAL,
+        retention_days: float = 0,
+    ):
+        self.max_revisions = max_revisions
+        self.snapshot_interval = max(1, snapshot_interval)
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._latest: "OrderedDict[str, Revision]" = OrderedDict()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS revisions (
+                prompt_id TEXT NOT NULL,
+                revision INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                kind INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (prompt_id, revision)
+            ) WITHOUT ROWID;
+            """
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config_manager: ConfigManager, db_path: Path = Constants.REVISIONS_FILE) -> Optional["RevisionStore"]:
+        """revision_settings に従ってストアを作成します。無効化されていればNoneを返します。"""
+        settings = config_manager.config.get("revision_settings", {})
+        if not settings.get("enabled", True):
+            return None
+        return cls(
+            db_path,
+            max_revisions=settings.get("max_revisions", Constants.Revisions.MAX_PER_PROMPT),
+            snapshot_interval=settings.get("snapshot_interval", Constants.Revisions.SNAPSHOT_INTERVAL),
+            retention_days=settings.get("retention_days", 0),
+        )
+
+    # --- 記録 ---
+    def record(
+        self,
+        prompt_id: str,
+        original: str,
+        improved: str,
+        previous: Optional[Fields] = None,
+        previous_at: Optional[float] = None,
+    ) -> Optional[int]:
+        """新しい版を記録し、版番号を返します。最新の版と同じ内容なら記録せずにNoneを返します。
+
+        履歴のないプロンプトでは、`previous`（更新前の内容）を最初の版として先に記録します。
+        """
+        fields = (original, improved)
+        with self._lock:
+            latest = self._latest_locked(prompt_id)
+            if latest is None and previous is not None and previous != fields:
+                latest = self._insert_locked(prompt_id, 1, previous_at or time.time(), previous, None, None)
+            if latest is not None and latest.fields == fields:
+                return None
+            number = latest.number + 1 if latest is not None else 1
+            self._insert_locked(prompt_id, number, time.time(), fields, latest, self._last_snapshot_locked(prompt_id))
+            self._prune_locked(prompt_id, number)
+            self._conn.commit()
+            return number
+
+    def _insert_locked(
+        self,
+        prompt_id: str,
+        number: int,
+        created_at: float,
+        fields: Fields,
+        previous: Optional[Revision],
+        last_snapshot: Optional[int],
+    ) -> Revision:
+        kind, data = self.SNAPSHOT, encode_snapshot(fields)
+        if previous is not None and last_snapshot is not None and number - last_snapshot < self.snapshot_interval:
+            delta = encode_delta(previous.fields, fields)
+            if len(delta) < len(data):
+                kind, data = self.DELTA, delta
+        self._conn.execute(
+            "INSERT OR REPLACE INTO revisions (prompt_id, revision, created_at, kind, size, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (prompt_id, number, created_at, kind, len("".join(fields).encode("utf-8")), data),
+        )
+        revision = Revision(number, created_at, *fields)
+        self._remember_locked(prompt_id, revision)
+        return revision
+
+    def _remember_locked(self, prompt_id: str, revision: Revision):
+        self._latest[prompt_id] = revision
+        self._latest.move_to_end(prompt_id)
+        while len(self._latest) > self.LATEST_CACHE_SIZE:
+            self._latest.popitem(last=False)
+
+    def _latest_locked(self, prompt_id: str) -> Optional[Revision]:
+        if prompt_id in self._latest:
+            self._latest.move_to_end(prompt_id)
+            return self._latest[prompt_id]
+        row = self._conn.execute("SELECT MAX(revision) FROM revisions WHERE prompt_id = ?", (prompt_id,)).fetchone()
+        if row[0] is None:
+            return None
+        revision = self._get_locked(prompt_id, row[0])
+        if revision is not None:
+            self._remember_locked(prompt_id, revision)
+        return revision
+
+    def _last_snapshot_locked(self, prompt_id: str) -> Optional[int]:
+        return self._conn.execute(
+            "SELECT MAX(revision) FROM revisions WHERE prompt_id = ? AND kind = ?", (prompt_id, self.SNAPSHOT)
+        ).fetchone()[0]
+
+    def _prune_locked(self, prompt_id: str, latest: int):
+        """保持する最も古い版を決め、それより古い版を削除します。残す最古の版が差分ならスナップショットに置き換えます。"""
+        keep_from = latest - self.max_revisions + 1 if self.max_revisions and self.max_revisions > 0 else 1
+        if self.retention_days and self.retention_days > 0:
+            row = self._conn.execute(
+                "SELECT MIN(revision) FROM revisions WHERE prompt_id = ? AND created_at >= ?",
+                (prompt_id, time.time() - self.retention_days * 86400),
+            ).fetchone()
+            keep_from = max(keep_from, min(row[0] or latest, latest))
+        first = self._conn.execute("SELECT MIN(revision) FROM revisions WHERE prompt_id = ?", (prompt_id,)).fetchone()[0]
+        if first is None or keep_from <= first:
+            return
+        row = self._conn.execute(
+            "SELECT kind FROM revisions WHERE prompt_id = ? AND revision = ?", (prompt_id, keep_from)
+        ).fetchone()
+        if row is not None and row[0] == self.DELTA:
+            revision = self._get_locked(prompt_id, keep_from)
+            self._conn.execute(
+                "UPDATE revisions SET kind = ?, data = ? WHERE prompt_id = ? AND revision = ?",
+                (self.SNAPSHOT, encode_snapshot(revision.fields), prompt_id, keep_from),
+            )
+        self._conn.execute("DELETE FROM revisions WHERE prompt_id = ? AND revision < ?", (prompt_id, keep_from))
+
+    # --- 参照 ---
+    def get(self, prompt_id: str, number: int) -> Optional[Revision]:
+        """指定した版を返します。削除済みまたは存在しない版ならNoneです。"""
+        with self._lock:
+            return self._get_locked(prompt_id, number)
+
+    def _get_locked(self, prompt_id: str, number: int) -> Optional[Revision]:
+        latest = self._latest.get(prompt_id)
+        if latest is not None and latest.number == number:
+            return latest
+        base = self._conn.execute(
+            "SELECT MAX(revision) FROM revisions WHERE prompt_id = ? AND revision <= ? AND kind = ?",
+            (prompt_id, number, self.SNAPSHOT),
+        ).fetchone()[0]
+        if base is None:
+            return None
+        rows = self._conn.execute(
+            "SELECT revision, created_at, kind, data FROM revisions"
+            " WHERE prompt_id = ? AND revision BETWEEN ? AND ? ORDER BY revision",
+            (prompt_id, base, number),
+        ).fetchall()
+        if not rows or rows[-1][0] != number:
+            return None
+        fields: Fields = ("", "")
+        for _, _, kind, data in rows:
+            fields = decode_snapshot(data) if kind == self.SNAPSHOT else apply_delta(fields, data)
+        return Revision(number, rows[-1][1], *fields)
+
+    def latest(self, prompt_id: str) -> Optional[Revision]:
+        with self._lock:
+            return self._latest_locked(prompt_id)
+
+    def list_revisions(self, prompt_id: str) -> List[RevisionInfo]:
+        """プロンプトの版を新しい順に返します。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT revision, created_at, kind, LENGTH(data), size FROM revisions"
+                " WHERE prompt_id = ? ORDER BY revision DESC",
+                (prompt_id,),
+            ).fetchall()
+        return [RevisionInfo(number, created_at, kind == self.SNAPSHOT, stored, size) for number, created_at, kind, stored, size in rows]
+
+    def diff(self, prompt_id: str, old_number: int, new_number: int, field: str = "improved", context: int = 3) -> List[str]:
+        """2つの版の `field` (original / improved) の差分を unified diff 形式の行で返します。"""
+        if field not in FIELDS:
+            raise ValueError(f"不明な項目です: {field}")
+        old = self.get(prompt_id, old_number)
+        new = self.get(prompt_id, new_number)
+        if old is None or new is None:
+            raise ValueError(f"版 {old_number if old is None else new_number} はありません。")
+        return list(
+            difflib.unified_diff(
+                getattr(old, field).splitlines(keepends=True),
+                getattr(new, field).splitlines(keepends=True),
+                fromfile=f"rev {old_number}",
+                tofile=f"rev {new_number}",
+                n=context,
+            )
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """保存している版の数と、保存形式の合計サイズ・全文で保存した場合の合計サイズ（バイト）を返します。"""
+        with self._lock:
+            prompts, revisions, snapshots, stored, size = self._conn.execute(
+                "SELECT COUNT(DISTINCT prompt_id), COUNT(*), COALESCE(SUM(kind = 0), 0),"
+                " COALESCE(SUM(LENGTH(data)), 0), COALESCE(SUM(size), 0) FROM revisions"
+            ).fetchone()
+        return {"prompts": prompts, "revisions": revisions, "snapshots": snapshots, "stored_bytes": stored, "full_bytes": size}
+
+    # --- 削除 ---
+    def delete(self, prompt_id: str):
+        """プロンプトの全ての版を削除します。"""
+        with self._lock:
+            self._latest.pop(prompt_id, None)
+            self._conn.execute("DELETE FROM revisions WHERE prompt_id = ?", (prompt_id,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,355 @@
+# Prompt Master: API呼び出しの実行管理（タイムアウト・中止・再試行・待ち行列）。
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, List, Optional, Set, Tuple
+
+from config_manager import ConfigManager
+from constants import Constants
+
+
+def backoff_delay(
+    attempt: int,
+    base: float = Constants.Requests.BACKOFF_BASE_SECONDS,
+    maximum: float = Constants.Requests.BACKOFF_MAX_SECONDS,
+) -> float:
+    """`attempt` 回目の失敗後に待つ秒数です。指数的に伸ばし、同時に再試行が集中しないよう揺らぎを加えます。"""
+    delay = min(maximum, base * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class JobStatus:
+    """ジョブの状態です。"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    RETRY_WAIT = "retry_wait"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    TIMED_OUT = "timed_out"
+
+    FINISHED = (DONE, FAILED, CANCELLED, TIMED_OUT)
+    LABELS = {
+        PENDING: "待機中",
+        RUNNING: "実行中",
+        RETRY_WAIT: "再試行待ち",
+        DONE: "完了",
+        FAILED: "失敗",
+        CANCELLED: "中止",
+        TIMED_OUT: "タイムアウト",
+    }
+
+
+class Job:
+    """スケジューラで実行する1件のリクエストです。
+
+    `fn(job)` はワーカースレッドで呼び出されます。長い処理では `job.cancel_event` を確認して打ち切り、
+    API呼び出しのタイムアウトには `job.remaining()` を渡してください。ストリーミングでは応答を受け取るたびに
+    `job.touch()` を呼ぶと、タイムアウトが最後の応答からの経過時間で判定されます。応答の一部を利用者に
+    渡した後は `job.retryable = False` にすると、失敗しても再試行しません。
+    """
+
+    def __init__(self, job_id: int, label: str, fn: Callable[["Job"], Any], timeout: Optional[float], max_retries: int):
+        self.id = job_id
+        self.label = label
+        self.fn = fn
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.status = JobStatus.PENDING
+        self.attempts = 0
+        self.retryable = True
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.cancel_event = threading.Event()
+        self.created_at = time.monotonic()
+        self.attempt_started_at: Optional[float] = None
+        self.last_activity_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.retry_at: Optional[float] = None
+        self.on_done: Optional[Callable[["Job"], None]] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in JobStatus.FINISHED
+
+    def touch(self):
+        """応答の一部を受け取ったことを記録し、タイムアウトまでの時間を延長します。"""
+        self.last_activity_at = time.monotonic()
+
+    def remaining(self) -> Optional[float]:
+        """現在の試行のタイムアウトまでの残り秒数を返します。タイムアウトがなければNoneです。"""
+        if self.timeout is None or self.last_activity_at is None:
+            return self.timeout
+        return max(0.0, self.last_activity_at + self.timeout - time.monotonic())
+
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.created_at
+
+    def __repr__(self) -> str:
+        return f"Job({self.id}, {self.label!r}, {self.status}, attempts={self.attempts})"
+
+
+class RequestScheduler:
+    """API呼び出しを一定数のワーカースレッドで実行し、タイムアウト・中止・指数バックオフでの再試行を扱います。
+
+    投入されたジョブは待ち行列に入り、空いたワーカーから順に実行されます。試行ごとのタイムアウトを
+    過ぎたジョブは打ち切られたものとして扱い、そのワーカーは呼び出しが戻るまで切り離して
+    代わりのワーカーを起動します。状態の変化は `subscribe()` で登録したリスナーに通知されます。
+    """
+
+    RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+    HISTORY_SIZE = 20
+
+    def __init__(
+        self,
+        max_workers: int = Constants.Requests.MAX_WORKERS,
+        timeout: Optional[float] = Constants.Requests.TIMEOUT_SECONDS,
+        max_retries: int = Constants.Requests.MAX_RETRIES,
+        backoff_base: float = Constants.Requests.BACKOFF_BASE_SECONDS,
+        backoff_max: float = Constants.Requests.BACKOFF_MAX_SECONDS,
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._cond = threading.Condition()
+        self._ready: Deque[Job] = deque()
+        self._timers: List[Tuple[float, int, str, Job, int]] = []
+        self._timer_seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._jobs: "OrderedDict[int, Job]" = OrderedDict()
+        self._listeners: List[Callable[[Job], None]] = []
+        self._workers = 0
+        self._idle_workers = 0
+        # タイムアウトで切り離したワーカーの (ジョブID, 試行回数)
+        self._detached: Set[Tuple[int, int]] = set()
+        self._closed = False
+        self._timer_thread = threading.Thread(target=self._run_timers, name="request-timers", daemon=True)
+        self._timer_thread.start()
+
+    @classmethod
+    def from_config(cls, config_manager: ConfigManager) -> "RequestScheduler":
+        """api_settings のタイムアウト・再試行回数に従ってスケジューラを作成します。
+
+        モデルの比較で全てのモデルに同時にリクエストできるよう、ワーカー数は利用可能なモデル数以上にします。
+        """
+        timeout = config_manager.get_setting("api_settings", "request_timeout_seconds", Constants.Requests.TIMEOUT_SECONDS)
+        models = config_manager.get_setting("api_settings", "available_models", [])
+        return cls(
+            max_workers=max(Constants.Requests.MAX_WORKERS, len(models)),
+            timeout=timeout if timeout and timeout > 0 else None,
+            max_retries=config_manager.get_setting("api_settings", "max_retries", Constants.Requests.MAX_RETRIES),
+        )
+
+    # --- 購読 ---
+    def subscribe(self, listener: Callable[[Job], None]):
+        """ジョブの状態が変わるたびに `listener(job)` を呼び出すよう登録します。通知は状態を変えたスレッドで行います。"""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[Job], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _publish(self, job: Job):
+        for listener in list(self._listeners):
+            listener(job)
+
+    # --- 投入と中止 ---
+    def submit(
+        self,
+        label: str,
+        fn: Callable[[Job], Any],
+        on_done: Optional[Callable[[Job], None]] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+    ) -> Job:
+        """ジョブを待ち行列に投入します。`on_done(job)` は完了・失敗・中止・タイムアウトのいずれかで1回だけ呼ばれます。
+
+        `timeout` と `max_retries` を省略するとスケジューラの既定値を使います。`timeout` に0を指定するとタイムアウトしません。
+        """
+        if timeout is None:
+            timeout = self.timeout
+        job = Job(
+            next(self._ids),
+            label,
+            fn,
+            timeout if timeout else None,
+            self.max_retries if max_retries is None else max_retries,
+        )
+        job.on_done = on_done
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("スケジューラは停止しています。")
+            self._jobs[job.id] = job
+            self._enqueue(job)
+        self._publish(job)
+        return job
+
+    def _enqueue(self, job: Job):
+        job.status = JobStatus.PENDING
+        self._ready.append(job)
+        if len(self._ready) > self._idle_workers and self._workers < self.max_workers:
+            self._workers += 1
+            threading.Thread(target=self._run_worker, name="request-worker", daemon=True).start()
+        self._cond.notify_all()
+
+    def cancel(self, job: Job) -> bool:
+        """ジョブを中止します。実行中の呼び出しには `cancel_event` で中止を伝え、結果は破棄します。"""
+        return self._finish(job, JobStatus.CANCELLED, error=InterruptedError("中止されました。"))
+
+    def cancel_all(self):
+        with self._cond:
+            jobs = [job for job in self._jobs.values() if not job.finished]
+        for job in jobs:
+            self.cancel(job)
+
+    def jobs(self) -> List[Job]:
+        """未完了のジョブと、最近完了したジョブを投入順に返します。"""
+        with self._cond:
+            return list(self._jobs.values())
+
+    def active_count(self) -> int:
+        with self._cond:
+            return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def shutdown(self):
+        """未完了のジョブを全て中止し、ワーカーを停止します。"""
+        self.cancel_all()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # --- 実行 ---
+    def _run_worker(self):
+        while True:
+            with self._cond:
+                self._idle_workers += 1
+                while not self._ready and not self._closed:
+                    self._cond.wait()
+                self._idle_workers -= 1
+                if self._closed:
+                    self._workers -= 1
+                    return
+                job = self._ready.popleft()
+                if job.finished:
+                    continue
+                job.status = JobStatus.RUNNING
+                job.attempts += 1
+                job.attempt_started_at = job.last_activity_at = time.monotonic()
+                attempt = job.attempts
+                if job.timeout is not None:
+                    self._add_timer(job.attempt_started_at + job.timeout, "timeout", job, attempt)
+            self._publish(job)
+            try:
+                result = job.fn(job)
+            except BaseException as e:
+                self._on_attempt_failed(job, attempt, e)
+            else:
+                self._finish(job, JobStatus.DONE, result=result)
+            with self._cond:
+                if (job.id, attempt) in self._detached:
+                    # タイムアウト時に代わりのワーカーを起動済みのため、このワーカーは終了する
+                    self._detached.discard((job.id, attempt))
+                    return
+
+    def _on_attempt_failed(self, job: Job, attempt: int, error: BaseException):
+        with self._cond:
+            if job.finished or job.attempts != attempt:
+                return
+            if job.retryable and attempt <= job.max_retries and self.is_retryable(error):
+                delay = self.backoff_delay(attempt)
+                job.status = JobStatus.RETRY_WAIT
+                job.error = error
+                job.retry_at = time.monotonic() + delay
+                self._add_timer(job.retry_at, "retry", job, attempt)
+                retrying = True
+            else:
+                retrying = False
+        if retrying:
+            self._publish(job)
+        else:
+            self._finish(job, JobStatus.FAILED, error=error)
+
+    def _finish(self, job: Job, status: str, result: Any = None, error: Optional[BaseException] = None) -> bool:
+        with self._cond:
+            if job.finished:
+                return False
+            if job.status == JobStatus.RUNNING and status in (JobStatus.CANCELLED, JobStatus.TIMED_OUT):
+                self._detach_worker(job)
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.monotonic()
+            if status != JobStatus.DONE:
+                job.cancel_event.set()
+            self._trim_history()
+        if job.on_done is not None:
+            job.on_done(job)
+        self._publish(job)
+        return True
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(finished) - self.HISTORY_SIZE)]:
+            del self._jobs[job_id]
+
+    def backoff_delay(self, attempt: int) -> float:
+        """`attempt` 回目の失敗後に待つ秒数です。"""
+        return backoff_delay(attempt, self.backoff_base, self.backoff_max)
+
+    @classmethod
+    def is_retryable(cls, error: BaseException) -> bool:
+        """レート制限 (429) やサーバーエラー (5xx)、接続の失敗なら再試行します。"""
+        code = getattr(error, "code", None)
+        if isinstance(code, int):
+            return code in cls.RETRYABLE_STATUS_CODES
+        return isinstance(error, (ConnectionError, TimeoutError))
+
+    # --- タイマー（タイムアウトと再試行の待ち時間） ---
+    def _add_timer(self, at: float, kind: str, job: Job, attempt: int):
+        heapq.heappush(self._timers, (at, next(self._timer_seq), kind, job, attempt))
+        self._cond.notify_all()
+
+    def _run_timers(self):
+        while True:
+            timed_out: List[Job] = []
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    if self._timers and self._timers[0][0] <= now:
+                        break
+                    self._cond.wait(self._timers[0][0] - now if self._timers else None)
+                if self._closed:
+                    return
+                now = time.monotonic()
+                while self._timers and self._timers[0][0] <= now:
+                    _, _, kind, job, attempt = heapq.heappop(self._timers)
+                    if job.finished or job.attempts != attempt:
+                        continue
+                    if kind == "retry" and job.status == JobStatus.RETRY_WAIT:
+                        self._enqueue(job)
+                    elif kind == "timeout" and job.status == JobStatus.RUNNING:
+                        deadline = job.last_activity_at + job.timeout
+                        if deadline > now:
+                            self._add_timer(deadline, "timeout", job, attempt)
+                        else:
+                            timed_out.append(job)
+            for job in timed_out:
+                self._time_out(job)
+
+    def _time_out(self, job: Job):
+        self._finish(job, JobStatus.TIMED_OUT, error=TimeoutError(f"{job.timeout:g} 秒以内に応答がありませんでした。"))
+
+    def _detach_worker(self, job: Job):
+        """打ち切ったジョブを実行中のワーカーを切り離します。呼び出しが戻るまで使えないため、代わりを起動します。"""
+        self._detached.add((job.id, job.attempts))
+        self._workers -= 1
+        if len(self._ready) > self._idle_workers and self._workers < self.max_workers:
+            self._workers += 1
+            threading.Thread(target=self._run_worker, name="request-worker", daemon=True).start()
@@ -0,0 +1,301 @@
+# Prompt Master: MinHash/LSHによる、内容の似た保存済みプロンプト（ほぼ重複）の検出。
+
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+from itertools import chain, islice
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+
+from constants import Constants
+
+_MASK32 = 0xFFFFFFFF
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+# 空のビンを埋めるときに、借りてきた値を距離ごとにずらす定数（黄金比に由来する奇数）
+_DENSIFY_STEP = 0x9E3779B1
+
+
+def shingles(text: str) -> Set[Tuple[int, int]]:
+    """テキストを正規化し、連続する4文字（シングル）の集合に分解します。
+
+    UTF-32で8バイトずつ読むと2文字を1つの整数として取り出せるため、隣り合う2つの整数の組で
+    4文字を表します。偶数位置と奇数位置の2通りの読み出しで、全ての位置のシングルが文字単位の
+    ループなしに得られます。4文字未満のテキストは1つのシングルとして扱います。
+    """
+    normalized = " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+    encoded = normalized.encode("utf-32-le")
+    if len(normalized) < 4:
+        return {(int.from_bytes(encoded, "little"), 0)} if normalized else set()
+    even = array("Q", encoded[:len(encoded) // 8 * 8])
+    odd = array("Q", encoded[4:4 + (len(encoded) - 4) // 8 * 8])
+    result = set(zip(even, even[1:]))
+    result.update(zip(odd, odd[1:]))
+    return result
+
+
+def signature(shingle_set: Iterable[Tuple[int, int]], num_perm: int = Constants.Similarity.NUM_PERM) -> array:
+    """シングルの集合からMinHashシグネチャを計算します。
+
+    順列ごとに全シングルのハッシュを計算する代わりに、1つのハッシュをビンに振り分けてビンごとの
+    最小値を取る方式 (one permutation hashing) を使い、計算量をシングル数に比例する1回の走査に
+    抑えます。シングルの少ない短いテキストで空になったビンは、右隣の空でないビンの値を距離に
+    応じてずらして埋めます。タプルのハッシュはプロセスをまたいでも変わりません。
+    """
+    mins = [_MASK32 + 1] * num_perm
+    for value in map(hash, shingle_set):
+        value &= _MASK64
+        b = value % num_perm
+        value >>= 32
+        if value < mins[b]:
+            mins[b] = value
+    filled = [i for i, value in enumerate(mins) if value <= _MASK32]
+    if filled and len(filled) < num_perm:
+        for i in range(num_perm):
+            if mins[i] > _MASK32:
+                distance = next((d for d in range(1, num_perm) if mins[(i + d) % num_perm] <= _MASK32))
+                mins[i] = (mins[(i + distance) % num_perm] + distance * _DENSIFY_STEP) & _MASK32
+    return array("I", mins if filled else [0] * num_perm)
+
+
+def estimate(a: array, b: array) -> float:
+    """2つのシグネチャで一致するビンの割合から、Jaccard類似度を推定します。"""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+class SimilarityIndex:
+    """保存済みプロンプトの強化後・ベースプロンプトを対象にした、MinHash/LSHによる類似検索の索引です。
+
+    シグネチャを `bands` 個の帯に分け、帯ごとの値の組をキーにしたバケットへプロンプトを登録します。
+    いずれかの帯が一致したプロンプトだけを候補としてシグネチャで類似度を確かめるため、
+    検索の計算量はライブラリ全体の件数ではなく候補の数で決まります。
+
+    強化後のプロンプトは見出しなどの定型部分を共有するため、構築の最初に一部のプロンプトを調べ、
+    その半数以上に現れるシングルを除外してから計算します（除外しないと定型部分だけが一致する
+    プロンプトが同じバケットに大量に集まり、候補が増えて検索が遅くなります）。除外するシングルが
+    決まるまでに add() されたプロンプトは保留し、決まった時点で索引付けします。
+    """
+
+    def __init__(
+        self,
+        num_perm: int = Constants.Similarity.NUM_PERM,
+        bands: int = Constants.Similarity.BANDS,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm は bands で割り切れる必要があります。")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._lock = threading.RLock()
+        self._signatures: Dict[str, array] = {}
+        # 帯ごとに、キー -> プロンプトID（1件のうちはリストを作らずIDをそのまま持つ）
+        self._buckets: List[Dict[int, Union[str, List[str]]]] = [{} for _ in range(bands)]
+        # 構築中に追加・削除されたプロンプト。構築側が古い内容で上書きしないよう記録する
+        self._touched: Set[str] = set()
+        # 除外するシングル（構築の最初に決まる）と、それまでに追加されたプロンプト
+        self._stop_shingles: Optional[FrozenSet[Tuple[int, int]]] = None
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._built = threading.Event()
+        self.ready = False
+        self.discarded = False
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, prompt_id: object) -> bool:
+        return prompt_id in self._signatures
+
+    @staticmethod
+    def _shingles_of(prompt: Dict[str, Any]) -> Set[Tuple[int, int]]:
+        shingle_set = shingles(prompt.get("improved") or "")
+        shingle_set.update(shingles(prompt.get("original") or ""))
+        return shingle_set
+
+    def _sign(self, shingle_set: Set[Tuple[int, int]]) -> array:
+        if self._stop_shingles:
+            shingle_set -= self._stop_shingles
+        return signature(shingle_set, self.num_perm)
+
+    def signature_of(self, original: str, improved: str) -> array:
+        """強化後とベースプロンプトの両方のシングルから、定型部分を除いた1つのシグネチャを計算します。"""
+        return self._sign(self._shingles_of({"original": original, "improved": improved}))
+
+    def _band_keys(self, sig: array) -> List[int]:
+        rows = self.rows
+        return [hash(tuple(sig[i:i + rows])) for i in range(0, self.num_perm, rows)]
+
+    def build(self, prompts: Iterable[Dict[str, Any]]):
+        """プロンプト群を索引付けします。構築中の変更と競合しないよう、少量ずつロックを取得します。
+
+        シグネチャの計算はロックの外で行います。構築中に add/remove されたプロンプトは
+        そちらの内容を正とし、構築側では登録しません。
+        """
+        iterator = iter(prompts)
+        sample = [(p["id"], self._shingles_of(p)) for p in islice(iterator, Constants.Similarity.STOP_SAMPLE)]
+        self._set_stop_shingles([shingle_set for _, shingle_set in sample])
+        chunk: List[Tuple[str, array]] = []
+        chunk_size = Constants.Storage.SEARCH_INDEX_BUILD_CHUNK
+        for prompt_id, shingle_set in chain(sample, ((p["id"], self._shingles_of(p)) for p in iterator)):
+            if self.discarded:
+                self._built.set()
+                return
+            chunk.append((prompt_id, self._sign(shingle_set)))
+            if len(chunk) >= chunk_size:
+                self._insert_built(chunk)
+                chunk = []
+        self._insert_built(chunk)
+        with self._lock:
+            self._touched.clear()
+            self.ready = True
+        self._built.set()
+
+    def _set_stop_shingles(self, sample: List[Set[Tuple[int, int]]]):
+        """見本のプロンプトの半数以上（少なくとも一定件数）に現れるシングルを除外対象にし、保留分を索引付けします。"""
+        min_count = max(Constants.Similarity.STOP_MIN_COUNT, len(sample) * Constants.Similarity.STOP_RATIO)
+        counts = Counter(chain.from_iterable(sample))
+        stop_shingles = frozenset(shingle for shingle, count in counts.items() if count >= min_count)
+        with self._lock:
+            self._stop_shingles = stop_shingles
+            for prompt in self._pending.values():
+                self._insert(prompt["id"], self._sign(self._shingles_of(prompt)))
+            self._pending.clear()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """構築が終わるまで待ちます。構築が終わっていればTrueを返します。"""
+        return self._built.wait(timeout) and self.ready
+
+    def _insert_built(self, chunk: List[Tuple[str, array]]):
+        with self._lock:
+            for prompt_id, sig in chunk:
+                if prompt_id not in self._touched and prompt_id not in self._signatures:
+                    self._insert(prompt_id, sig)
+
+    def add(self, prompt: Dict[str, Any]):
+        """プロンプトを索引に追加します。既に登録済みの場合は置き換えます。"""
+        with self._lock:
+            if self._stop_shingles is None:
+                self._pending[prompt["id"]] = {key: prompt.get(key) for key in ("id", "original", "improved")}
+                self._touched.add(prompt["id"])
+                return
+        sig = self._sign(self._shingles_of(prompt))
+        with self._lock:
+            self.remove(prompt["id"])
+            self._insert(prompt["id"], sig)
+            if not self.ready:
+                self._touched.add(prompt["id"])
+
+    def _insert(self, prompt_id: str, sig: array):
+        self._signatures[prompt_id] = sig
+        for buckets, key in zip(self._buckets, self._band_keys(sig)):
+            members = buckets.get(key)
+            if members is None:
+                buckets[key] = prompt_id
+            elif isinstance(members, list):
+                members.append(prompt_id)
+            else:
+                buckets[key] = [members, prompt_id]
+
+    def remove(self, prompt_id: str):
+        """プロンプトを索引から取り除きます。"""
+        with self._lock:
+            if not self.ready:
+                self._touched.add(prompt_id)
+            self._pending.pop(prompt_id, None)
+            sig = self._signatures.pop(prompt_id, None)
+            if sig is None:
+                return
+            for buckets, key in zip(self._buckets, self._band_keys(sig)):
+                members = buckets.get(key)
+                if isinstance(members, list):
+                    members.remove(prompt_id)
+                    if len(members) == 1:
+                        buckets[key] = members[0]
+                elif members is not None:
+                    del buckets[key]
+
+    def _candidates(self, sig: array) -> Set[str]:
+        candidates: Set[str] = set()
+        for buckets, key in zip(self._buckets, self._band_keys(sig)):
+            members = buckets.get(key)
+            if isinstance(members, list):
+                candidates.update(members)
+            elif members is not None:
+                candidates.add(members)
+        return candidates
+
+    def _rank(
+        self, sig: array, exclude: Optional[str], threshold: float, limit: Optional[int]
+    ) -> List[Tuple[str, float]]:
+        with self._lock:
+            scored = [
+                (prompt_id, estimate(sig, self._signatures[prompt_id]))
+                for prompt_id in self._candidates(sig)
+                if prompt_id != exclude
+            ]
+        ranked = sorted((item for item in scored if item[1] >= threshold), key=lambda item: -item[1])
+        return ranked if limit is None else ranked[:limit]
+
+    def similar(
+        self,
+        prompt_id: str,
+        threshold: float = Constants.Similarity.SIMILAR_THRESHOLD,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[str, float]]:
+        """登録済みのプロンプトに似たプロンプトのIDと推定類似度を、類似度の高い順に返します。"""
+        sig = self._signatures.get(prompt_id)
+        if sig is None:
+            return []
+        return self._rank(sig, prompt_id, threshold, limit)
+
+    def similar_to(
+        self,
+        original: str,
+        improved: str,
+        threshold: float = Constants.Similarity.SIMILAR_THRESHOLD,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[str, float]]:
+        """未保存の内容に似たプロンプトのIDと推定類似度を、類似度の高い順に返します。"""
+        return self._rank(self.signature_of(original, improved), None, threshold, limit)
+
+    def similarity(self, a: str, b: str) -> Optional[float]:
+        """2つの登録済みプロンプトの推定類似度を返します。どちらかが未登録ならNoneです。"""
+        sig_a, sig_b = self._signatures.get(a), self._signatures.get(b)
+        if sig_a is None or sig_b is None:
+            return None
+        return estimate(sig_a, sig_b)
+
+    def duplicate_groups(self, threshold: float = Constants.Similarity.DUPLICATE_THRESHOLD) -> List[List[str]]:
+        """推定類似度が `threshold` 以上の組をつないだ、ほぼ重複するプロンプトのグループを返します。
+
+        同じバケットに入った組だけを確かめるため、全ての組を比べる必要はありません。大きなバケットでは
+        先頭のプロンプトとだけ比べます。グループは件数の多い順に返します。
+        """
+        parent: Dict[str, str] = {}
+
+        def find(prompt_id: str) -> str:
+            root = parent.setdefault(prompt_id, prompt_id)
+            while root != parent[root]:
+                parent[root] = parent[parent[root]]
+                root = parent[root]
+            return root
+
+        checked: Set[Tuple[str, str]] = set()
+        with self._lock:
+            for buckets in self._buckets:
+                for members in buckets.values():
+                    if not isinstance(members, list):
+                        continue
+                    if len(members) <= Constants.Similarity.DUPLICATE_PAIRWISE_LIMIT:
+                        pairs = ((a, b) for i, a in enumerate(members) for b in members[i + 1:])
+                    else:
+                        pairs = ((members[0], b) for b in members[1:])
+                    for a, b in pairs:
+                        pair = (a, b) if a < b else (b, a)
+                        if pair in checked or find(a) == find(b):
+                            continue
+                        checked.add(pair)
+                        if estimate(self._signatures[a], self._signatures[b]) >= threshold:
+                            parent[find(a)] = find(b)
+        groups: Dict[str, List[str]] = {}
+        for prompt_id in parent:
+            groups.setdefault(find(prompt_id), []).append(prompt_id)
+        return sorted((group for group in groups.values() if len(group) > 1), key=len, reverse=True)
@@ -0,0 +1,1528 @@
+# Prompt Master: セーブ済みプロンプトの永続化と検索。
+
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from config_manager import ConfigManager
+from constants import Constants
+from persistence import WriteBehindQueue, atomic_open
+from revisions import RevisionStore
+from similarity import SimilarityIndex
+
+logger = logging.getLogger(__name__)
+
+
+class StorageBackend:
+    """プロンプトの永続化方式を抽象化する基底クラスです。"""
+
+    def load(self) -> List[Dict[str, Any]]:
+        """保存されている全てのプロンプトを読み込みます。"""
+        raise NotImplementedError
+
+    def apply(self, operation: Dict[str, Any], prompts: Sequence[Dict[str, Any]]):
+        """1件の変更操作を永続化します。`prompts` は操作適用後の全プロンプトです。"""
+        raise NotImplementedError
+
+    def compact(self, prompts: Sequence[Dict[str, Any]]):
+        """未集約の変更をまとめて書き出します。既定では何もしません。"""
+
+    def rewrite(self, prompts: Sequence[Dict[str, Any]]):
+        """操作によらない変更（読み込み時の補完など）を含め、全てのプロンプトを書き直します。"""
+        raise NotImplementedError
+
+
+class JsonFileBackend(StorageBackend):
+    """変更のたびにsaved_prompts.json全体を書き直す従来方式のバックエンドです。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def load(self) -> List[Dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                return json.load(f).get("saved_prompts", [])
+        except (json.JSONDecodeError, IOError):
+            return []
+
+    def apply(self, operation: Dict[str, Any], prompts: Sequence[Dict[str, Any]]):
+        self._write_snapshot(prompts)
+
+    def compact(self, prompts: Sequence[Dict[str, Any]]):
+        self._write_snapshot(prompts)
+
+    def rewrite(self, prompts: Sequence[Dict[str, Any]]):
+        self._write_snapshot(prompts)
+
+    def _write_snapshot(self, prompts: Sequence[Dict[str, Any]]):
+        """一時ファイルに書き出してから置き換えるため、書き込み中に終了しても以前のスナップショットが残ります。"""
+        with atomic_open(self.path) as f:
+            json.dump({"saved_prompts": list(prompts)}, f, indent=2, ensure_ascii=False)
+
+
+class JournalBackend(JsonFileBackend):
+    """スナップショットと追記専用の操作ログでプロンプトを永続化します。
+
+    各変更は操作ログへの1行の追記で済み、ログが一定量を超えるとスナップショット
+    (saved_prompts.json) に集約されます。スナップショットは従来形式と同一のため、
+    既存のsaved_prompts.jsonはそのまま読み込めます。
+
+    `write_queue` を渡すと、操作ログへの追記をバックグラウンドでまとめて行います。
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        journal_path: Path,
+        compact_min_ops: int = Constants.Storage.JOURNAL_COMPACT_MIN_OPS,
+        write_queue: Optional[WriteBehindQueue] = None,
+    ):
+        super().__init__(path)
+        self.journal_path = journal_path
+        self.compact_min_ops = compact_min_ops
+        self.write_queue = write_queue
+        self._journal_ops = 0
+        self._has_torn_tail = False
+        # 未書き込みの操作ログの行。追記と集約が交錯しないよう _lock で保護する
+        self._pending_lines: List[str] = []
+        self._lock = threading.Lock()
+
+    def load(self) -> List[Dict[str, Any]]:
+        """スナップショットを読み込み、操作ログを再生して最新状態を復元します。
+
+        IDのない行や、旧形式のファイルで同じIDを持つ2件目以降の行も捨てずに返します
+        （新しいIDは読み込み側で割り当てます）。
+        """
+        prompt_map: Dict[str, Dict[str, Any]] = {}
+        unkeyed: List[Dict[str, Any]] = []
+        for prompt in super().load():
+            if "id" not in prompt or prompt["id"] in prompt_map:
+                unkeyed.append(prompt)
+            else:
+                prompt_map[prompt["id"]] = prompt
+        self._journal_ops = 0
+        self._has_torn_tail = False
+        if self.journal_path.exists():
+            try:
+                with self.journal_path.open("r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            operation = json.loads(line)
+                        except json.JSONDecodeError:
+                            # 書き込み途中で中断された末尾行。次回の変更時に集約して破棄する
+                            self._has_torn_tail = True
+                            continue
+                        self._replay(prompt_map, operation)
+                        self._journal_ops += 1
+            except IOError:
+                pass
+        return list(prompt_map.values()) + unkeyed
+
+    @staticmethod
+    def _replay(prompt_map: Dict[str, Dict[str, Any]], operation: Dict[str, Any]):
+        """操作を1件適用します。集約中の中断に備え、同じ操作を重ねて適用しても結果は変わりません。"""
+        op = operation.get("op")
+        if op == "add":
+            prompt = operation["prompt"]
+            prompt_map[prompt["id"]] = prompt
+        elif op == "update":
+            prompt = prompt_map.get(operation["id"])
+            if prompt:
+                prompt.update(operation["fields"])
+        elif op == "delete":
+            prompt_map.pop(operation["id"], None)
+
+    def apply(self, operation: Dict[str, Any], prompts: Sequence[Dict[str, Any]]):
+        line = json.dumps(operation, ensure_ascii=False) + "\n"
+        if self.write_queue is None:
+            with self._lock, self.journal_path.open("a", encoding="utf-8") as f:
+                f.write(line)
+        else:
+            with self._lock:
+                self._pending_lines.append(line)
+            self.write_queue.schedule(self.journal_path, self._flush_pending)
+        self._journal_ops += 1
+        # ライブラリ件数に比例した閾値にすることで、集約コストを変更1件あたり定数に償却する
+        if self._has_torn_tail or self._journal_ops >= max(self.compact_min_ops, len(prompts)):
+            self.compact(prompts)
+
+    def compact(self, prompts: Sequence[Dict[str, Any]]):
+        """スナップショットを書き出してから操作ログを空にします。"""
+        if self._journal_ops == 0 and not self._has_torn_tail:
+            return
+        self.rewrite(prompts)
+
+    def _flush_pending(self):
+        """待機中の操作ログの行をまとめて追記し、ディスクへの書き込みを待ちます。"""
+        with self._lock:
+            if not self._pending_lines:
+                return
+            with self.journal_path.open("a", encoding="utf-8") as f:
+                f.write("".join(self._pending_lines))
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending_lines.clear()
+
+    def rewrite(self, prompts: Sequence[Dict[str, Any]]):
+        """スナップショットを書き出し、操作ログを空にします。未書き込みの操作はスナップショットに含まれます。"""
+        with self._lock:
+            self._write_snapshot(prompts)
+            self._pending_lines.clear()
+            self.journal_path.open("w", encoding="utf-8").close()
+            self._journal_ops = 0
+        self._has_torn_tail = False
+
+
+class SearchIndex:
+    """保存済みプロンプトのタイトル・本文に対する全文検索用の転置インデックスです。
+
+    日本語を分かち書きせずに扱えるよう、文字unigramとbigramを単位に索引付けします。
+    検索結果はタイトル・ベース・強化後の順にヒットしたフィールドで順位付けし、同順位では新しく
+    索引付けされたものを優先します。
+    """
+
+    FIELDS = ("title", "original", "improved")
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, array]] = {field: {} for field in self.FIELDS}
+        self._doc_ids: List[Optional[str]] = []
+        self._doc_numbers: Dict[str, int] = {}
+        self._removed_count = 0
+        self.ready = False
+        self.discarded = False
+
+    @staticmethod
+    def _bigrams(encoded: bytes) -> Iterable[int]:
+        """UTF-32で符号化した文字列から、隣り合う2文字を1つの整数として取り出します。
+
+        8バイト単位で読むと2文字ずつ取り出せるため、偶数位置と奇数位置の2通りの読み出しで
+        全てのbigramを文字単位のループなしに得られます。unigram (2^21未満) と値域は重なりません。
+        """
+        even = len(encoded) // 8 * 8
+        odd = (len(encoded) - 4) // 8 * 8
+        yield from array("Q", encoded[:even])
+        if odd > 0:
+            yield from array("Q", encoded[4:4 + odd])
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """全角・半角や大文字・小文字の違いを吸収した比較用の文字列を返します。"""
+        return unicodedata.normalize("NFKC", text).casefold()
+
+    @classmethod
+    def tokenize(cls, text: str) -> Set[int]:
+        """テキストを正規化し、索引用のunigram・bigramトークン集合に分解します。"""
+        encoded = cls.normalize(text).encode("utf-32-le")
+        tokens = set(array("I", encoded))
+        tokens.update(cls._bigrams(encoded))
+        return tokens
+
+    @classmethod
+    def query_tokens(cls, query: str) -> List[Set[int]]:
+        """検索語を空白で区切り、語ごとにbigram（1文字の語はunigram）のトークン集合を返します。"""
+        terms: List[Set[int]] = []
+        for term in cls.normalize(query).split():
+            encoded = term.encode("utf-32-le")
+            terms.append(set(array("I", encoded) if len(term) == 1 else cls._bigrams(encoded)))
+        return terms
+
+    def build(self, prompts: Iterable[Dict[str, Any]], lookup: Callable[[str], Optional[Dict[str, Any]]]):
+        """プロンプト群を索引付けします。構築中の変更と競合しないよう、少量ずつロックを取得します。
+
+        `lookup` で最新のプロンプトを引き直すため、構築中に削除・更新されたものは正しく反映されます。
+        """
+        prompt_ids = [p["id"] for p in prompts]
+        chunk_size = Constants.Storage.SEARCH_INDEX_BUILD_CHUNK
+        for start in range(0, len(prompt_ids), chunk_size):
+            if self.discarded:
+                return
+            with self._lock:
+                for prompt_id in prompt_ids[start:start + chunk_size]:
+                    prompt = lookup(prompt_id)
+                    if prompt is not None and prompt_id not in self._doc_numbers:
+                        self.add(prompt)
+        self.ready = True
+
+    def add(self, prompt: Dict[str, Any]):
+        """プロンプトを索引に追加します。既に登録済みの場合は置き換えます。"""
+        with self._lock:
+            self.remove(prompt["id"])
+            number = len(self._doc_ids)
+            self._doc_ids.append(prompt["id"])
+            self._doc_numbers[prompt["id"]] = number
+            for field in self.FIELDS:
+                postings = self._postings[field]
+                for token in self.tokenize(prompt.get(field) or ""):
+                    doc_list = postings.get(token)
+                    if doc_list is None:
+                        doc_list = postings[token] = array("I")
+                    doc_list.append(number)
+
+    def remove(self, prompt_id: str):
+        """プロンプトを索引から取り除きます。転置リストからの除去は再採番時にまとめて行います。"""
+        with self._lock:
+            number = self._doc_numbers.pop(prompt_id, None)
+            if number is None:
+                return
+            self._doc_ids[number] = None
+            self._removed_count += 1
+            if self._removed_count > 1000 and self._removed_count > len(self._doc_numbers):
+                self._renumber()
+
+    def _renumber(self):
+        """削除済みの文書番号を詰めて、転置リストを再構築します。"""
+        mapping: Dict[int, int] = {}
+        live_ids: List[Optional[str]] = []
+        for number, prompt_id in enumerate(self._doc_ids):
+            if prompt_id is not None:
+                mapping[number] = len(live_ids)
+                live_ids.append(prompt_id)
+        for field in self.FIELDS:
+            postings = self._postings[field]
+            for token in list(postings):
+                remapped = array("I", (mapping[n] for n in postings[token] if n in mapping))
+                if remapped:
+                    postings[token] = remapped
+                else:
+                    del postings[token]
+        self._doc_ids = live_ids
+        self._doc_numbers = {prompt_id: number for number, prompt_id in enumerate(live_ids)}
+        self._removed_count = 0
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """全ての検索語をいずれかのフィールドに含むプロンプトのIDを、関連度順に返します。
+
+        全ての語を1つのフィールドに含むものをそのフィールドの順に優先し、語が複数のフィールドに
+        分かれているものはその後に続けます。
+        """
+        terms = self.query_tokens(query)
+        if not terms:
+            return []
+        ranked: List[str] = []
+        seen: Set[int] = set()
+        with self._lock:
+            # 検索語ごと・フィールドごとに一致する文書番号を1度だけ求め、まとまりの計算に使い回す
+            term_matches = [[self._match(self._postings[field], tokens) for field in self.FIELDS] for tokens in terms]
+            groups = [set.intersection(*(per_field[i] for per_field in term_matches)) for i in range(len(self.FIELDS))]
+            if len(terms) > 1:
+                groups.append(set.intersection(*(set.union(*per_field) for per_field in term_matches)))
+            for matches in groups:
+                matches -= seen
+                seen |= matches
+                for number in sorted(matches, reverse=True):
+                    prompt_id = self._doc_ids[number]
+                    if prompt_id is not None:
+                        ranked.append(prompt_id)
+                if limit is not None and len(ranked) >= limit:
+                    break
+        return ranked if limit is None else ranked[:limit]
+
+    @staticmethod
+    def _match(postings: Dict[int, array], tokens: Set[int]) -> Set[int]:
+        """全トークンを含む文書番号の集合を、短い転置リストから順に積集合を取って求めます。"""
+        doc_lists = [postings.get(token) for token in tokens]
+        if any(doc_list is None for doc_list in doc_lists):
+            return set()
+        doc_lists.sort(key=len)
+        result = set(doc_lists[0])
+        for doc_list in doc_lists[1:]:
+            if not result:
+                break
+            result.intersection_update(doc_list)
+        return result
+
+
+class StorageEvent:
+    """保存済みプロンプトの変更通知です。`index` は既定の並び順における位置を表します。"""
+
+    ADDED = "added"
+    UPDATED = "updated"
+    REMOVED = "removed"
+    MOVED = "moved"
+
+    def __init__(self, kind: str, prompt_id: str, index: Optional[int] = None, old_index: Optional[int] = None):
+        self.kind = kind
+        self.prompt_id = prompt_id
+        self.index = index
+        self.old_index = old_index
+
+    def __repr__(self) -> str:
+        return f"StorageEvent({self.kind!r}, {self.prompt_id!r}, index={self.index}, old_index={self.old_index})"
+
+
+class StorageNotifier:
+    """ストレージの変更をリスナーへ通知する機能を提供するMixinです。"""
+
+    _listeners: List[Callable[[StorageEvent], None]]
+
+    def subscribe(self, listener: Callable[[StorageEvent], None]):
+        """変更通知を受け取るリスナーを登録します。通知は変更を行ったスレッドで呼び出されます。"""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[StorageEvent], None]):
+        """登録済みのリスナーを解除します。"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, kind: str, prompt_id: str, index: Optional[int] = None, old_index: Optional[int] = None):
+        event = StorageEvent(kind, prompt_id, index, old_index)
+        for listener in list(self._listeners):
+            listener(event)
+
+
+class PromptId:
+    """時刻順に並ぶ一意なプロンプトID（ULID互換、Crockford Base32の26文字）を生成します。
+
+    先頭48ビットがミリ秒単位の時刻、続く10ビットがミリ秒未満のマイクロ秒、残り70ビットが乱数です。
+    同じプロセス内で生成したIDは、時計が戻った場合も含めて生成順に単調増加します。
+    """
+
+    ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+    LENGTH = 26
+    _RANDOM_BITS = 70
+    _lock = threading.Lock()
+    _last_value = 0
+
+    @classmethod
+    def new(cls, when: Optional[datetime] = None) -> str:
+        """新しいIDを返します。`when` を指定するとその時刻のIDを返します（単調性は保証しません）。"""
+        if when is None:
+            micros = time.time_ns() // 1000
+        else:
+            micros = int(when.replace(microsecond=0).timestamp()) * 1_000_000 + when.microsecond
+        millis, sub_millis = divmod(micros, 1000)
+        value = (((millis << 10) | sub_millis) << cls._RANDOM_BITS) | secrets.randbits(cls._RANDOM_BITS)
+        if when is None:
+            with cls._lock:
+                if value <= cls._last_value:
+                    value = cls._last_value + 1
+                cls._last_value = value
+        return cls._encode(value)
+
+    @classmethod
+    def _encode(cls, value: int) -> str:
+        chars = []
+        for _ in range(cls.LENGTH):
+            value, digit = divmod(value, 32)
+            chars.append(cls.ALPHABET[digit])
+        return "".join(reversed(chars))
+
+    @classmethod
+    def is_valid(cls, value: Any) -> bool:
+        """この形式のIDかどうかを判定します。"""
+        return isinstance(value, str) and len(value) == cls.LENGTH and all(c in cls.ALPHABET for c in value)
+
+    @classmethod
+    def from_legacy(cls, prompt: Dict[str, Any]) -> str:
+        """旧形式（作成日時のISO形式）のIDを持つプロンプトに、作成順を保った新しいIDを割り当てます。"""
+        try:
+            when = datetime.fromisoformat(prompt["id"])
+        except (KeyError, TypeError, ValueError):
+            try:
+                when = datetime.strptime(prompt.get("timestamp", ""), "%Y-%m-%d %H:%M")
+            except (TypeError, ValueError):
+                when = datetime.now()
+        return cls.new(when)
+
+
+class SortedPromptList(Sequence[Dict[str, Any]]):
+    """キーの降順に保たれたプロンプトの読み取り専用シーケンスです。変更はadd()とremove()で行います。
+
+    要素を一定数ごとのバケットに分けて保持し、バケットごとの件数をFenwick木で管理することで、
+    挿入・削除・位置の取得を一覧全体をずらしたりソートし直したりせずにO(log n)で行います。
+    キーは要素ごとに一意である必要があります。
+    """
+
+    LOAD = 1000
+
+    def __init__(self, key: Callable[[Dict[str, Any]], Any], items: Iterable[Dict[str, Any]] = ()):
+        self._key = key
+        # 内部では昇順に保持し、公開する位置は末尾から数える
+        ordered = sorted(items, key=key)
+        self._buckets = [ordered[i:i + self.LOAD] for i in range(0, len(ordered), self.LOAD)]
+        self._keys = [[key(item) for item in bucket] for bucket in self._buckets]
+        self._maxes = [keys[-1] for keys in self._keys]
+        self._len = len(ordered)
+        self._build_tree()
+
+    def _build_tree(self):
+        tree = [0] + [len(bucket) for bucket in self._buckets]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, bucket: int, delta: int):
+        i = bucket + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, bucket: int) -> int:
+        """指定したバケットより前にある要素の数を返します。"""
+        total = 0
+        while bucket > 0:
+            total += self._tree[bucket]
+            bucket -= bucket & -bucket
+        return total
+
+    def _locate(self, position: int) -> Tuple[int, int]:
+        """内部の位置をバケット番号とバケット内の位置に変換します。"""
+        bucket = 0
+        step = 1 << (len(self._tree).bit_length() - 1)
+        while step:
+            candidate = bucket + step
+            if candidate < len(self._tree) and self._tree[candidate] <= position:
+                position -= self._tree[candidate]
+                bucket = candidate
+            step >>= 1
+        return bucket, position
+
+    def _find(self, item: Dict[str, Any]) -> Tuple[int, int]:
+        key = self._key(item)
+        bucket = bisect_left(self._maxes, key)
+        if bucket < len(self._maxes):
+            offset = bisect_left(self._keys[bucket], key)
+            if offset < len(self._keys[bucket]) and self._buckets[bucket][offset] is item:
+                return bucket, offset
+        raise ValueError("一覧に含まれていないプロンプトです")
+
+    def _public_index(self, bucket: int, offset: int) -> int:
+        return self._len - 1 - (self._prefix(bucket) + offset)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step == 1:
+                return list(islice(self._iter_from(start), max(0, stop - start)))
+            return [self[i] for i in range(start, stop, step)]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError(index)
+        bucket, offset = self._locate(self._len - 1 - index)
+        return self._buckets[bucket][offset]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self._iter_from(0)
+
+    def _iter_from(self, start: int) -> Iterator[Dict[str, Any]]:
+        if start >= self._len:
+            return
+        bucket, offset = self._locate(self._len - 1 - start)
+        yield from reversed(self._buckets[bucket][:offset + 1])
+        for previous in range(bucket - 1, -1, -1):
+            yield from reversed(self._buckets[previous])
+
+    def __contains__(self, item) -> bool:
+        try:
+            self._find(item)
+        except ValueError:
+            return False
+        return True
+
+    def index(self, item, start: int = 0, stop: Optional[int] = None) -> int:
+        """要素の位置を、全件を走査せずに返します。"""
+        return self._public_index(*self._find(item))
+
+    def add(self, item: Dict[str, Any]) -> int:
+        """要素を挿入し、その位置を返します。"""
+        key = self._key(item)
+        if not self._buckets:
+            self._buckets, self._keys, self._maxes = [[item]], [[key]], [key]
+            self._len = 1
+            self._build_tree()
+            return 0
+        bucket = min(bisect_left(self._maxes, key), len(self._maxes) - 1)
+        keys = self._keys[bucket]
+        offset = bisect_left(keys, key)
+        keys.insert(offset, key)
+        self._buckets[bucket].insert(offset, item)
+        self._maxes[bucket] = keys[-1]
+        self._len += 1
+        index = self._public_index(bucket, offset)
+        if len(keys) > 2 * self.LOAD:
+            half = len(keys) // 2
+            self._buckets[bucket:bucket + 1] = [self._buckets[bucket][:half], self._buckets[bucket][half:]]
+            self._keys[bucket:bucket + 1] = [keys[:half], keys[half:]]
+            self._maxes[bucket:bucket + 1] = [keys[half - 1], keys[-1]]
+            self._build_tree()
+        else:
+            self._tree_add(bucket, 1)
+        return index
+
+    def remove(self, item: Dict[str, Any]) -> int:
+        """要素を取り除き、取り除く前の位置を返します。キーが挿入時から変わる前に呼び出してください。"""
+        bucket, offset = self._find(item)
+        index = self._public_index(bucket, offset)
+        keys = self._keys[bucket]
+        del keys[offset]
+        del self._buckets[bucket][offset]
+        self._len -= 1
+        if keys:
+            self._maxes[bucket] = keys[-1]
+            self._tree_add(bucket, -1)
+        else:
+            del self._buckets[bucket], self._keys[bucket], self._maxes[bucket]
+            self._build_tree()
+        return index
+
+
+class ImportReport:
+    """プロンプトの取り込み結果の集計です。"""
+
+    def __init__(self):
+        self.added = 0
+        self.merged = 0
+        self.skipped = 0
+        self.invalid = 0
+
+    @property
+    def processed(self) -> int:
+        return self.added + self.merged + self.skipped + self.invalid
+
+    def summary(self) -> str:
+        return (
+            f"{self.added} 件を追加、{self.merged} 件を既存のプロンプトに統合、"
+            f"{self.skipped} 件を重複のためスキップ、{self.invalid} 件を不正な形式のためスキップしました。"
+        )
+
+
+def record_revision(
+    revisions: Optional[RevisionStore], prompt_id: str, previous: Dict[str, Any], original: str, improved: str
+):
+    """更新前後の内容を版の履歴に記録します。履歴の記録に失敗してもプロンプトの更新自体は失敗させません。"""
+    if revisions is None:
+        return
+    try:
+        previous_at: Optional[float] = datetime.strptime(previous.get("timestamp", ""), "%Y-%m-%d %H:%M").timestamp()
+    except ValueError:
+        previous_at = None
+    try:
+        revisions.record(
+            prompt_id,
+            original,
+            improved,
+            previous=(previous.get("original", ""), previous.get("improved", "")),
+            previous_at=previous_at,
+        )
+    except sqlite3.Error as e:
+        logger.warning("版の履歴の記録に失敗しました: %s", e)
+
+
+def similar_prompts(
+    index: SimilarityIndex,
+    lookup: Callable[[str], Optional[Dict[str, Any]]],
+    prompt_id: str,
+    threshold: float,
+    limit: Optional[int],
+) -> List[Tuple[Dict[str, Any], float]]:
+    """索引で見つけた類似プロンプトを、推定類似度とともに類似度の高い順に返します。"""
+    results = []
+    for similar_id, score in index.similar(prompt_id, threshold, limit):
+        prompt = lookup(similar_id)
+        if prompt is not None:
+            results.append((prompt, score))
+    return results
+
+
+def duplicate_prompt_groups(
+    index: SimilarityIndex, lookup: Callable[[str], Optional[Dict[str, Any]]], threshold: float
+) -> List[List[Tuple[Dict[str, Any], float]]]:
+    """ほぼ重複するプロンプトのグループを返します。
+
+    各グループは新しい順に並べ、先頭のプロンプトに対する推定類似度を添えます（先頭自身は1.0）。
+    """
+    groups = []
+    for prompt_ids in index.duplicate_groups(threshold):
+        prompts = [prompt for prompt in map(lookup, prompt_ids) if prompt is not None]
+        if len(prompts) < 2:
+            continue
+        prompts.sort(key=lambda p: (p.get("timestamp", ""), p["id"]), reverse=True)
+        head = prompts[0]["id"]
+        groups.append([(prompt, index.similarity(head, prompt["id"]) or 0.0) for prompt in prompts])
+    return groups
+
+
+class PromptStorageManager(StorageNotifier):
+    """保存済みプロンプトのCRUD操作を管理します。永続化は差し替え可能なバックエンドに委譲します。
+
+    `revisions` を渡すと、update_prompt で上書きする前の内容を版の履歴として残します。
+    検索インデックスと類似検索の索引は最初に使われたときに構築し、以降は変更のたびに更新します。
+    """
+
+    def __init__(
+        self,
+        base_path: Path,
+        backend: Optional[StorageBackend] = None,
+        write_queue: Optional[WriteBehindQueue] = None,
+        revisions: Optional[RevisionStore] = None,
+    ):
+        self.prompts_path = base_path / Constants.PROMPTS_FILE
+        self.backend = backend or JournalBackend(
+            self.prompts_path, base_path / Constants.PROMPTS_JOURNAL_FILE, write_queue=write_queue
+        )
+        self.prompts = SortedPromptList(self._order_key)
+        self._prompt_map: Dict[str, Dict[str, Any]] = {}
+        # 内容ハッシュ -> そのハッシュを持つプロンプトのID（旧データには同一内容が複数ある場合がある）
+        self._hash_index: Dict[str, Set[str]] = {}
+        self._search_index: Optional[SearchIndex] = None
+        self._similarity_index: Optional[SimilarityIndex] = None
+        self._listeners: List[Callable[[StorageEvent], None]] = []
+        self.revisions = revisions
+        self._load_prompts()
+
+    @staticmethod
+    def make_title(improved_prompt: str) -> str:
+        """強化後のプロンプトの1行目から既定のタイトルを生成します。"""
+        first_line = improved_prompt.splitlines()[0] if improved_prompt else ""
+        return first_line[:100] or Constants.Text.UNTITLED_PROMPT
+
+    @staticmethod
+    def content_hash(improved_prompt: str) -> str:
+        """重複判定に用いる内容ハッシュを計算します。"""
+        return hashlib.sha256(improved_prompt.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _sort_key(order: str):
+        """list_prompts() の並び順に対応するソートキーと降順フラグを返します。"""
+        if order == "newest":
+            return (lambda p: (p.get("timestamp", ""), p["id"])), True
+        if order == "oldest":
+            return (lambda p: (p.get("timestamp", ""), p["id"])), False
+        if order == "title":
+            return (lambda p: (p.get("title", ""), p["id"])), False
+        raise ValueError(f"不明な並び順です: {order}")
+
+    @staticmethod
+    def normalize_import(record: Any) -> Optional[Dict[str, Any]]:
+        """取り込むレコードを保存形式に揃えます。強化後のプロンプトを持たない場合はNoneを返します。
+
+        IDは有効な形式の場合だけ引き継ぎ、使用中かどうかは呼び出し側で確かめます。
+        """
+        if not isinstance(record, dict):
+            return None
+        improved = record.get("improved")
+        if not isinstance(improved, str) or not improved:
+            return None
+        timestamp = record.get("timestamp")
+        title = record.get("title")
+        original = record.get("original")
+        return {
+            "id": record["id"] if PromptId.is_valid(record.get("id")) else None,
+            "timestamp": timestamp if isinstance(timestamp, str) and timestamp else datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "title": title if isinstance(title, str) and title else PromptStorageManager.make_title(improved),
+            "original": original if isinstance(original, str) else "",
+            "improved": improved,
+            "favorite": bool(record.get("favorite", False)),
+            "content_hash": PromptStorageManager.content_hash(improved),
+        }
+
+    @staticmethod
+    def merge_fields(existing: Dict[str, Any], incoming: Dict[str, Any]) -> Dict[str, Any]:
+        """同じ内容のプロンプトを取り込むときに、既存のプロンプトへ反映するフィールドを返します。
+
+        どちらかがお気に入りならお気に入りにし、既存のタイトルが自動生成のままなら取り込む側のタイトルを採用します。
+        """
+        fields: Dict[str, Any] = {}
+        if incoming["favorite"] and not existing.get("favorite"):
+            fields["favorite"] = True
+        default_title = PromptStorageManager.make_title(existing.get("improved", ""))
+        if existing.get("title") == default_title and incoming["title"] != default_title:
+            fields["title"] = incoming["title"]
+        return fields
+
+    @staticmethod
+    def _order_key(prompt: Dict[str, Any]) -> Tuple[bool, str, str]:
+        """既定の並び順（お気に入り優先・新しい順）の降順ソートキーです。IDにより全てのキーが一意になります。"""
+        return prompt.get("favorite", False), prompt.get("timestamp", ""), prompt["id"]
+
+    def _load_prompts(self):
+        """保存されたプロンプトを読み込み、内部データ構造を構築します。
+
+        旧形式のID（作成日時）や重複したIDを持つプロンプトには新しいIDを、内容ハッシュを持たない
+        プロンプトにはハッシュを読み込み時に補い、書き戻します。
+        """
+        prompts_list = self.backend.load()
+        self._prompt_map = {}
+        self._hash_index = {}
+        backfilled = False
+        for prompt in prompts_list:
+            if not PromptId.is_valid(prompt.get("id")) or prompt["id"] in self._prompt_map:
+                prompt["id"] = PromptId.from_legacy(prompt)
+                backfilled = True
+            self._prompt_map[prompt["id"]] = prompt
+            if "content_hash" not in prompt:
+                prompt["content_hash"] = self.content_hash(prompt.get("improved", ""))
+                backfilled = True
+            self._hash_index.setdefault(prompt["content_hash"], set()).add(prompt["id"])
+        self.prompts = SortedPromptList(self._order_key, prompts_list)
+        if backfilled:
+            self.backend.rewrite(self.prompts)
+        if self._search_index is not None:
+            self._search_index.discarded = True
+            self._search_index = None
+        if self._similarity_index is not None:
+            self._similarity_index.discarded = True
+            self._similarity_index = None
+
+    def _persist(self, operation: Dict[str, Any]):
+        """変更操作をバックエンドに記録します。"""
+        self.backend.apply(operation, self.prompts)
+
+    def _update_ordered(self, prompt: Dict[str, Any], fields: Dict[str, Any]) -> int:
+        """並び順のキーを含むフィールドを更新し、一覧全体をソートせずにプロンプトを正しい位置へ移動します。"""
+        old_index = self.prompts.remove(prompt)
+        prompt.update(fields)
+        index = self.prompts.add(prompt)
+        if index != old_index:
+            self._notify(StorageEvent.MOVED, prompt["id"], index, old_index)
+        return index
+
+    def reload(self):
+        """永続化先から全てのプロンプトを読み込み直します。"""
+        self._load_prompts()
+
+    def close(self):
+        """未集約の変更をバックエンドに書き出します。終了時に呼び出してください。"""
+        self.backend.compact(self.prompts)
+        if self.revisions is not None:
+            self.revisions.close()
+
+    def count(self) -> int:
+        """保存済みプロンプトの件数を返します。"""
+        return len(self.prompts)
+
+    def list_prompts(self, offset: int = 0, limit: Optional[int] = None, order: str = "default") -> List[Dict[str, Any]]:
+        """指定した並び順でプロンプトの一部を返します。"""
+        if order == "default":
+            prompts = self.prompts
+        else:
+            key, reverse = self._sort_key(order)
+            prompts = sorted(self.prompts, key=key, reverse=reverse)
+        return prompts[offset:] if limit is None else prompts[offset:offset + limit]
+
+    def build_search_index(self, background: bool = True) -> SearchIndex:
+        """検索インデックスを（未構築なら）構築します。大きなライブラリではバックグラウンドで構築します。"""
+        if self._search_index is None:
+            self._search_index = SearchIndex()
+            args = (list(self.prompts), self._prompt_map.get)
+            if background:
+                threading.Thread(target=self._search_index.build, args=args, daemon=True).start()
+            else:
+                self._search_index.build(*args)
+        return self._search_index
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """タイトルと本文を全文検索し、関連度順にプロンプトを返します。
+
+        インデックスはbigram単位の照合のため、候補は順位順に実際の部分一致を確かめながら返します。
+        インデックスの構築が終わるまでは全件走査で検索します。
+        """
+        terms = SearchIndex.normalize(query).split()
+        if not terms:
+            return []
+        index = self.build_search_index()
+        candidates = (
+            (self._prompt_map.get(prompt_id) for prompt_id in index.search(query)) if index.ready else self.prompts
+        )
+        results = []
+        for prompt in candidates:
+            if prompt is not None and self._contains_terms(prompt, terms):
+                results.append(prompt)
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+
+    @staticmethod
+    def _contains_terms(prompt: Dict[str, Any], terms: List[str]) -> bool:
+        """全ての検索語がタイトル・本文のいずれかに含まれるかを判定します。"""
+        fields = [SearchIndex.normalize(prompt.get(field) or "") for field in SearchIndex.FIELDS]
+        return all(any(term in text for text in fields) for term in terms)
+
+    def build_similarity_index(self, background: bool = True) -> SimilarityIndex:
+        """類似検索の索引を（未構築なら）構築します。大きなライブラリではバックグラウンドで構築します。"""
+        if self._similarity_index is None:
+            self._similarity_index = SimilarityIndex()
+            args = (list(self.prompts),)
+            if background:
+                threading.Thread(target=self._similarity_index.build, args=args, daemon=True).start()
+            else:
+                self._similarity_index.build(*args)
+        return self._similarity_index
+
+    def find_similar(
+        self, prompt_id: str, threshold: float = Constants.Similarity.SIMILAR_THRESHOLD, limit: Optional[int] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """強化後・ベースプロンプトの内容が似たプロンプトを、推定類似度の高い順に返します。
+
+        索引をバックグラウンドで構築している間は、索引付け済みのプロンプトだけが対象です。
+        """
+        return similar_prompts(self.build_similarity_index(), self._prompt_map.get, prompt_id, threshold, limit)
+
+    def near_duplicate_groups(
+        self, threshold: float = Constants.Similarity.DUPLICATE_THRESHOLD
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """ほぼ重複するプロンプトのグループを、件数の多い順に返します。
+
+        索引が未構築ならその場で構築し、バックグラウンドで構築中なら完了を待ちます。
+        """
+        index = self.build_similarity_index(background=False)
+        index.wait()
+        return duplicate_prompt_groups(index, self._prompt_map.get, threshold)
+
+    def _reindex(self, prompt: Dict[str, Any], content_changed: bool = True):
+        """構築済みの検索インデックスと類似検索の索引にプロンプトの変更を反映します。"""
+        if self._search_index is not None:
+            self._search_index.add(prompt)
+        if content_changed and self._similarity_index is not None:
+            self._similarity_index.add(prompt)
+
+    def _index_hash(self, prompt: Dict[str, Any]):
+        self._hash_index.setdefault(prompt["content_hash"], set()).add(prompt["id"])
+
+    def _unindex_hash(self, prompt: Dict[str, Any]):
+        ids = self._hash_index.get(prompt.get("content_hash", ""))
+        if ids is not None:
+            ids.discard(prompt["id"])
+            if not ids:
+                del self._hash_index[prompt["content_hash"]]
+
+    def get_prompt_by_id(self, prompt_id: str) -> Optional[Dict[str, Any]]:
+        """IDでプロンプトオブジェクトを高速に取得します。"""
+        return self._prompt_map.get(prompt_id)
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """内容ハッシュが一致するプロンプトを返します。"""
+        ids = self._hash_index.get(content_hash)
+        return self._prompt_map.get(next(iter(ids))) if ids else None
+
+    def find_by_content(self, improved_prompt: str) -> Optional[Dict[str, Any]]:
+        """強化後のプロンプトが同じ内容のセーブ済みプロンプトを返します。"""
+        return self.find_by_hash(self.content_hash(improved_prompt))
+
+    def is_saved(self, improved_prompt: str) -> bool:
+        """強化後のプロンプトが既にセーブされているかを、全件を走査せずに判定します。"""
+        return self.content_hash(improved_prompt) in self._hash_index
+
+    def add_prompt(self, original_prompt: str, improved_prompt: str) -> bool:
+        """新しいプロンプトペアを追加します。重複は許可しません。"""
+        if not improved_prompt:
+            return False
+        content_hash = self.content_hash(improved_prompt)
+        if content_hash in self._hash_index:
+            return False
+
+        self._insert({
+            "id": PromptId.new(),
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "title": self.make_title(improved_prompt),
+            "original": original_prompt,
+            "improved": improved_prompt,
+            "favorite": False,
+            "content_hash": content_hash,
+        })
+        return True
+
+    def _insert(self, new_prompt: Dict[str, Any]):
+        index = self.prompts.add(new_prompt)
+        self._prompt_map[new_prompt["id"]] = new_prompt
+        self._index_hash(new_prompt)
+        self._reindex(new_prompt)
+        self._persist({"op": "add", "prompt": new_prompt})
+        self._notify(StorageEvent.ADDED, new_prompt["id"], index)
+
+    def iter_prompts(self) -> Iterator[Dict[str, Any]]:
+        """既定の並び順で全てのプロンプトを1件ずつ返します。"""
+        return iter(self.prompts)
+
+    def import_prompts(self, records: Iterable[Any]) -> ImportReport:
+        """レコードを1件ずつ取り込みます。同じ内容のプロンプトがあれば、お気に入りとタイトルだけを統合します。"""
+        report = ImportReport()
+        for record in records:
+            prompt = self.normalize_import(record)
+            if prompt is None:
+                report.invalid += 1
+                continue
+            existing = self.find_by_hash(prompt["content_hash"])
+            if existing is None:
+                if prompt["id"] is None or prompt["id"] in self._prompt_map:
+                    prompt["id"] = PromptId.new()
+                self._insert(prompt)
+                report.added += 1
+                continue
+            fields = self.merge_fields(existing, prompt)
+            if not fields:
+                report.skipped += 1
+                continue
+            index = self._update_ordered(existing, fields)
+            self._reindex(existing, content_changed=False)
+            self._persist({"op": "update", "id": existing["id"], "fields": fields})
+            self._notify(StorageEvent.UPDATED, existing["id"], index)
+            report.merged += 1
+        return report
+
+    def update_prompt(self, prompt_id: str, original_prompt: str, improved_prompt: str) -> bool:
+        """既存のプロンプトを更新します。"""
+        prompt = self.get_prompt_by_id(prompt_id)
+        if prompt:
+            previous = dict(prompt)
+            fields = {
+                "original": original_prompt,
+                "improved": improved_prompt,
+                "title": self.make_title(improved_prompt),
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                "content_hash": self.content_hash(improved_prompt),
+            }
+            self._unindex_hash(prompt)
+            index = self._update_ordered(prompt, fields)
+            self._index_hash(prompt)
+            self._reindex(prompt)
+            self._persist({"op": "update", "id": prompt_id, "fields": fields})
+            record_revision(self.revisions, prompt_id, previous, original_prompt, improved_prompt)
+            self._notify(StorageEvent.UPDATED, prompt_id, index)
+            return True
+        return False
+
+    def delete_prompt(self, prompt_id: str) -> bool:
+        """指定されたIDのプロンプトを削除します。版の履歴も削除します。"""
+        prompt = self._prompt_map.pop(prompt_id, None)
+        if prompt:
+            index = self.prompts.remove(prompt)
+            self._unindex_hash(prompt)
+            if self._search_index is not None:
+                self._search_index.remove(prompt_id)
+            if self._similarity_index is not None:
+                self._similarity_index.remove(prompt_id)
+            self._persist({"op": "delete", "id": prompt_id})
+            if self.revisions is not None:
+                self.revisions.delete(prompt_id)
+            self._notify(StorageEvent.REMOVED, prompt_id, index)
+            return True
+        return False
+
+    def update_title(self, prompt_id: str, new_title: str) -> bool:
+        """指定されたIDのプロンプトのタイトルを更新します。"""
+        prompt = self.get_prompt_by_id(prompt_id)
+        if prompt:
+            prompt["title"] = new_title
+            self._reindex(prompt, content_changed=False)
+            self._persist({"op": "update", "id": prompt_id, "fields": {"title": new_title}})
+            self._notify(StorageEvent.UPDATED, prompt_id, self.prompts.index(prompt))
+            return True
+        return False
+
+    def toggle_favorite(self, prompt_id: str) -> bool:
+        """指定されたIDのプロンプトのお気に入り状態を切り替えます。"""
+        prompt = self.get_prompt_by_id(prompt_id)
+        if prompt:
+            index = self._update_ordered(prompt, {"favorite": not prompt.get("favorite", False)})
+            self._persist({"op": "update", "id": prompt_id, "fields": {"favorite": prompt["favorite"]}})
+            self._notify(StorageEvent.UPDATED, prompt_id, index)
+            return True
+        return False
+
+
+class SqlitePromptView:
+    """SqlitePromptStorageManagerの一覧を、ページ単位で遅延取得する読み取り専用のシーケンスです。"""
+
+    PAGE_SIZE = 100
+    MAX_CACHED_PAGES = 20
+
+    def __init__(self, manager: "SqlitePromptStorageManager", order: str = "default"):
+        self._manager = manager
+        self._order = order
+        self._count: Optional[int] = None
+        self._pages: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+
+    def invalidate(self):
+        """データベースが変更されたときに、キャッシュ済みの件数とページを破棄します。"""
+        self._count = None
+        self._pages.clear()
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self._count = self._manager.count()
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        page_number, position = divmod(index, self.PAGE_SIZE)
+        page = self._pages.get(page_number)
+        if page is None:
+            page = self._manager.list_prompts(page_number * self.PAGE_SIZE, self.PAGE_SIZE, self._order)
+            self._pages[page_number] = page
+            if len(self._pages) > self.MAX_CACHED_PAGES:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(page_number)
+        return page[position]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+class SqlitePromptStorageManager(StorageNotifier):
+    """SQLite (WALモード) に保存済みプロンプトを格納する、PromptStorageManager互換のストアです。
+
+    全件をメモリに展開せず、一覧はlist_prompts()でページ単位に取得します。
+    初回起動時には既存のsaved_prompts.jsonを一度だけ取り込みます。
+    類似検索の索引（シグネチャのみで本文は持たない）はメモリ上に構築し、変更のたびに更新します。
+    """
+
+    _ORDER_CLAUSES = {
+        "default": "favorite DESC, timestamp DESC, id DESC",
+        "newest": "timestamp DESC, id DESC",
+        "oldest": "timestamp ASC, id ASC",
+        "title": "title ASC, id ASC",
+    }
+    _COLUMNS = "id, timestamp, title, original, improved, favorite, content_hash"
+
+    def __init__(
+        self,
+        base_path: Path,
+        db_path: Optional[Path] = None,
+        legacy_path: Optional[Path] = None,
+        revisions: Optional[RevisionStore] = None,
+    ):
+        self.db_path = db_path or base_path / Constants.PROMPTS_DB_FILE
+        self.revisions = revisions
+        legacy_path = legacy_path or base_path / Constants.PROMPTS_FILE
+        # 起動時はバックグラウンドスレッドで開き、以降はUIスレッドで使用するため
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._view = SqlitePromptView(self)
+        self._listeners: List[Callable[[StorageEvent], None]] = []
+        self._similarity_index: Optional[SimilarityIndex] = None
+        self._create_schema()
+        self.migrate_from_json(legacy_path, legacy_path.with_name(Constants.PROMPTS_JOURNAL_FILE.name))
+        self.migrate_ids()
+
+    def _create_schema(self):
+        with self.conn:
+            self.conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS prompts (
+                    id TEXT PRIMARY KEY,
+                    timestamp TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    original TEXT NOT NULL,
+                    improved TEXT NOT NULL,
+                    favorite INTEGER NOT NULL DEFAULT 0,
+                    content_hash TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_prompts_favorite_timestamp
+                    ON prompts (favorite DESC, timestamp DESC, id DESC);
+                CREATE INDEX IF NOT EXISTS idx_prompts_content_hash ON prompts (content_hash);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+                """
+            )
+        self._fts_enabled = self._create_fts_index()
+
+    def _create_fts_index(self) -> bool:
+        """文字trigramによるFTS5全文検索インデックスを作成します。FTS5が使えない環境ではFalseを返します。"""
+        exists = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'prompts_fts'").fetchone()
+        if exists:
+            return True
+        try:
+            with self.conn:
+                self.conn.executescript(
+                    """
+                    CREATE VIRTUAL TABLE prompts_fts USING fts5(
+                        title, original, improved, content='prompts', content_rowid='rowid', tokenize='trigram'
+                    );
+                    CREATE TRIGGER prompts_fts_insert AFTER INSERT ON prompts BEGIN
+                        INSERT INTO prompts_fts (rowid, title, original, improved)
+                        VALUES (new.rowid, new.title, new.original, new.improved);
+                    END;
+                    CREATE TRIGGER prompts_fts_delete AFTER DELETE ON prompts BEGIN
+                        INSERT INTO prompts_fts (prompts_fts, rowid, title, original, improved)
+                        VALUES ('delete', old.rowid, old.title, old.original, old.improved);
+                    END;
+                    CREATE TRIGGER prompts_fts_update AFTER UPDATE OF title, original, improved ON prompts BEGIN
+                        INSERT INTO prompts_fts (prompts_fts, rowid, title, original, improved)
+                        VALUES ('delete', old.rowid, old.title, old.original, old.improved);
+                        INSERT INTO prompts_fts (rowid, title, original, improved)
+                        VALUES (new.rowid, new.title, new.original, new.improved);
+                    END;
+                    INSERT INTO prompts_fts (prompts_fts) VALUES ('rebuild');
+                    """
+                )
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    def migrate_from_json(self, json_path: Path, journal_path: Optional[Path] = None) -> int:
+        """saved_prompts.json (と操作ログ) を一度だけ取り込み、取り込んだ件数を返します。"""
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return 0
+        prompts = JournalBackend(json_path, journal_path).load() if journal_path else JsonFileBackend(json_path).load()
+        # IDのないプロンプトや、既に使われているIDを持つプロンプトには新しいIDを割り当てる
+        used_ids = {row[0] for row in self.conn.execute("SELECT id FROM prompts")}
+        rows = []
+        for p in prompts:
+            prompt_id = p.get("id")
+            if not isinstance(prompt_id, str) or not prompt_id or prompt_id in used_ids:
+                prompt_id = PromptId.from_legacy(p)
+            used_ids.add(prompt_id)
+            rows.append(
+                (
+                    prompt_id,
+                    p.get("timestamp", ""),
+                    p.get("title") or PromptStorageManager.make_title(p.get("improved", "")),
+                    p.get("original", ""),
+                    p.get("improved", ""),
+                    int(bool(p.get("favorite", False))),
+                    p.get("content_hash") or PromptStorageManager.content_hash(p.get("improved", "")),
+                )
+            )
+        with self.conn:
+            self.conn.executemany("INSERT INTO prompts VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (datetime.now().isoformat(),))
+        self._view.invalidate()
+        return len(rows)
+
+    def migrate_ids(self) -> int:
+        """旧形式（作成日時）のIDを、作成順を保った新しい形式のIDへ一度だけ置き換えます。"""
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'ids_migrated'").fetchone():
+            return 0
+        rows = self.conn.execute("SELECT id, timestamp FROM prompts").fetchall()
+        renames = [
+            (PromptId.from_legacy({"id": row["id"], "timestamp": row["timestamp"]}), row["id"])
+            for row in rows
+            if not PromptId.is_valid(row["id"])
+        ]
+        with self.conn:
+            self.conn.executemany("UPDATE prompts SET id = ? WHERE id = ?", renames)
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('ids_migrated', ?)", (datetime.now().isoformat(),))
+        self._view.invalidate()
+        return len(renames)
+
+    @staticmethod
+    def _row_to_prompt(row: sqlite3.Row) -> Dict[str, Any]:
+        prompt = dict(row)
+        prompt["favorite"] = bool(prompt["favorite"])
+        return prompt
+
+    @property
+    def prompts(self) -> SqlitePromptView:
+        """既定の並び順で全てのプロンプトを参照するシーケンスを返します。要素は必要になった時点で取得します。"""
+        return self._view
+
+    def reload(self):
+        """データベースが常に最新のため、何もしません。"""
+
+    def close(self):
+        """データベース接続を閉じます。"""
+        if self._similarity_index is not None:
+            self._similarity_index.discarded = True
+        self.conn.close()
+        if self.revisions is not None:
+            self.revisions.close()
+
+    def count(self) -> int:
+        """保存済みプロンプトの件数を返します。"""
+        return self.conn.execute("SELECT COUNT(*) FROM prompts").fetchone()[0]
+
+    def list_prompts(self, offset: int = 0, limit: Optional[int] = None, order: str = "default") -> List[Dict[str, Any]]:
+        """指定した並び順でプロンプトの一部を返します。"""
+        if order not in self._ORDER_CLAUSES:
+            raise ValueError(f"不明な並び順です: {order}")
+        rows = self.conn.execute(
+            f"SELECT {self._COLUMNS} FROM prompts ORDER BY {self._ORDER_CLAUSES[order]} LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset),
+        )
+        return [self._row_to_prompt(row) for row in rows]
+
+    def iter_prompts(self) -> Iterator[Dict[str, Any]]:
+        """既定の並び順で全てのプロンプトを1件ずつ返します。全件をメモリに展開しません。"""
+        cursor = self.conn.execute(f"SELECT {self._COLUMNS} FROM prompts ORDER BY {self._ORDER_CLAUSES['default']}")
+        for row in cursor:
+            yield self._row_to_prompt(row)
+
+    def import_prompts(self, records: Iterable[Any]) -> ImportReport:
+        """レコードを一定件数ずつ1トランザクションで取り込みます。同じ内容のプロンプトがあれば、お気に入りとタイトルだけを統合します。"""
+        report = ImportReport()
+        chunk: List[Dict[str, Any]] = []
+        for record in records:
+            prompt = PromptStorageManager.normalize_import(record)
+            if prompt is None:
+                report.invalid += 1
+                continue
+            chunk.append(prompt)
+            if len(chunk) >= Constants.Storage.IMPORT_BATCH_SIZE:
+                self._import_chunk(chunk, report)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk, report)
+        return report
+
+    def _import_chunk(self, chunk: List[Dict[str, Any]], report: ImportReport):
+        hashes = list({prompt["content_hash"] for prompt in chunk})
+        existing = {
+            row["content_hash"]: self._row_to_prompt(row)
+            for row in self.conn.execute(
+                f"SELECT {self._COLUMNS} FROM prompts WHERE content_hash IN ({', '.join('?' * len(hashes))})", hashes
+            )
+        }
+        requested_ids = [prompt["id"] for prompt in chunk if prompt["id"] is not None]
+        taken_ids = {
+            row["id"]
+            for row in self.conn.execute(
+                f"SELECT id FROM prompts WHERE id IN ({', '.join('?' * len(requested_ids))})", requested_ids
+            )
+        }
+        added: Dict[str, Dict[str, Any]] = {}
+        updated: Dict[str, Dict[str, Any]] = {}
+        for prompt in chunk:
+            current = existing.get(prompt["content_hash"])
+            if current is None:
+                if prompt["id"] is None or prompt["id"] in taken_ids:
+                    prompt["id"] = PromptId.new()
+                taken_ids.add(prompt["id"])
+                existing[prompt["content_hash"]] = added[prompt["id"]] = prompt
+                report.added += 1
+                continue
+            fields = PromptStorageManager.merge_fields(current, prompt)
+            if not fields:
+                report.skipped += 1
+                continue
+            current.update(fields)
+            if current["id"] not in added:
+                updated[current["id"]] = current
+            report.merged += 1
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO prompts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (p["id"], p["timestamp"], p["title"], p["original"], p["improved"], int(p["favorite"]), p["content_hash"])
+                    for p in added.values()
+                ],
+            )
+            self.conn.executemany(
+                "UPDATE prompts SET title = ?, favorite = ? WHERE id = ?",
+                [(p["title"], int(p["favorite"]), p["id"]) for p in updated.values()],
+            )
+        self._view.invalidate()
+        if self._similarity_index is not None:
+            for prompt in added.values():
+                self._similarity_index.add(prompt)
+        for prompt_id in added:
+            self._notify(StorageEvent.ADDED, prompt_id)
+        for prompt_id in updated:
+            self._notify(StorageEvent.UPDATED, prompt_id)
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """タイトルと本文を全文検索し、関連度順にプロンプトを返します。
+
+        3文字以上の語はFTS5のtrigramインデックスで検索してbm25で順位付けし、
+        それより短い語を含む場合はLIKEによる部分一致で既定の並び順に返します。
+        """
+        terms = unicodedata.normalize("NFKC", query).split()
+        if not terms:
+            return []
+        limit_value = -1 if limit is None else limit
+        if self._fts_enabled and all(len(term) >= 3 for term in terms):
+            match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+            columns = ", ".join(f"p.{column.strip()}" for column in self._COLUMNS.split(","))
+            rows = self.conn.execute(
+                f"SELECT {columns} FROM prompts_fts JOIN prompts p ON p.rowid = prompts_fts.rowid "
+                "WHERE prompts_fts MATCH ? ORDER BY bm25(prompts_fts, 3.0, 1.0, 1.0) LIMIT ?",
+                (match, limit_value),
+            )
+        else:
+            condition = " AND ".join(
+                "(title LIKE ? ESCAPE '\\' OR original LIKE ? ESCAPE '\\' OR improved LIKE ? ESCAPE '\\')"
+                for _ in terms
+            )
+            params: List[Any] = []
+            for term in terms:
+                pattern = "%" + re.sub(r"([%_\\])", r"\\\1", term) + "%"
+                params.extend([pattern] * 3)
+            rows = self.conn.execute(
+                f"SELECT {self._COLUMNS} FROM prompts WHERE {condition} "
+                f"ORDER BY {self._ORDER_CLAUSES['default']} LIMIT ?",
+                (*params, limit_value),
+            )
+        return [self._row_to_prompt(row) for row in rows]
+
+    def _iter_contents(self) -> Iterator[Dict[str, Any]]:
+        """類似検索の索引の構築用に、全てのプロンプトのIDと本文を別の接続で読み出します。
+
+        WALモードのため、読み出し中もUIスレッドからの書き込みは妨げません。
+        """
+        conn = sqlite3.connect(str(self.db_path))
+        conn.row_factory = sqlite3.Row
+        try:
+            for row in conn.execute("SELECT id, original, improved FROM prompts"):
+                yield dict(row)
+        finally:
+            conn.close()
+
+    def build_similarity_index(self, background: bool = True) -> SimilarityIndex:
+        """類似検索の索引を（未構築なら）構築します。大きなライブラリではバックグラウンドで構築します。"""
+        if self._similarity_index is None:
+            self._similarity_index = SimilarityIndex()
+            if background:
+                threading.Thread(target=self._similarity_index.build, args=(self._iter_contents(),), daemon=True).start()
+            else:
+                self._similarity_index.build(self._iter_contents())
+        return self._similarity_index
+
+    def find_similar(
+        self, prompt_id: str, threshold: float = Constants.Similarity.SIMILAR_THRESHOLD, limit: Optional[int] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """強化後・ベースプロンプトの内容が似たプロンプトを、推定類似度の高い順に返します。
+
+        索引をバックグラウンドで構築している間は、索引付け済みのプロンプトだけが対象です。
+        """
+        return similar_prompts(self.build_similarity_index(), self.get_prompt_by_id, prompt_id, threshold, limit)
+
+    def near_duplicate_groups(
+        self, threshold: float = Constants.Similarity.DUPLICATE_THRESHOLD
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """ほぼ重複するプロンプトのグループを、件数の多い順に返します。
+
+        索引が未構築ならその場で構築し、バックグラウンドで構築中なら完了を待ちます。
+        """
+        index = self.build_similarity_index(background=False)
+        index.wait()
+        return duplicate_prompt_groups(index, self.get_prompt_by_id, threshold)
+
+    def _changed(self, kind: str, prompt_id: str, rowcount: int = 1) -> bool:
+        """変更があればページキャッシュを破棄して通知します。一覧上の位置は問い合わせないため通知に含めません。"""
+        if rowcount <= 0:
+            return False
+        self._view.invalidate()
+        self._notify(kind, prompt_id)
+        return True
+
+    def get_prompt_by_id(self, prompt_id: str) -> Optional[Dict[str, Any]]:
+        """IDでプロンプトオブジェクトを取得します。"""
+        row = self.conn.execute(f"SELECT {self._COLUMNS} FROM prompts WHERE id = ?", (prompt_id,)).fetchone()
+        return self._row_to_prompt(row) if row else None
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """内容ハッシュが一致するプロンプトを返します。"""
+        row = self.conn.execute(
+            f"SELECT {self._COLUMNS} FROM prompts WHERE content_hash = ? LIMIT 1", (content_hash,)
+        ).fetchone()
+        return self._row_to_prompt(row) if row else None
+
+    def find_by_content(self, improved_prompt: str) -> Optional[Dict[str, Any]]:
+        """強化後のプロンプトが同じ内容のセーブ済みプロンプトを返します。"""
+        return self.find_by_hash(PromptStorageManager.content_hash(improved_prompt))
+
+    def is_saved(self, improved_prompt: str) -> bool:
+        """強化後のプロンプトが既にセーブされているかを、ハッシュのインデックスで判定します。"""
+        content_hash = PromptStorageManager.content_hash(improved_prompt)
+        return self.conn.execute("SELECT 1 FROM prompts WHERE content_hash = ?", (content_hash,)).fetchone() is not None
+
+    def add_prompt(self, original_prompt: str, improved_prompt: str) -> bool:
+        """新しいプロンプトペアを追加します。重複は許可しません。"""
+        if not improved_prompt:
+            return False
+        content_hash = PromptStorageManager.content_hash(improved_prompt)
+        if self.conn.execute("SELECT 1 FROM prompts WHERE content_hash = ?", (content_hash,)).fetchone():
+            return False
+        now = datetime.now()
+        prompt_id = PromptId.new()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO prompts VALUES (?, ?, ?, ?, ?, 0, ?)",
+                (
+                    prompt_id,
+                    now.strftime("%Y-%m-%d %H:%M"),
+                    PromptStorageManager.make_title(improved_prompt),
+                    original_prompt,
+                    improved_prompt,
+                    content_hash,
+                ),
+            )
+        if self._similarity_index is not None:
+            self._similarity_index.add({"id": prompt_id, "original": original_prompt, "improved": improved_prompt})
+        return self._changed(StorageEvent.ADDED, prompt_id)
+
+    def update_prompt(self, prompt_id: str, original_prompt: str, improved_prompt: str) -> bool:
+        """既存のプロンプトを更新します。"""
+        previous = self.get_prompt_by_id(prompt_id) if self.revisions is not None else None
+        with self.conn:
+            cursor = self.conn.execute(
+                "UPDATE prompts SET original = ?, improved = ?, title = ?, timestamp = ?, content_hash = ? WHERE id = ?",
+                (
+                    original_prompt,
+                    improved_prompt,
+                    PromptStorageManager.make_title(improved_prompt),
+                    datetime.now().strftime("%Y-%m-%d %H:%M"),
+                    PromptStorageManager.content_hash(improved_prompt),
+                    prompt_id,
+                ),
+            )
+        if previous is not None and cursor.rowcount > 0:
+            record_revision(self.revisions, prompt_id, previous, original_prompt, improved_prompt)
+        if self._similarity_index is not None and cursor.rowcount > 0:
+            self._similarity_index.add({"id": prompt_id, "original": original_prompt, "improved": improved_prompt})
+        return self._changed(StorageEvent.UPDATED, prompt_id, cursor.rowcount)
+
+    def delete_prompt(self, prompt_id: str) -> bool:
+        """指定されたIDのプロンプトを削除します。版の履歴も削除します。"""
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
+        if cursor.rowcount > 0 and self.revisions is not None:
+            self.revisions.delete(prompt_id)
+        if cursor.rowcount > 0 and self._similarity_index is not None:
+            self._similarity_index.remove(prompt_id)
+        return self._changed(StorageEvent.REMOVED, prompt_id, cursor.rowcount)
+
+    def update_title(self, prompt_id: str, new_title: str) -> bool:
+        """指定されたIDのプロンプトのタイトルを更新します。"""
+        with self.conn:
+            cursor = self.conn.execute("UPDATE prompts SET title = ? WHERE id = ?", (new_title, prompt_id))
+        return self._changed(StorageEvent.UPDATED, prompt_id, cursor.rowcount)
+
+    def toggle_favorite(self, prompt_id: str) -> bool:
+        """指定されたIDのプロンプトのお気に入り状態を切り替えます。"""
+        with self.conn:
+            cursor = self.conn.execute("UPDATE prompts SET favorite = 1 - favorite WHERE id = ?", (prompt_id,))
+        return self._changed(StorageEvent.UPDATED, prompt_id, cursor.rowcount)
+
+
+def create_prompt_storage(config_manager: ConfigManager, base_path: Path, write_queue: Optional[WriteBehindQueue] = None):
+    """storage_settings.backend に従ってプロンプトストレージを作成します。
+
+    `write_queue` はJSONバックエンドの操作ログの追記に使います。SQLiteはトランザクションで保護されるため使いません。
+    版の履歴は revision_settings に従って、どちらのバックエンドでも別のファイルに保存します。
+    """
+    revisions = RevisionStore.from_config(config_manager, base_path / Constants.REVISIONS_FILE)
+    if config_manager.get_setting("storage_settings", "backend") == Constants.Storage.BACKEND_SQLITE:
+        return SqlitePromptStorageManager(base_path, revisions=revisions)
+    return PromptStorageManager(base_path, write_queue=write_queue, revisions=revisions)
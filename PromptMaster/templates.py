@@ -0,0 +1,234 @@
+# Prompt Master: {{変数}} を含むプロンプトのテンプレートの保存と、変数の組による一括展開。
+
+import csv
+import json
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Pattern, Tuple
+
+from constants import Constants
+
+FORMAT_CSV = "csv"
+FORMAT_TSV = "tsv"
+FORMAT_JSONL = "jsonl"
+VARIABLE_FORMATS = (FORMAT_CSV, FORMAT_TSV, FORMAT_JSONL)
+
+# {{ 変数名 }}。変数名には空白と波括弧以外の文字（日本語を含む）を使える
+_PLACEHOLDER = re.compile(r"\{\{\s*([^{}\s]+)\s*\}\}")
+
+
+class TemplateError(ValueError):
+    """テンプレートの展開に必要な変数がない場合などのエラーです。"""
+
+
+class Template:
+    """{{変数}} を含むテキストを、固定部分と変数名の並びに分解したものです。
+
+    展開は分解済みの並びを連結するだけのため、正規表現による置換を展開のたびに行うより速く終わります。
+    同じテキストの分解は `compile_template` でキャッシュされます。
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self._literals: List[str] = []
+        self._names: List[str] = []
+        position = 0
+        for match in _PLACEHOLDER.finditer(text):
+            self._literals.append(text[position:match.start()])
+            self._names.append(match.group(1))
+            position = match.end()
+        self._literals.append(text[position:])
+        self.variables: Tuple[str, ...] = tuple(dict.fromkeys(self._names))
+        # extract で使う正規表現と、変数名から正規表現のグループ名への対応（最初の呼び出しで作る）
+        self._pattern: Optional[Pattern] = None
+        self._groups: Dict[str, str] = {}
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        """変数に `values` の値を入れたテキストを返します。値が None の変数は空文字列になります。"""
+        missing = [name for name in self.variables if name not in values]
+        if missing:
+            raise TemplateError(f"変数 {', '.join(missing)} の値がありません。")
+        parts = [self._literals[0]]
+        for name, literal in zip(self._names, self._literals[1:]):
+            value = values[name]
+            parts.append("" if value is None else str(value))
+            parts.append(literal)
+        return "".join(parts)
+
+    def extract(self, text: str) -> Optional[Dict[str, str]]:
+        """`text` がこのテンプレートを展開したものであれば、各変数の値を返します。そうでなければNoneを返します。"""
+        if self._pattern is None:
+            groups: Dict[str, str] = {}
+            parts = [re.escape(self._literals[0])]
+            for name, literal in zip(self._names, self._literals[1:]):
+                if name in groups:
+                    parts.append(f"(?P={groups[name]})")
+                else:
+                    groups[name] = f"v{len(groups)}"
+                    parts.append(f"(?P<{groups[name]}>.*?)")
+                parts.append(re.escape(literal))
+            self._pattern = re.compile("".join(parts), re.S)
+            self._groups = groups
+        match = self._pattern.fullmatch(text)
+        if match is None:
+            return None
+        return {name: match.group(group) for name, group in self._groups.items()}
+
+
+@lru_cache(maxsize=Constants.Templates.CACHE_SIZE)
+def compile_template(text: str) -> Template:
+    """テキストを分解した `Template` を返します。同じテキストには同じインスタンスを返します。"""
+    return Template(text)
+
+
+def detect_variables_format(path: str) -> str:
+    """変数の組のファイルの形式を拡張子から判定します。.csv / .tsv 以外はJSON Linesとして扱います。"""
+    name = path.lower()
+    for suffix in (".gz", ".gzip", ".zst", ".zstd"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+            break
+    if name.endswith(".csv"):
+        return FORMAT_CSV
+    if name.endswith(".tsv"):
+        return FORMAT_TSV
+    return FORMAT_JSONL
+
+
+def read_variable_sets(
+    f: IO[str], fmt: str = FORMAT_JSONL, on_error: Optional[Callable[[int, TemplateError], None]] = None
+) -> Iterator[Dict[str, Any]]:
+    """変数の組を1件ずつ読み込みます。ファイル全体をメモリに読み込まないため、件数によらず一定のメモリで動作します。
+
+    CSV / TSV は1行目を変数名の見出しとして扱い、列の数が見出しと異なる行はエラーにします。
+    JSON Linesは1行に1つのオブジェクトを記述します。読み込めない行があると TemplateError を送出します。
+    `on_error` を指定した場合は、代わりにその行番号とエラーを渡して呼び出し、その行を飛ばします。
+    """
+    if fmt in (FORMAT_CSV, FORMAT_TSV):
+        reader = csv.DictReader(f, delimiter="\t" if fmt == FORMAT_TSV else ",")
+        for values in reader:
+            # 列が足りなければ値がNoneに、多すぎれば余りがキーNoneにまとめられる
+            if None in values or None in values.values():
+                error = TemplateError(
+                    f"{reader.line_num} 行目: 列の数が見出し（{len(reader.fieldnames or ())} 列）と一致しません。"
+                )
+                if on_error is None:
+                    raise error
+                on_error(reader.line_num, error)
+                continue
+            yield values
+        return
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            values = json.loads(line)
+        except json.JSONDecodeError as e:
+            error = TemplateError(f"{number} 行目: JSONとして解釈できません（{e.msg}）。")
+        else:
+            if isinstance(values, dict):
+                yield values
+                continue
+            error = TemplateError(f"{number} 行目: 変数の組はJSONオブジェクトで記述してください。")
+        if on_error is None:
+            raise error
+        on_error(number, error)
+
+
+def render_all(
+    template: Template,
+    variable_sets: Iterable[Mapping[str, Any]],
+    on_error: Optional[Callable[[int, TemplateError], None]] = None,
+) -> Iterator[Tuple[int, Mapping[str, Any], str]]:
+    """変数の組ごとにテンプレートを展開し、(1から始まる番号, 変数の組, 展開したテキスト) を順に返します。
+
+    必要な変数のない組があると TemplateError を送出します。`on_error` を指定した場合は、
+    代わりにその組の番号とエラーを渡して呼び出し、その組を飛ばします。
+    """
+    for number, values in enumerate(variable_sets, 1):
+        try:
+            text = template.render(values)
+        except TemplateError as e:
+            if on_error is None:
+                raise TemplateError(f"{number} 件目: {e}")
+            on_error(number, e)
+            continue
+        yield number, values, text
+
+
+class TemplateStore:
+    """名前を付けたテンプレートをSQLiteに保存します。テンプレートの本文は1か所にだけ保存され、
+    変数の組ごとのテキストは保存せずに展開時に作ります。
+    """
+
+    def __init__(self, db_path: Path = Constants.TEMPLATES_FILE):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS templates (
+                name TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                variables TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def save(self, name: str, text: str) -> Template:
+        """テンプレートを保存します。同じ名前のテンプレートがあれば本文を置き換えます。"""
+        name = name.strip()
+        if not name:
+            raise TemplateError("テンプレートの名前を指定してください。")
+        template = compile_template(text)
+        if not template.variables:
+            raise TemplateError("テンプレートに {{変数}} がありません。")
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO templates (name, text, variables, created_at, updated_at) "
+                "VALUES (?, ?, ?, COALESCE((SELECT created_at FROM templates WHERE name = ?), ?), ?)",
+                (name, text, json.dumps(list(template.variables), ensure_ascii=False), name, now, now),
+            )
+            self._conn.commit()
+        return template
+
+    def get(self, name: str) -> Optional[Template]:
+        """名前のテンプレートを返します。分解済みのものがキャッシュにあればそれを使います。"""
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM templates WHERE name = ?", (name,)).fetchone()
+        return compile_template(row[0]) if row else None
+
+    def delete(self, name: str) -> bool:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM templates WHERE name = ?", (name,)).rowcount
+            self._conn.commit()
+        return deleted > 0
+
+    def list_templates(self) -> List[Dict[str, Any]]:
+        """保存済みのテンプレートの名前・変数・文字数・更新日時を名前順に返します。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, variables, length(text), updated_at FROM templates ORDER BY name"
+            ).fetchall()
+        return [
+            {
+                "name": name,
+                "variables": json.loads(variables),
+                "size": size,
+                "updated_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(updated_at)),
+            }
+            for name, variables, size, updated_at in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
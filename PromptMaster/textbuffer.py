@@ -0,0 +1,108 @@
+# Prompt Master: 大きなテキストをテキストボックスへ分割して書き込むバッファ。
+
+from typing import Any, Callable, Optional
+
+from constants import Constants
+
+
+class TextBuffer:
+    """テキストボックスの内容を保持し、大きなテキストの書き込みを after で区切った小さな挿入に分けます。
+
+    書き込みの合間にイベントループが回るため、100KBを超えるテキストでもUIが固まりません。
+    区切りは可能な限り改行の直後に置き、挿入のたびに既に書き込んだ行を組み直させないようにします。
+    最後に書き込んだ内容を保持し、その後に利用者が編集していなければ `get` はテキストボックスを
+    読まずにその内容を返します（編集の有無はテキストボックスの modified フラグで判定します）。
+    書き込み中はテキストボックスを編集できないようにします。
+    """
+
+    def __init__(
+        self,
+        textbox: Any,
+        chunk_chars: int = Constants.UI.TEXT_CHUNK_CHARS,
+        interval_ms: int = Constants.UI.TEXT_CHUNK_INTERVAL_MS,
+    ):
+        self.textbox = textbox
+        self.chunk_chars = chunk_chars
+        self.interval_ms = interval_ms
+        self._text = ""
+        self._written = 0
+        self._state = "normal"
+        self._after_id: Optional[str] = None
+        self._on_done: Optional[Callable[[], None]] = None
+
+    @property
+    def busy(self) -> bool:
+        """書き込みの途中かどうか。"""
+        return self._after_id is not None
+
+    def get(self) -> str:
+        """テキストボックスの内容を返します。書き込み中は、書き込みを終えた後の内容を返します。"""
+        if not self.busy and self.textbox.edit_modified():
+            self._text = self.textbox.get("1.0", "end-1c")
+            self._written = len(self._text)
+            self.textbox.edit_modified(False)
+        return self._text
+
+    def set_text(self, text: str, editable: bool = True, on_done: Optional[Callable[[], None]] = None):
+        """内容を `text` に置き換えます。`chunk_chars` 以下のテキストはその場で書き込みます。
+
+        `editable` がFalseの場合は、書き込みを終えた後もテキストボックスを編集不可のままにします。
+        `on_done` は書き込みを終えたときに呼ばれます。
+        """
+        self.cancel()
+        self._text = text
+        self._written = 0
+        self._state = "normal" if editable else "disabled"
+        self._on_done = on_done
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self._write_chunk()
+
+    def append(self, text: str):
+        """末尾に追記します。書き込み中の場合は、書き込み予定のテキストの末尾に加えます。"""
+        self._text = self.get() + text
+        if self.busy:
+            return
+        state = self.textbox.cget("state")
+        self.textbox.configure(state="normal")
+        self.textbox.insert("end", text)
+        self.textbox.configure(state=state)
+        self._written = len(self._text)
+        self.textbox.edit_modified(False)
+
+    def flush(self):
+        """残りを一度に書き込みます。内容を確定させてから続ける操作の前に呼びます。"""
+        while self.busy:
+            self.textbox.after_cancel(self._after_id)
+            self._write_chunk()
+
+    def cancel(self):
+        """書き込みを中断します。テキストボックスには書き込み済みの部分だけが残ります。"""
+        if self._after_id:
+            self.textbox.after_cancel(self._after_id)
+            self._after_id = None
+            self._text = self._text[:self._written]
+            self.textbox.configure(state=self._state)
+
+    def _next_boundary(self) -> int:
+        end = self._written + self.chunk_chars
+        if end >= len(self._text):
+            return len(self._text)
+        newline = self._text.rfind("\n", self._written, end)
+        return newline + 1 if newline >= 0 else end
+
+    def _write_chunk(self):
+        self._after_id = None
+        end = self._next_boundary()
+        self.textbox.configure(state="normal")
+        self.textbox.insert("end", self._text[self._written:end])
+        self._written = end
+        self.textbox.edit_modified(False)
+        if end < len(self._text):
+            self.textbox.configure(state="disabled")
+            self._after_id = self.textbox.after(self.interval_ms, self._write_chunk)
+            return
+        self.textbox.configure(state=self._state)
+        on_done, self._on_done = self._on_done, None
+        if on_done:
+            on_done()
@@ -0,0 +1,246 @@
+# Prompt Master: ベースプロンプトと強化後のプロンプトの、語・文字単位の差分の計算。
+
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import List, Optional, Sequence, Tuple
+
+from constants import Constants
+
+# 英数字の連続は1語、空白の連続は1つにまとめ、それ以外（日本語などの文字や記号）は1文字ずつに分けます
+_TOKEN_PATTERN = re.compile(r"[0-9A-Za-zÀ-ɏ_']+|\s+|.", re.S)
+
+Block = Tuple[int, int, int]
+Range = Tuple[int, int]
+
+
+def tokenize(text: str) -> List[str]:
+    """テキストを差分の単位に分割します。分かち書きのない日本語は文字単位、英語などは語単位になります。"""
+    return _TOKEN_PATTERN.findall(text)
+
+
+def myers_blocks(a: Sequence, b: Sequence, max_edits: Optional[int] = None) -> Optional[List[Block]]:
+    """Myersの差分アルゴリズムで、最小の編集に対応する一致ブロック (i, j, 長さ) を返します。
+
+    計算量は O((N+M)D)（D は編集の数）のため、少しずつ編集したテキストの比較では長いテキストでも
+    速く終わります。共通の先頭・末尾は先に取り除きます。編集の数が `max_edits` を超える場合は
+    計算を打ち切ってNoneを返します。
+    """
+    prefix = 0
+    limit = min(len(a), len(b))
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and a[len(a) - 1 - suffix] == b[len(b) - 1 - suffix]:
+        suffix += 1
+    blocks = [(0, 0, prefix)] if prefix else []
+    a_mid, b_mid = a[prefix:len(a) - suffix], b[prefix:len(b) - suffix]
+    n, m = len(a_mid), len(b_mid)
+    # 編集の数は長さの差を下回らない（片方が空なら長さの差そのもの）ため、打ち切りが確実な場合は探索しない
+    if max_edits is not None and abs(n - m) > max_edits:
+        return None
+    if n and m:
+        middle = _myers_middle(a_mid, b_mid, n + m if max_edits is None else min(max_edits, n + m))
+        if middle is None:
+            return None
+        blocks.extend((i + prefix, j + prefix, size) for i, j, size in middle)
+    if suffix:
+        blocks.append((len(a) - suffix, len(b) - suffix, suffix))
+    return blocks
+
+
+def _myers_middle(a: Sequence, b: Sequence, max_d: int) -> Optional[List[Block]]:
+    n, m = len(a), len(b)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    # trace[d] は d 回目の探索を終えた時点の、対角線 -d..d の到達位置
+    trace: List[List[int]] = []
+    for d in range(max_d + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                trace.append(v[offset - d:offset + d + 1])
+                return _backtrack(trace, n, m)
+        trace.append(v[offset - d:offset + d + 1])
+    return None
+
+
+def _backtrack(trace: List[List[int]], n: int, m: int) -> List[Block]:
+    """探索の記録を終点から逆にたどり、一致ブロックを先頭から順に返します。"""
+    blocks: List[Block] = []
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        previous = trace[d - 1]
+        k = x - y
+        if k == -d or (k != d and previous[k - 1 + d - 1] < previous[k + 1 + d - 1]):
+            prev_k = k + 1
+            mid_x = previous[prev_k + d - 1]
+        else:
+            prev_k = k - 1
+            mid_x = previous[prev_k + d - 1] + 1
+        if x > mid_x:
+            blocks.append((mid_x, mid_x - k, x - mid_x))
+        x = previous[prev_k + d - 1]
+        y = x - prev_k
+    if x > 0:
+        blocks.append((0, 0, x))
+    blocks.reverse()
+    return blocks
+
+
+def matching_blocks(a: Sequence, b: Sequence, max_edits: int = Constants.UI.DIFF_MAX_EDITS) -> List[Block]:
+    """一致ブロックを返します。編集が多すぎる組み合わせでは、Myersを打ち切って difflib の近似に切り替えます。"""
+    blocks = myers_blocks(a, b, max_edits)
+    if blocks is None:
+        blocks = [block for block in SequenceMatcher(None, a, b).get_matching_blocks() if block[2]]
+    return blocks
+
+
+def _gaps(blocks: List[Block], n: int, m: int) -> Tuple[List[Range], List[Range]]:
+    """一致ブロックの間の、a側で削除された範囲とb側で追加された範囲を返します。"""
+    removed: List[Range] = []
+    added: List[Range] = []
+    i = j = 0
+    for block_i, block_j, size in blocks + [(n, m, 0)]:
+        if block_i > i:
+            removed.append((i, block_i))
+        if block_j > j:
+            added.append((j, block_j))
+        i, j = block_i + size, block_j + size
+    return removed, added
+
+
+def _to_char_ranges(ranges: List[Range], offsets: List[int]) -> List[Range]:
+    return [(offsets[start], offsets[end]) for start, end in ranges]
+
+
+def _merge(ranges: List[Range]) -> List[Range]:
+    merged: List[Range] = []
+    for start, end in ranges:
+        if merged and merged[-1][1] >= start:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class TextDiff:
+    """2つのテキストの差分です。範囲はテキスト先頭からの文字位置 (開始, 終了) で表します。"""
+
+    def __init__(self, a: str, b: str, removed: List[Range], added: List[Range]):
+        self.a = a
+        self.b = b
+        self.removed = removed
+        self.added = added
+
+    @property
+    def removed_chars(self) -> int:
+        return sum(end - start for start, end in self.removed)
+
+    @property
+    def added_chars(self) -> int:
+        return sum(end - start for start, end in self.added)
+
+    @staticmethod
+    def _tk_indices(text: str, ranges: List[Range]) -> List[Tuple[str, str]]:
+        line_starts = [0] + [match.end() for match in re.finditer("\n", text)]
+
+        def index(offset: int) -> str:
+            line = bisect_right(line_starts, offset)
+            return f"{line}.{offset - line_starts[line - 1]}"
+
+        return [(index(start), index(end)) for start, end in ranges]
+
+    def removed_indices(self) -> List[Tuple[str, str]]:
+        """削除された範囲を、Tkのテキストウィジェットの位置 ("行.文字") の組で返します。"""
+        return self._tk_indices(self.a, self.removed)
+
+    def added_indices(self) -> List[Tuple[str, str]]:
+        """追加された範囲を、Tkのテキストウィジェットの位置 ("行.文字") の組で返します。"""
+        return self._tk_indices(self.b, self.added)
+
+
+class TextDiffer:
+    """行単位の差分で変更のあった箇所を絞り込み、その中だけを語・文字単位で比較します。
+
+    変更のあった箇所ごとの結果を件数に上限のあるキャッシュに残すため、入力中に差分を取り直すと
+    きは、直前から変わった箇所だけを計算し直します。1つのインスタンスを複数のスレッドから
+    使えます。
+    """
+
+    def __init__(self, max_entries: int = Constants.UI.DIFF_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[List[Range], List[Range]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def diff(self, a: str, b: str) -> TextDiff:
+        lines_a = a.splitlines(keepends=True)
+        lines_b = b.splitlines(keepends=True)
+        line_offsets_a = self._offsets(lines_a)
+        line_offsets_b = self._offsets(lines_b)
+        removed: List[Range] = []
+        added: List[Range] = []
+        blocks = matching_blocks(lines_a, lines_b)
+        for (i1, i2), (j1, j2) in zip(*_gaps_paired(blocks, len(lines_a), len(lines_b))):
+            start_a, end_a = line_offsets_a[i1], line_offsets_a[i2]
+            start_b, end_b = line_offsets_b[j1], line_offsets_b[j2]
+            if start_a == end_a:
+                added.append((start_b, end_b))
+            elif start_b == end_b:
+                removed.append((start_a, end_a))
+            else:
+                block_removed, block_added = self._diff_block(a[start_a:end_a], b[start_b:end_b])
+                removed.extend((start + start_a, end + start_a) for start, end in block_removed)
+                added.extend((start + start_b, end + start_b) for start, end in block_added)
+        return TextDiff(a, b, _merge(removed), _merge(added))
+
+    @staticmethod
+    def _offsets(parts: List[str]) -> List[int]:
+        offsets = [0]
+        for part in parts:
+            offsets.append(offsets[-1] + len(part))
+        return offsets
+
+    def _diff_block(self, a: str, b: str) -> Tuple[List[Range], List[Range]]:
+        """行単位で対応づけた変更箇所を語・文字単位で比較します。結果はキャッシュします。"""
+        key = (a, b)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+        tokens_a, tokens_b = tokenize(a), tokenize(b)
+        removed, added = _gaps(matching_blocks(tokens_a, tokens_b), len(tokens_a), len(tokens_b))
+        result = (_to_char_ranges(removed, self._offsets(tokens_a)), _to_char_ranges(added, self._offsets(tokens_b)))
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = result
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+
+def _gaps_paired(blocks: List[Block], n: int, m: int) -> Tuple[List[Range], List[Range]]:
+    """一致ブロックの間を、a側とb側の範囲の組（どちらかは空のこともある）として返します。"""
+    a_ranges: List[Range] = []
+    b_ranges: List[Range] = []
+    i = j = 0
+    for block_i, block_j, size in blocks + [(n, m, 0)]:
+        if block_i > i or block_j > j:
+            a_ranges.append((i, block_i))
+            b_ranges.append((j, block_j))
+        i, j = block_i + size, block_j + size
+    return a_ranges, b_ranges
@@ -0,0 +1,115 @@
+# Prompt Master: ApiService 呼び出しオーバーヘッドのベンチマーク
+#
+# ローカルに起動したGemini REST API互換のスタブに対して、呼び出しごとに
+# クライアントとモデルを作り直す方式と、ApiServiceがモデルを使い回す方式の
+# 1回あたりの所要時間と、張られたTCP接続数を比較します。
+# また、応答に遅延を入れたスタブで複数モデルへ順に問い合わせた場合と、
+# ModelComparison で同時に問い合わせた場合の全体の所要時間を比較します。
+# 最後に、既定のシステムプロンプトをコンテキストキャッシュに登録した場合としない場合の、
+# 1回あたりの新たに処理される入力トークン数（入力トークン − キャッシュ済みトークン）を比較します。
+#
+# 使い方:
+#     python benchmarks/bench_api.py --calls 200 --latency 0.3
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "PromptMaster"))
+
+from api_service import ApiService, ContextCache  # noqa: E402
+from constants import Constants  # noqa: E402
+from comparison import ModelComparison  # noqa: E402
+from gemini_stub import GeminiStubServer  # noqa: E402
+from scheduler import RequestScheduler  # noqa: E402
+
+COMPARE_MODELS = ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-2.0-flash"]
+
+
+def time_calls(calls: int, endpoint: str, pooled: bool) -> List[float]:
+    """強化リクエストを繰り返し、1回あたりの所要時間(ms)を返します。"""
+    service = ApiService(transport="rest", api_endpoint=endpoint)
+    samples = []
+    for i in range(calls):
+        if not pooled:
+            service = ApiService(transport="rest", api_endpoint=endpoint)
+        start = time.perf_counter()
+        service.improve_prompt("stub-key", "gemini-2.5-flash", "システムプロンプト", f"ベース {i}")
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def time_fanout(endpoint: str, models: List[str]):
+    """モデルを順に呼び出した場合と同時に呼び出した場合の、全体の所要時間(ms)を返します。"""
+    service = ApiService(transport="rest", api_endpoint=endpoint)
+    service.improve_prompt("stub-key", models[0], "システムプロンプト", "ウォームアップ")
+    start = time.perf_counter()
+    for model_name in models:
+        service.improve_prompt("stub-key", model_name, "システムプロンプト", "ベース 順次")
+    sequential_ms = (time.perf_counter() - start) * 1000
+    scheduler = RequestScheduler(max_workers=len(models))
+    comparison = ModelComparison(scheduler, service)
+    comparison.start("stub-key", models, "システムプロンプト", "ベース 同時", force_refresh=True)
+    comparison.wait()
+    scheduler.shutdown()
+    return sequential_ms, comparison.wall_ms
+
+
+def measure_context_cache(calls: int, endpoint: str, use_cache: bool) -> List[int]:
+    """既定のシステムプロンプトで強化を繰り返し、1回あたりの新たに処理された入力トークン数を返します。"""
+    service = ApiService(transport="rest", api_endpoint=endpoint, context_cache=ContextCache() if use_cache else None)
+    uncached = []
+    for i in range(calls):
+        result = service.improve_prompt_detailed(
+            "stub-key", "gemini-2.5-flash", Constants.DEFAULT_SYSTEM_PROMPT, f"ベース {i}", force_refresh=True
+        )
+        uncached.append((result.prompt_tokens or 0) - result.cached_tokens)
+    service.close()
+    return uncached
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.3, help="モデル比較で使うスタブの応答遅延（秒）")
+    args = parser.parse_args()
+
+    server = GeminiStubServer().start()
+    endpoint = server.endpoint
+    print(f"api overhead: {args.calls} calls against {endpoint}")
+    try:
+        for name, pooled in (("per-call", False), ("pooled", True)):
+            connections_before = server.connections
+            samples = time_calls(args.calls, endpoint, pooled)
+            p95 = sorted(samples)[int(len(samples) * 0.95) - 1]
+            print(
+                f"  {name:<9} mean {statistics.mean(samples):7.2f} ms   p95 {p95:7.2f} ms"
+                f"   connections {server.connections - connections_before}"
+            )
+    finally:
+        server.stop()
+
+    server = GeminiStubServer(latency=args.latency).start()
+    print(f"model fan-out: {len(COMPARE_MODELS)} models, stub latency {args.latency:g} s")
+    try:
+        sequential_ms, concurrent_ms = time_fanout(server.endpoint, COMPARE_MODELS)
+        print(f"  sequential {sequential_ms:8.1f} ms   concurrent {concurrent_ms:8.1f} ms")
+    finally:
+        server.stop()
+
+    server = GeminiStubServer().start()
+    calls = min(args.calls, 50)
+    print(f"context cache: {calls} calls with the default system prompt")
+    try:
+        for name, use_cache in (("off", False), ("on", True)):
+            uncached = measure_context_cache(calls, server.endpoint, use_cache)
+            print(f"  {name:<4} uncached input tokens/request {statistics.mean(uncached):8.1f}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Prompt Master: SavedPromptsDialog の表示・更新時間のベンチマーク
+#
+# 使い方 (ディスプレイが必要です):
+#     python benchmarks/bench_dialog.py --sizes 100 1000 10000
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "PromptMaster"))
+
+import customtkinter as ctk  # noqa: E402
+
+from bench_storage import make_prompts  # noqa: E402
+from constants import Constants  # noqa: E402
+from main import SavedPromptsDialog  # noqa: E402
+from storage import JsonFileBackend, PromptStorageManager  # noqa: E402
+
+
+class BenchApp(ctk.CTk):
+    """ダイアログの親として最低限のインターフェースを備えたウィンドウです。"""
+
+    def __init__(self):
+        super().__init__()
+        self.geometry(Constants.UI.DEFAULT_GEOMETRY)
+        self.fonts = {
+            "normal": ctk.CTkFont(size=14),
+            "button": ctk.CTkFont(size=12, weight="bold"),
+            "status": ctk.CTkFont(size=12),
+        }
+
+    def update_status(self, message: str, color_key: str, clear_after_ms: int = 5000):
+        pass
+
+
+def measure_open(app: BenchApp, size: int) -> Tuple[float, float, float]:
+    """ダイアログを開いて最初の描画が終わるまでの時間(ms)とピークメモリ(MiB)、お気に入り切り替えの時間(ms)を返します。"""
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(tmp) / Constants.PROMPTS_FILE.name
+        backend = JsonFileBackend(json_path)
+        backend.compact(make_prompts(size, 200))
+        storage = PromptStorageManager(Path(tmp), backend=backend)
+        tracemalloc.start()
+        start = time.perf_counter()
+        dialog = SavedPromptsDialog(app, storage, app.fonts)
+        dialog.update()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        start = time.perf_counter()
+        dialog._on_toggle_favorite(storage.prompts[size // 2]["id"])
+        dialog.update()
+        toggle_ms = (time.perf_counter() - start) * 1000
+        dialog._on_cancel()
+        app.update()
+    return elapsed_ms, peak / 2**20, toggle_ms
+
+
+def bench_open(sizes):
+    """ダイアログの表示時間・ピークメモリ・お気に入り切り替えの時間を件数ごとに計測します。"""
+    app = BenchApp()
+    app.update()
+    for size in sizes:
+        elapsed_ms, peak_mib, toggle_ms = measure_open(app, size)
+        print(
+            f"  {size:>7} prompts  open {elapsed_ms:8.1f} ms   peak {peak_mib:6.1f} MiB   toggle {toggle_ms:6.1f} ms"
+        )
+    app.destroy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    args = parser.parse_args()
+    print("SavedPromptsDialog open time")
+    bench_open(args.sizes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Prompt Master: ベースプロンプトと強化後のプロンプトの差分表示 (TextDiffer) のベンチマーク
+#
+# bench_revisions.py と同じ語句・構成で、指定した文字数（既定は2万文字）の強化後のプロンプトを作り、
+# 次の組み合わせで差分の計算時間を計測します。比較のため、difflib (SequenceMatcher) で
+# 同じ語・文字の列を比べた時間も計測します（行単位の絞り込みもキャッシュもない素朴な方法）。
+#     base       短いベースプロンプトと、その語句を含む強化後のプロンプト
+#     edited     強化後のプロンプトと、数か所を編集したもの（キャッシュなし）
+#     keystroke  編集中の1文字の入力ごとの差分の取り直し（キャッシュあり）
+#     rewrite    全体を書き直した、ほとんど共通部分のない2つのプロンプト
+#
+# 使い方:
+#     python benchmarks/bench_diff.py --chars 20000 100000
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "PromptMaster"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_revisions import _sentence, edit_prompt, make_prompt  # noqa: E402
+from textdiff import TextDiffer, tokenize  # noqa: E402
+
+
+def make_text(rng: random.Random, chars: int) -> str:
+    """強化後のプロンプトに似た節を、`chars` 文字に達するまで繋げます。"""
+    parts: List[str] = []
+    length = 0
+    while length < chars:
+        parts.append(make_prompt(rng))
+        length += len(parts[-1]) + 2
+    return "\n\n".join(parts)
+
+
+def _time_ms(func: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _difflib(a: str, b: str):
+    return SequenceMatcher(None, tokenize(a), tokenize(b)).get_opcodes()
+
+
+def measure(chars: int = 20000, keystrokes: int = 50, repeat: int = 3, seed: int = 1) -> Dict[str, float]:
+    """各組み合わせの差分の計算時間 (ms) を、TextDiffer と difflib について返します。"""
+    rng = random.Random(seed)
+    improved = make_text(rng, chars)
+    base = "、".join(line.strip("*# ") for line in improved.splitlines()[2:12:3] if line) + "。"
+    edited = improved
+    for _ in range(5):
+        edited = edit_prompt(rng, edited)
+    rewrite = make_text(rng, chars)
+
+    result: Dict[str, float] = {}
+    for name, (a, b) in {"base": (base, improved), "edited": (improved, edited), "rewrite": (improved, rewrite)}.items():
+        result[f"{name}_ms"] = _time_ms(lambda: TextDiffer().diff(a, b), repeat)
+        result[f"{name}_difflib_ms"] = _time_ms(lambda: _difflib(a, b), repeat)
+
+    # 入力中: キャッシュを温めた状態で、1文字ずつ書き足した本文との差分を取り直す
+    differ = TextDiffer()
+    differ.diff(improved, edited)
+    position = rng.randrange(len(edited) // 2, len(edited))
+    typed = _sentence(rng)
+    samples, difflib_samples = [], []
+    for i in range(1, min(keystrokes, len(typed)) + 1):
+        current = edited[:position] + typed[:i] + edited[position:]
+        start = time.perf_counter()
+        differ.diff(improved, current)
+        samples.append((time.perf_counter() - start) * 1000)
+        if i <= repeat:
+            start = time.perf_counter()
+            _difflib(improved, current)
+            difflib_samples.append((time.perf_counter() - start) * 1000)
+    result["keystroke_ms"] = statistics.median(samples)
+    result["keystroke_max_ms"] = max(samples)
+    result["keystroke_difflib_ms"] = statistics.median(difflib_samples)
+    result["chars"] = len(improved)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chars", type=int, nargs="+", default=[20000])
+    parser.add_argument("--keystrokes", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    for chars in args.chars:
+        result = measure(chars, args.keystrokes, seed=args.seed)
+        print(f"diff: {result['chars']:>7} chars")
+        for name in ("base", "edited", "keystroke", "rewrite"):
+            extra = f" (max {result['keystroke_max_ms']:7.2f} ms)" if name == "keystroke" else ""
+            print(
+                f"  {name:<10} {result[f'{name}_ms']:8.2f} ms{extra}"
+                f"   difflib {result[f'{name}_difflib_ms']:8.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# Prompt Master: 版の履歴 (RevisionStore) の保存サイズと復元時間のベンチマーク
+#
+# 既定のシステムプロンプトと同程度の長さ・構成のプロンプトに、実際の編集に近い変更
+# （行内の言い換え・箇条書きの追加・行の削除・節の書き直し・再強化による大きな書き換え）を
+# 繰り返し加え、全ての版を全文で保存した場合と比べた保存サイズと、版の記録・復元・差分の所要時間を計測します。
+# スナップショットの間隔を変えて、サイズと復元時間の釣り合いも比較します（間隔1は全ての版を圧縮した全文で保存）。
+#
+# 使い方:
+#     python benchmarks/bench_revisions.py --prompts 30 --edits 40 --intervals 1 5 10 20
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "PromptMaster"))
+
+from constants import Constants  # noqa: E402
+from revisions import RevisionStore  # noqa: E402
+
+# 書き換えに使う語句は既定のシステムプロンプトから取り、文体と文字種を実際のプロンプトに近づける
+_PHRASES = [
+    phrase
+    for line in Constants.DEFAULT_SYSTEM_PROMPT.splitlines()
+    for phrase in line.replace("、", "。").split("。")
+    if len(phrase) >= 6
+]
+
+
+def _sentence(rng: random.Random) -> str:
+    return "、".join(rng.choice(_PHRASES).strip(" *#") for _ in range(rng.randint(1, 3))) + "。"
+
+
+def make_prompt(rng: random.Random) -> str:
+    """見出し・箇条書き・番号付きリストからなる、強化後のプロンプトに似た本文を作ります。"""
+    lines = ["# 命令書", "", _sentence(rng) + _sentence(rng), ""]
+    for title in ("ペルソナ", "思考プロセス", "制約条件", "出力形式"):
+        lines += ["---", "", f"## {title}", ""]
+        for i in range(rng.randint(3, 7)):
+            prefix = f"{i + 1}.  " if title == "思考プロセス" else "*   "
+            lines.append(prefix + _sentence(rng))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def edit_prompt(rng: random.Random, text: str) -> str:
+    """1回分の編集を加えた本文を返します。"""
+    lines = text.split("\n")
+    body = [i for i, line in enumerate(lines) if line.startswith(("*", "1", "2", "3", "4", "5", "6", "7"))] or [0]
+    action = rng.random()
+    if action < 0.5:
+        # 行内の一部の言い換え
+        i = rng.choice(body)
+        line = lines[i]
+        start = rng.randrange(max(len(line) - 10, 1))
+        lines[i] = line[:start] + rng.choice(_PHRASES)[:rng.randint(3, 15)] + line[start + rng.randint(0, 10):]
+    elif action < 0.7:
+        lines.insert(rng.choice(body) + 1, "*   " + _sentence(rng))
+    elif action < 0.8 and len(body) > 3:
+        del lines[rng.choice(body)]
+    elif action < 0.93:
+        # 節の書き直し
+        i = rng.choice(body)
+        lines[i:i + 3] = ["*   " + _sentence(rng) for _ in range(rng.randint(2, 4))]
+    else:
+        # 再強化による大きな書き換え（冒頭の目標は保たれ、以降の節は作り直される）
+        return "\n".join(lines[:3] + make_prompt(rng).split("\n")[3:])
+    return "\n".join(lines)
+
+
+def make_workload(prompts: int, edits: int, seed: int) -> Dict[str, List[Tuple[str, str]]]:
+    """プロンプトごとの版の列 (ベースプロンプト, 強化後) を作ります。"""
+    rng = random.Random(seed)
+    workload = {}
+    for p in range(prompts):
+        original = f"ベースプロンプト {p}: " + _sentence(rng)
+        improved = make_prompt(rng)
+        versions = [(original, improved)]
+        for _ in range(edits):
+            if rng.random() < 0.1:
+                original = original + " " + _sentence(rng)
+            improved = edit_prompt(rng, improved)
+            versions.append((original, improved))
+        workload[f"prompt-{p:04d}"] = versions
+    return workload
+
+
+def measure(workload: Dict[str, List[Tuple[str, str]]], interval: int, max_revisions: int = 0) -> Dict[str, float]:
+    """ワークロードを記録し、保存サイズと記録・復元・差分の所要時間を返します。"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = RevisionStore(Path(tmp) / "revisions.sqlite3", max_revisions=max_revisions, snapshot_interval=interval)
+        record_ms = []
+        for prompt_id, versions in workload.items():
+            for original, improved in versions:
+                start = time.perf_counter()
+                store.record(prompt_id, original, improved)
+                record_ms.append((time.perf_counter() - start) * 1000)
+        # 最新の版の保持を外し、復元のたびにスナップショットから差分を適用させる
+        store._latest.clear()
+        rng = random.Random(0)
+        get_ms, diff_ms = [], []
+        for prompt_id, versions in workload.items():
+            for _ in range(5):
+                number = rng.randint(1, len(versions))
+                start = time.perf_counter()
+                revision = store.get(prompt_id, number)
+                get_ms.append((time.perf_counter() - start) * 1000)
+                assert revision is not None and revision.fields == versions[number - 1]
+            a, b = sorted(rng.sample(range(1, len(versions) + 1), 2))
+            start = time.perf_counter()
+            store.diff(prompt_id, a, b)
+            diff_ms.append((time.perf_counter() - start) * 1000)
+        stats = store.stats()
+        store.close()
+    json_bytes = sum(
+        len(json.dumps({"original": original, "improved": improved}, ensure_ascii=False).encode("utf-8"))
+        for versions in workload.values()
+        for original, improved in versions
+    )
+    return {
+        "stored_bytes": stats["stored_bytes"],
+        "json_bytes": json_bytes,
+        "snapshots": stats["snapshots"],
+        "revisions": stats["revisions"],
+        "record_ms": statistics.mean(record_ms),
+        "get_p50_ms": statistics.median(get_ms),
+        "get_max_ms": max(get_ms),
+        "diff_p50_ms": statistics.median(diff_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--prompts", type=int, default=30)
+    parser.add_argument("--edits", type=int, default=40, help="プロンプトごとの編集回数")
+    parser.add_argument("--intervals", type=int, nargs="+", default=[1, 5, Constants.Revisions.SNAPSHOT_INTERVAL, 20])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    workload = make_workload(args.prompts, args.edits, args.seed)
+    revisions = sum(len(versions) for versions in workload.values())
+    print(f"revisions: {args.prompts} prompts x {args.edits + 1} revisions ({revisions} total)")
+    for interval in args.intervals:
+        result = measure(workload, interval)
+        ratio = result["stored_bytes"] / result["json_bytes"]
+        print(
+            f"  interval {interval:>3}  stored {result['stored_bytes'] / 1024:8.1f} KiB"
+            f" ({ratio:6.1%} of full JSON copies {result['json_bytes'] / 1024:8.1f} KiB, {result['snapshots']} snapshots)"
+            f"   record {result['record_ms']:5.2f} ms   get p50 {result['get_p50_ms']:5.2f} ms"
+            f" max {result['get_max_ms']:5.2f} ms   diff p50 {result['diff_p50_ms']:5.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
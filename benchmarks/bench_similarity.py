@@ -0,0 +1,158 @@
+# Prompt Master: 類似プロンプト検索 (SimilarityIndex) の構築時間・検索時間・再現率のベンチマーク
+#
+# 強化後のプロンプトと同じ見出し構成（ペルソナ・思考プロセス・制約条件・出力形式）を持ち、
+# 本文の語彙だけが異なるプロンプトを作り、一部を既存のプロンプトを少し書き換えた「ほぼ重複」にします。
+# 索引の構築時間とメモリ、1件あたりの類似検索の時間（全件とシグネチャを比べる総当たりとの比較）、
+# 埋め込んだほぼ重複の再現率、重複レポートの所要時間を、件数を変えて計測します。
+# 件数を10倍にしても検索時間がほぼ変わらないことで、検索が件数に比例しないことを確かめます。
+#
+# 使い方:
+#     python benchmarks/bench_similarity.py --sizes 10000 100000
+
+import argparse
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "PromptMaster"))
+
+from constants import Constants  # noqa: E402
+from similarity import SimilarityIndex, estimate  # noqa: E402
+
+_HEADINGS = ("ペルソナ", "思考プロセス", "制約条件", "出力形式")
+_PARTICLES = ("は", "を", "に", "で", "と", "の", "から", "まで")
+
+
+def make_vocabulary(rng: random.Random, size: int = 20000) -> List[str]:
+    """漢字2〜3文字とカタカナ3〜5文字の語を混ぜた、疑似的な語彙を作ります。"""
+    words = []
+    for _ in range(size):
+        if rng.random() < 0.7:
+            words.append("".join(chr(rng.randint(0x4E00, 0x9FA0)) for _ in range(rng.randint(2, 3))))
+        else:
+            words.append("".join(chr(rng.randint(0x30A2, 0x30F3)) for _ in range(rng.randint(3, 5))))
+    return words
+
+
+def _sentence(rng: random.Random, vocabulary: List[str]) -> str:
+    return "".join(rng.choice(vocabulary) + rng.choice(_PARTICLES) for _ in range(rng.randint(4, 8))) + "する。"
+
+
+def make_prompt(rng: random.Random, vocabulary: List[str]) -> str:
+    """見出し構成は共通で、本文の語彙だけが異なる強化後のプロンプトを作ります。"""
+    lines = ["# 命令書", "", _sentence(rng, vocabulary), ""]
+    for title in _HEADINGS:
+        lines += ["---", "", f"## {title}", ""]
+        for i in range(rng.randint(3, 6)):
+            prefix = f"{i + 1}.  " if title == "思考プロセス" else "*   "
+            lines.append(prefix + _sentence(rng, vocabulary))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def edit_prompt(rng: random.Random, vocabulary: List[str], text: str) -> str:
+    """数語の置き換えと1行の追加・削除による、ほぼ重複の本文を作ります。"""
+    lines = text.split("\n")
+    body = [i for i, line in enumerate(lines) if line.startswith(("*", "1", "2", "3", "4", "5", "6"))]
+    for _ in range(rng.randint(1, 3)):
+        i = rng.choice(body)
+        start = rng.randrange(4, max(len(lines[i]) - 4, 5))
+        lines[i] = lines[i][:start] + rng.choice(vocabulary) + lines[i][start + rng.randint(0, 3):]
+    if rng.random() < 0.5:
+        lines.insert(rng.choice(body) + 1, "*   " + _sentence(rng, vocabulary))
+    elif len(body) > 8:
+        del lines[rng.choice(body)]
+    return "\n".join(lines)
+
+
+def make_library(size: int, duplicate_rate: float, seed: int) -> List[Dict[str, Any]]:
+    """`duplicate_rate` の割合で、既存のプロンプトを書き換えたほぼ重複を含むライブラリを作ります。"""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    library: List[Dict[str, Any]] = []
+    for i in range(size):
+        prompt_id = f"prompt-{i:06d}"
+        if library and rng.random() < duplicate_rate:
+            source = rng.choice(library)
+            library.append({
+                "id": prompt_id,
+                "original": source["original"],
+                "improved": edit_prompt(rng, vocabulary, source["improved"]),
+                "near_duplicate_of": source["id"],
+            })
+        else:
+            library.append({"id": prompt_id, "original": _sentence(rng, vocabulary), "improved": make_prompt(rng, vocabulary)})
+    return library
+
+
+def measure(
+    library: List[Dict[str, Any]], queries: int = 300, brute_force_queries: int = 20, memory_sample: int = 5000
+) -> Dict[str, float]:
+    """索引を構築し、構築時間・メモリ・検索時間・再現率・重複レポートの所要時間を返します。"""
+    index = SimilarityIndex()
+    start = time.perf_counter()
+    index.build(library)
+    build_s = time.perf_counter() - start
+    # メモリの追跡は構築を大幅に遅くするため、先頭の一部で別に構築して1件あたりの量を求める
+    tracemalloc.start()
+    sample_index = SimilarityIndex()
+    sample_index.build(library[:memory_sample])
+    memory_mib = tracemalloc.get_traced_memory()[0] / len(sample_index) * len(library) / 2**20
+    tracemalloc.stop()
+
+    rng = random.Random(0)
+    duplicates = [prompt for prompt in library if "near_duplicate_of" in prompt]
+    sample = rng.sample(duplicates, min(queries, len(duplicates)))
+    query_ms, found = [], 0
+    for prompt in sample:
+        start = time.perf_counter()
+        results = index.similar(prompt["id"], threshold=Constants.Similarity.SIMILAR_THRESHOLD)
+        query_ms.append((time.perf_counter() - start) * 1000)
+        found += any(prompt_id == prompt["near_duplicate_of"] for prompt_id, _ in results)
+
+    # 比較用: 全件のシグネチャと比べる総当たり（文字列の比較より速い、索引なしで取りうる最速の方法）
+    signatures = list(index._signatures.values())
+    brute_ms = []
+    for prompt in sample[:brute_force_queries]:
+        sig = index._signatures[prompt["id"]]
+        start = time.perf_counter()
+        [other for other in signatures if estimate(sig, other) >= Constants.Similarity.SIMILAR_THRESHOLD]
+        brute_ms.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    groups = index.duplicate_groups()
+    report_s = time.perf_counter() - start
+    return {
+        "build_s": build_s,
+        "memory_mib": memory_mib,
+        "query_p50_ms": statistics.median(query_ms),
+        "query_p95_ms": sorted(query_ms)[int(len(query_ms) * 0.95) - 1],
+        "brute_force_ms": statistics.median(brute_ms),
+        "recall": found / len(sample),
+        "report_s": report_s,
+        "groups": len(groups),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--duplicate-rate", type=float, default=0.05, help="ほぼ重複として作るプロンプトの割合")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    for size in args.sizes:
+        result = measure(make_library(size, args.duplicate_rate, args.seed))
+        print(
+            f"similarity: {size:>7} prompts  build {result['build_s']:6.1f} s (about {result['memory_mib']:6.1f} MiB)"
+            f"   similar p50 {result['query_p50_ms']:6.2f} ms p95 {result['query_p95_ms']:6.2f} ms"
+            f" (brute force {result['brute_force_ms']:8.2f} ms)   recall {result['recall']:6.1%}"
+            f"   dedupe report {result['report_s']:5.2f} s ({result['groups']} groups)"
+        )
+
+
+if __name__ == "__main__":
+    main()
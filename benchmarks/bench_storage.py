@@ -0,0 +1,226 @@
+# Prompt Master: PromptStorageManager のベンチマーク
+#
+# 使い方:
+#     python benchmarks/bench_storage.py mutation --size 20000 --ops 200
+#     python benchmarks/bench_storage.py startup --sizes 1000 10000 100000
+#     python benchmarks/bench_storage.py search --size 100000
+#     python benchmarks/bench_storage.py index --size 100000 --ops 200
+
+import argparse
+import gc
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "PromptMaster"))
+
+from constants import Constants  # noqa: E402
+from storage import (  # noqa: E402
+    JournalBackend,
+    JsonFileBackend,
+    PromptId,
+    PromptStorageManager,
+    SortedPromptList,
+    SqlitePromptStorageManager,
+    StorageBackend,
+)
+
+
+def make_prompts(count: int, body_size: int = 2000) -> List[Dict]:
+    """ベンチマーク用のダミープロンプトを生成します。"""
+    body = ("# 命令書\n" + "あいうえおかきくけこ" * (body_size // 10))[:body_size]
+    return [
+        {
+            "id": PromptId.new(datetime(2024, 1, 1) + timedelta(microseconds=i)),
+            "timestamp": f"2024-01-01 {i // 60 % 24:02d}:{i % 60:02d}",
+            "title": f"プロンプト {i}",
+            "original": f"ベース {i}",
+            "improved": f"{body}\n{i}",
+            "favorite": i % 50 == 0,
+        }
+        for i in range(count)
+    ]
+
+
+def time_ops(manager: PromptStorageManager, ops: int) -> List[float]:
+    """お気に入り切り替えを繰り返し、1回あたりの所要時間(ms)を返します。"""
+    ids = [p["id"] for p in manager.prompts[:ops]]
+    samples = []
+    for prompt_id in ids:
+        start = time.perf_counter()
+        manager.toggle_favorite(prompt_id)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def bench_mutation(size: int, ops: int):
+    """従来の全体書き直しと操作ログ方式で、変更1件あたりのレイテンシを比較します。"""
+    backends: Dict[str, Callable[[Path], object]] = {
+        "full-rewrite": lambda d: JsonFileBackend(d / Constants.PROMPTS_FILE.name),
+        "journal": lambda d: JournalBackend(d / Constants.PROMPTS_FILE.name, d / Constants.PROMPTS_JOURNAL_FILE.name),
+    }
+    print(f"mutation latency: {size} prompts, {ops} toggles")
+    for name, factory in backends.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            JsonFileBackend(tmp_dir / Constants.PROMPTS_FILE.name).compact(make_prompts(size))
+            manager = PromptStorageManager(tmp_dir, backend=factory(tmp_dir))
+            samples = time_ops(manager, ops)
+            manager.close()
+        p95 = sorted(samples)[int(len(samples) * 0.95) - 1]
+        print(f"  {name:<14} mean {statistics.mean(samples):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+class NullBackend(StorageBackend):
+    """ディスクに書き込まず、一覧の更新コストだけを計測するためのバックエンドです。"""
+
+    def __init__(self, prompts: List[Dict]):
+        self.prompts = prompts
+
+    def load(self) -> List[Dict]:
+        return self.prompts
+
+    def apply(self, operation, prompts):
+        pass
+
+    def rewrite(self, prompts):
+        pass
+
+
+class ResortedList:
+    """変更のたびに全体をソートし直し、削除は内包表記で作り直す従来方式の一覧です。"""
+
+    def __init__(self, key, items):
+        self.key = key
+        self.items = sorted(items, key=key, reverse=True)
+
+    def add(self, item):
+        self.items.append(item)
+        self.items.sort(key=self.key, reverse=True)
+
+    def remove(self, item):
+        self.items = [p for p in self.items if p["id"] != item["id"]]
+
+
+def bench_index(size: int, ops: int):
+    """既定の並び順の一覧について、追加・削除・お気に入り切り替え1件あたりの所要時間を比較します。"""
+    prompts = make_prompts(size, body_size=10)
+    key = PromptStorageManager._order_key
+    rng = random.Random(0)
+    print(f"index mutation: {size} prompts, {ops} ops each")
+    structures: Dict[str, Callable[[], object]] = {
+        "resort": lambda: ResortedList(key, prompts),
+        "sorted-list": lambda: SortedPromptList(key, prompts),
+    }
+    for name, factory in structures.items():
+        index = factory()
+        targets = rng.sample(prompts, ops)
+        results = {}
+        start = time.perf_counter()
+        for prompt in targets:
+            index.remove(prompt)
+            prompt["favorite"] = not prompt["favorite"]
+            index.add(prompt)
+        results["toggle"] = time.perf_counter() - start
+        start = time.perf_counter()
+        for prompt in targets:
+            index.remove(prompt)
+        results["delete"] = time.perf_counter() - start
+        start = time.perf_counter()
+        for prompt in targets:
+            index.add(prompt)
+        results["insert"] = time.perf_counter() - start
+        line = "   ".join(f"{op} {elapsed / ops * 1e6:9.1f} us" for op, elapsed in results.items())
+        print(f"  {name:<12} {line}")
+
+    manager = PromptStorageManager(Path(tempfile.gettempdir()), backend=NullBackend(prompts))
+    samples = time_ops(manager, ops)
+    p95 = sorted(samples)[int(len(samples) * 0.95) - 1]
+    print(f"  manager toggle_favorite mean {statistics.mean(samples) * 1000:7.1f} us   p95 {p95 * 1000:7.1f} us")
+
+
+def bench_startup(sizes: List[int], body_size: int, page_size: int = 50):
+    """起動（ライブラリ読み込み＋先頭ページ取得）の時間とピークメモリを比較します。"""
+    print(f"startup: first page of {page_size}, body {body_size} chars")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            json_path = tmp_dir / Constants.PROMPTS_FILE.name
+            journal_path = tmp_dir / Constants.PROMPTS_JOURNAL_FILE.name
+            db_path = tmp_dir / Constants.PROMPTS_DB_FILE.name
+            JsonFileBackend(json_path).compact(make_prompts(size, body_size))
+            migrate_start = time.perf_counter()
+            SqlitePromptStorageManager(tmp_dir, db_path=db_path, legacy_path=json_path).close()
+            migrate_ms = (time.perf_counter() - migrate_start) * 1000
+
+            factories: Dict[str, Callable[[], object]] = {
+                "json": lambda: PromptStorageManager(tmp_dir, backend=JournalBackend(json_path, journal_path)),
+                "sqlite": lambda: SqlitePromptStorageManager(tmp_dir, db_path=db_path, legacy_path=json_path),
+            }
+            for name, factory in factories.items():
+                tracemalloc.start()
+                start = time.perf_counter()
+                manager = factory()
+                manager.list_prompts(0, page_size)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                manager.close()
+                del manager
+                gc.collect()
+                print(f"  {size:>7} {name:<7} {elapsed_ms:10.1f} ms   peak {peak / 2**20:8.1f} MiB")
+            print(f"  {size:>7} migrate {migrate_ms:10.1f} ms")
+
+
+def bench_search(size: int, body_size: int, queries: List[str]):
+    """検索インデックスの構築時間と、クエリ1件あたりの応答時間を計測します。"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        json_path = tmp_dir / Constants.PROMPTS_FILE.name
+        JsonFileBackend(json_path).compact(make_prompts(size, body_size))
+        manager = PromptStorageManager(tmp_dir, backend=JsonFileBackend(json_path))
+        start = time.perf_counter()
+        manager.build_search_index(background=False)
+        print(f"search: index build for {size} prompts {time.perf_counter() - start:.2f} s")
+        for query in queries:
+            start = time.perf_counter()
+            results = manager.search(query, limit=Constants.UI.SEARCH_RESULT_LIMIT)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(f"  {query:<16} {len(results):>6} hits {elapsed_ms:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="command", required=True)
+    mutation = sub.add_parser("mutation", help="変更1件あたりのレイテンシを比較")
+    mutation.add_argument("--size", type=int, default=20000)
+    mutation.add_argument("--ops", type=int, default=200)
+    startup = sub.add_parser("startup", help="起動時間とメモリ使用量を比較")
+    startup.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    startup.add_argument("--body-size", type=int, default=500)
+    search = sub.add_parser("search", help="全文検索の応答時間を計測")
+    search.add_argument("--size", type=int, default=100000)
+    search.add_argument("--body-size", type=int, default=500)
+    search.add_argument("--queries", nargs="+", default=["命令書", "プロンプト 12", "99999", "け"])
+    index = sub.add_parser("index", help="並び順を保つ一覧の更新コストを比較")
+    index.add_argument("--size", type=int, default=100000)
+    index.add_argument("--ops", type=int, default=200)
+    args = parser.parse_args()
+    if args.command == "mutation":
+        bench_mutation(args.size, args.ops)
+    elif args.command == "startup":
+        bench_startup(args.sizes, args.body_size)
+    elif args.command == "search":
+        bench_search(args.size, args.body_size, args.queries)
+    elif args.command == "index":
+        bench_index(args.size, args.ops)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# Prompt Master: テンプレートの一括展開 (templates.render_all) のベンチマーク
+#
+# 強化前のベースプロンプトに近い長さのテンプレートを、件数分の変数の組（CSV）で展開し、
+# 1秒あたりの展開件数と、展開中のピークメモリを計測します。比較のため、展開のたびに
+# 正規表現で置換する素朴な方法の速度も計測します。あわせて、展開した全てのテキストを保存する
+# 場合と、テンプレート1件と変数の組のCSVだけを保存する場合の大きさを比べます。
+#
+# 使い方:
+#     python benchmarks/bench_templates.py --sizes 10000 100000
+
+import argparse
+import csv
+import io
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "PromptMaster"))
+
+from templates import FORMAT_CSV, compile_template, read_variable_sets, render_all  # noqa: E402
+
+TEMPLATE = (
+    "あなたは{{業界}}に詳しい{{役割}}です。{{対象読者}}に向けて、「{{テーマ}}」について解説する記事を書いてください。\n"
+    "文字数は{{文字数}}字程度、文体は{{文体}}とし、見出しを3つ以上含めてください。\n"
+    "最後に、{{対象読者}}が明日から実践できる行動を{{行動数}}つ挙げてください。"
+)
+_CHOICES = {
+    "業界": ["製造業", "医療", "教育", "金融", "小売", "物流", "農業", "IT"],
+    "役割": ["コンサルタント", "編集者", "研究者", "エンジニア", "マーケター"],
+    "対象読者": ["新入社員", "経営者", "学生", "一般の読者", "専門家"],
+    "文字数": ["800", "1200", "2000", "3000"],
+    "文体": ["です・ます調", "である調", "会話調"],
+    "行動数": ["3", "5", "7"],
+}
+
+
+def make_variables_csv(size: int, seed: int = 1) -> str:
+    """件数分の変数の組をCSVの文字列で作ります。テーマは組ごとに異なります。"""
+    rng = random.Random(seed)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    names = list(_CHOICES) + ["テーマ"]
+    writer.writerow(names)
+    for i in range(size):
+        writer.writerow([rng.choice(_CHOICES[name]) for name in _CHOICES] + [f"テーマ{i}の最新動向と課題"])
+    return out.getvalue()
+
+
+def _naive_render(text: str, values: Dict[str, str]) -> str:
+    return re.sub(r"\{\{\s*([^{}\s]+)\s*\}\}", lambda m: values[m.group(1)], text)
+
+
+def _stream(template, path: Path) -> int:
+    """ファイルから変数の組を読みながら展開し、展開したテキストの合計バイト数を返します。"""
+    rendered_bytes = 0
+    with path.open("r", encoding="utf-8", newline="") as f:
+        for _, _, text in render_all(template, read_variable_sets(f, FORMAT_CSV)):
+            rendered_bytes += len(text.encode("utf-8"))
+    return rendered_bytes
+
+
+def measure(size: int) -> Dict[str, float]:
+    """展開の速度（件/秒）・ピークメモリ・保存する大きさを返します。"""
+    variables_csv = make_variables_csv(size)
+    template = compile_template(TEMPLATE)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "variables.csv"
+        path.write_text(variables_csv, encoding="utf-8")
+        start = time.perf_counter()
+        rendered_bytes = _stream(template, path)
+        render_s = time.perf_counter() - start
+        # メモリの追跡は処理を遅くするため、速度とは別に計測する
+        tracemalloc.start()
+        _stream(template, path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    rows: List[Dict[str, str]] = list(read_variable_sets(io.StringIO(variables_csv), FORMAT_CSV))
+    start = time.perf_counter()
+    for values in rows:
+        template.render(values)
+    compiled_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for values in rows:
+        _naive_render(TEMPLATE, values)
+    naive_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(size):
+        compile_template(TEMPLATE)
+    cached_compile_us = (time.perf_counter() - start) / size * 1e6
+    return {
+        "stream_per_s": size / render_s,
+        "stream_peak_mib": peak / 2**20,
+        "render_per_s": size / compiled_s,
+        "naive_per_s": size / naive_s,
+        "cached_compile_us": cached_compile_us,
+        "rendered_mib": rendered_bytes / 2**20,
+        "template_csv_mib": (len(TEMPLATE.encode("utf-8")) + len(variables_csv.encode("utf-8"))) / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+    for size in args.sizes:
+        result = measure(size)
+        print(
+            f"templates: {size:>7} variable sets  stream {result['stream_per_s']:>9,.0f} /s"
+            f" (peak {result['stream_peak_mib']:5.1f} MiB)   render {result['render_per_s']:>9,.0f} /s"
+            f"   re.sub {result['naive_per_s']:>9,.0f} /s   cached compile {result['cached_compile_us']:5.2f} us"
+            f"   stored {result['template_csv_mib']:6.1f} MiB vs {result['rendered_mib']:6.1f} MiB rendered"
+        )
+
+
+if __name__ == "__main__":
+    main()
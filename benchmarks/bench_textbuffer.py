@@ -0,0 +1,144 @@
+# Prompt Master: 大きなテキストの入れ替えと1行変換 (TextBuffer) のベンチマーク
+#
+# 強化後のプロンプトに似た10KB・100KB・1MBのテキストで、メインウィンドウと同じ設定のテキストボックスに
+# 対して「入れ替え」と「1行に変換」のオン・オフを行い、描画を終えるまでの時間と、その間にUIが
+# 最も長く止まった時間（1回のイベント処理の最大の所要時間）を計測します。比較のため、全体を読み直して
+# 一度に削除・挿入する従来の方法も計測します。
+#
+# 使い方 (ディスプレイが必要です):
+#     python benchmarks/bench_textbuffer.py --sizes 10 100 1000
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "PromptMaster"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import customtkinter as ctk  # noqa: E402
+
+from bench_revisions import make_prompt  # noqa: E402
+from constants import Constants  # noqa: E402
+from textbuffer import TextBuffer  # noqa: E402
+
+
+def make_text(rng: random.Random, kib: int) -> str:
+    """強化後のプロンプトに似た節を、UTF-8で `kib` KiB に達するまで繋げます。"""
+    parts, size = [], 0
+    while size < kib * 1024:
+        parts.append(make_prompt(rng))
+        size += len(parts[-1].encode("utf-8")) + 2
+    return "\n\n".join(parts)
+
+
+def make_textbox(app: ctk.CTk) -> ctk.CTkTextbox:
+    textbox = ctk.CTkTextbox(app, font=ctk.CTkFont(size=14), wrap="word", corner_radius=0, border_width=2)
+    textbox.pack(side="left", fill="both", expand=True)
+    return textbox
+
+
+def run_until(app: ctk.CTk, start: Callable[[Callable[[], None]], None]) -> Dict[str, float]:
+    """`start` に渡した完了通知が呼ばれて描画を終えるまでイベントを処理し、所要時間と最長の停止時間 (ms) を返します。"""
+    done = []
+    began = time.perf_counter()
+    start(lambda: done.append(True))
+    longest = (time.perf_counter() - began) * 1000
+    while not done:
+        tick = time.perf_counter()
+        app.update()
+        longest = max(longest, (time.perf_counter() - tick) * 1000)
+    tick = time.perf_counter()
+    app.update()
+    longest = max(longest, (time.perf_counter() - tick) * 1000)
+    return {"total_ms": (time.perf_counter() - began) * 1000, "max_block_ms": longest}
+
+
+def measure(app: ctk.CTk, kib: int, seed: int = 1) -> Dict[str, float]:
+    """`kib` KiB のテキストで、入れ替えと1行変換のオン・オフの所要時間と最長の停止時間を返します。"""
+    rng = random.Random(seed)
+    left_text, right_text = make_text(rng, kib), make_text(rng, kib)
+    left, right = make_textbox(app), make_textbox(app)
+    left_buffer, right_buffer = TextBuffer(left), TextBuffer(right)
+    result: Dict[str, float] = {}
+    try:
+        left_buffer.set_text(left_text)
+        right_buffer.set_text(right_text)
+        left_buffer.flush()
+        right_buffer.flush()
+        app.update()
+
+        def swap(done: Callable[[], None]):
+            a, b = left_buffer.get(), right_buffer.get()
+            left_buffer.set_text(b)
+            right_buffer.set_text(a, on_done=done)
+
+        def oneline_on(done: Callable[[], None]):
+            text = right_buffer.get()
+            right_buffer.set_text(text.replace("\n", "\\n"), editable=False, on_done=done)
+
+        def oneline_off(done: Callable[[], None]):
+            right_buffer.set_text(right_text, on_done=done)
+
+        # 従来の方法: テキストボックスを読み直し、全体を一度に削除・挿入する
+        def swap_direct(done: Callable[[], None]):
+            a, b = left.get("1.0", "end-1c"), right.get("1.0", "end-1c")
+            left.delete("1.0", "end")
+            left.insert("1.0", b)
+            right.delete("1.0", "end")
+            right.insert("1.0", a)
+            done()
+
+        def oneline_direct(done: Callable[[], None]):
+            text = right.get("1.0", "end-1c").replace("\n", "\\n")
+            right.delete("1.0", "end")
+            right.insert("1.0", text)
+            done()
+
+        def restore_direct(done: Callable[[], None]):
+            right.delete("1.0", "end")
+            right.insert("1.0", right_text)
+            done()
+
+        for name, operation in (
+            ("swap", swap), ("oneline_on", oneline_on), ("oneline_off", oneline_off),
+            ("swap_direct", swap_direct), ("oneline_on_direct", oneline_direct), ("oneline_off_direct", restore_direct),
+        ):
+            for key, value in run_until(app, operation).items():
+                result[f"{name}.{key}"] = value
+            if name.startswith("swap"):
+                # 次の計測のために元の並びに戻す
+                run_until(app, swap)
+    finally:
+        left.destroy()
+        right.destroy()
+    result["kib"] = len(right_text.encode("utf-8")) / 1024
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="テキストの大きさ (KiB)")
+    args = parser.parse_args()
+    app = ctk.CTk()
+    app.geometry(Constants.UI.DEFAULT_GEOMETRY)
+    app.update()
+    try:
+        for kib in args.sizes:
+            result = measure(app, kib)
+            print(f"text: {result['kib']:8.1f} KiB")
+            for name in ("swap", "oneline_on", "oneline_off"):
+                print(
+                    f"  {name:<12} total {result[f'{name}.total_ms']:8.1f} ms"
+                    f" (max block {result[f'{name}.max_block_ms']:7.1f} ms)"
+                    f"   direct {result[f'{name}_direct.total_ms']:8.1f} ms"
+                    f" (max block {result[f'{name}_direct.max_block_ms']:7.1f} ms)"
+                )
+    finally:
+        app.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+# Prompt Master: Gemini REST API互換のローカルスタブサーバー
+#
+# generateContent と streamGenerateContent (REST, JSON配列のストリーム)、countTokens に応答します。
+# コンテキストキャッシュ (cachedContents の作成・削除) にも対応し、キャッシュを使ったリクエストでは
+# usageMetadata.cachedContentTokenCount を返します。トークン数は4文字を1トークンとして見積もります。
+# OpenAI互換の /v1/chat/completions (stream=true ではServer-Sent Events) にも同じ内容で応答するため、
+# OpenAI形式のクライアントやツールからも使えます。
+# 応答の遅延と、指定したHTTPステータスのエラーを順に返す・一定の確率で返す障害注入ができるため、
+# APIキーなしでApiServiceやRequestSchedulerの動作と性能を確かめられます。
+#
+# 使い方:
+#     python benchmarks/gemini_stub.py --port 8765 --latency 0.2
+#     python benchmarks/gemini_stub.py --error-rate 0.1 --seed 1   # 10%のリクエストに503を返す
+#     # config.json の api_settings.api_endpoint に "http://127.0.0.1:8765" を指定する
+
+import argparse
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional
+
+ERROR_STATUSES = {
+    400: "INVALID_ARGUMENT",
+    404: "NOT_FOUND",
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    503: "UNAVAILABLE",
+    504: "DEADLINE_EXCEEDED",
+}
+
+
+def _content_text(contents: Iterable[Dict[str, Any]]) -> str:
+    """Content の配列に含まれるテキストを連結して返します。"""
+    parts = []
+    for content in contents:
+        for part in content.get("parts", []):
+            parts.append(part.get("text", ""))
+    return "\n".join(parts)
+
+
+def count_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """generateContent / streamGenerateContent に応答するハンドラです。"""
+
+    protocol_version = "HTTP/1.1"
+    # ヘッダーと本文を別々に書き込むため、Nagleアルゴリズムによる遅延を避ける
+    disable_nagle_algorithm = True
+    server: "GeminiStubServer"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.requests += 1
+        path = self.path.split("?", 1)[0]
+        if path.endswith("/cachedContents"):
+            self._create_cached_content(body)
+            return
+        if path.endswith("/chat/completions"):
+            self._chat_completions(body)
+            return
+        if path.endswith(":countTokens"):
+            text = _content_text(body.get("contents", [])) or _content_text(
+                body.get("generateContentRequest", {}).get("contents", [])
+            )
+            self._send_json(200, {"totalTokens": count_tokens(text)})
+            return
+        model = self.path.split("/models/", 1)[-1].split(":", 1)[0]
+        status = self.server.next_failure()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if status is not None:
+            self._send_error(status, "injected")
+            return
+        system_text = _content_text([body.get("systemInstruction") or {}])
+        cached_tokens = 0
+        if body.get("cachedContent"):
+            cached = self.server.cached_contents.get(body["cachedContent"])
+            if cached is None:
+                self._send_error(404, f"CachedContent not found: {body['cachedContent']}")
+                return
+            system_text, cached_tokens = cached["systemText"], cached["usageMetadata"]["totalTokenCount"]
+        user_text = _content_text(body.get("contents", []))
+        prompt_tokens = count_tokens(system_text) + count_tokens(user_text)
+        text = self.server.compose(model, user_text)
+        if ":streamGenerateContent" in self.path:
+            self._send_stream(self.server.split(text), prompt_tokens, cached_tokens)
+        else:
+            self._send_json(200, self.server.response_payload(text, prompt_tokens, cached_tokens))
+
+    def do_DELETE(self):
+        name = self.path.split("/v1beta/", 1)[-1].split("?", 1)[0]
+        if self.server.cached_contents.pop(name, None) is None:
+            self._send_error(404, f"CachedContent not found: {name}")
+        else:
+            self._send_json(200, {})
+
+    def _create_cached_content(self, body: Dict[str, Any]):
+        """コンテキストキャッシュを登録します。トークン数が `min_cache_tokens` 未満なら400を返します。"""
+        system_text = _content_text([body.get("systemInstruction") or {}])
+        tokens = count_tokens(system_text) + count_tokens(_content_text(body.get("contents", [])))
+        if tokens < self.server.min_cache_tokens:
+            self._send_error(400, f"Cached content is too small. total_token_count={tokens}, min_total_token_count={self.server.min_cache_tokens}")
+            return
+        name = f"cachedContents/stub{next(self.server.cache_ids)}"
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        expire = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + float(body.get("ttl", "3600s").rstrip("s"))))
+        cached = {
+            "name": name,
+            "model": body.get("model", ""),
+            "createTime": now,
+            "updateTime": now,
+            "expireTime": expire,
+            "usageMetadata": {"totalTokenCount": tokens},
+        }
+        self.server.cached_contents[name] = dict(cached, systemText=system_text)
+        self._send_json(200, cached)
+
+    def _chat_completions(self, body: Dict[str, Any]):
+        """OpenAI互換の chat/completions に応答します。エラーもOpenAIの形式で返します。"""
+        status = self.server.next_failure()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if status is not None:
+            error = {"message": "injected", "type": ERROR_STATUSES.get(status, "UNKNOWN").lower(), "code": status}
+            self._send_json(status, {"error": error})
+            return
+        messages = body.get("messages", [])
+        system_text = "\n".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        user_text = "\n".join(m.get("content", "") for m in messages if m.get("role") != "system")
+        prompt_tokens = count_tokens(system_text) + count_tokens(user_text)
+        model = body.get("model", "")
+        text = self.server.compose(model, user_text)
+        completion_id = f"chatcmpl-stub{next(self.server.cache_ids)}"
+        if not body.get("stream"):
+            tokens = count_tokens(text)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": tokens, "total_tokens": prompt_tokens + tokens},
+            })
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunks = self.server.split(text)
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        for index, chunk in enumerate(chunks):
+            if index and self.server.chunk_delay:
+                time.sleep(self.server.chunk_delay)
+            delta = {"role": "assistant", "content": chunk} if index == 0 else {"content": chunk}
+            self._write_event(dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+        self._write_event(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if body.get("stream_options", {}).get("include_usage"):
+            tokens = count_tokens(text)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": tokens, "total_tokens": prompt_tokens + tokens}
+            self._write_event(dict(base, choices=[], usage=usage))
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_event(self, payload: Dict[str, Any]):
+        self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n")
+
+    def _send_error(self, status: int, message: str):
+        self._send_json(status, {"error": {"code": status, "message": message, "status": ERROR_STATUSES.get(status, "UNKNOWN")}})
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, chunks: List[str], prompt_tokens: int = 0, cached_tokens: int = 0):
+        """チャンクをJSON配列の要素として、HTTPのchunked転送で1つずつ送ります。"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for index, chunk in enumerate(chunks):
+            if index and self.server.chunk_delay:
+                time.sleep(self.server.chunk_delay)
+            prefix = "[" if index == 0 else ",\r\n"
+            payload = self.server.response_payload(chunk, prompt_tokens, cached_tokens)
+            self._write_chunk(prefix + json.dumps(payload, ensure_ascii=False))
+        self._write_chunk("]" if chunks else "[]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GeminiStubServer(ThreadingHTTPServer):
+    """Gemini REST APIを模倣するスタブサーバーです。受け付けた接続数とリクエスト数を数えます。
+
+    `latency` は応答までの遅延（秒）、`chunk_delay` はストリーミングのチャンク間の遅延（秒）です。
+    `fail_with()` で指定したHTTPステータスは、以降のリクエストに1件ずつ順に返します。
+    `error_rate` を指定すると、予約したエラーがない間はその確率で `error_statuses` のいずれかを返します。
+    `min_cache_tokens` 未満のコンテキストキャッシュの登録は、実際のAPIと同様に400で拒否します。
+    """
+
+    daemon_threads = True
+    CHUNK_SIZE = 24
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        chunk_delay: float = 0.0,
+        min_cache_tokens: int = 0,
+        error_rate: float = 0.0,
+        error_statuses: Iterable[int] = (503,),
+        seed: Optional[int] = None,
+    ):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.min_cache_tokens = min_cache_tokens
+        self.error_rate = error_rate
+        self.error_statuses = list(error_statuses)
+        self._random = random.Random(seed)
+        self.cached_contents: Dict[str, Dict[str, Any]] = {}
+        self.cache_ids = itertools.count(1)
+        self.connections = 0
+        self.requests = 0
+        self._failures: "deque[int]" = deque()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "GeminiStubServer":
+        """バックグラウンドスレッドで待ち受けを開始します。"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        """ストリーミングを中止したクライアントが接続を切るのは想定内のため、その場合は何も出力しません。"""
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    def fail_with(self, statuses: Iterable[int]):
+        """次のリクエストから順に、指定したHTTPステータスのエラーを返すよう予約します。"""
+        with self._lock:
+            self._failures.extend(statuses)
+
+    def next_failure(self) -> Optional[int]:
+        with self._lock:
+            if self._failures:
+                return self._failures.popleft()
+            if self.error_rate and self.error_statuses and self._random.random() < self.error_rate:
+                return self._random.choice(self.error_statuses)
+            return None
+
+    def compose(self, model: str, user_text: str) -> str:
+        return f"# 命令書\n\n（{model} のスタブ応答）\n\n{user_text.strip()}\n"
+
+    def split(self, text: str) -> List[str]:
+        return [text[i:i + self.CHUNK_SIZE] for i in range(0, len(text), self.CHUNK_SIZE)]
+
+    @staticmethod
+    def response_payload(text: str, prompt_tokens: int = 0, cached_tokens: int = 0) -> Dict[str, Any]:
+        tokens = count_tokens(text)
+        usage = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": tokens, "totalTokenCount": prompt_tokens + tokens}
+        if cached_tokens:
+            usage["cachedContentTokenCount"] = cached_tokens
+        return {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": usage,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini REST API互換のローカルスタブサーバー")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="応答までの遅延（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="ストリーミングのチャンク間の遅延（秒）")
+    parser.add_argument("--fail", type=int, nargs="*", default=[], help="最初のリクエストから順に返すHTTPステータス")
+    parser.add_argument("--min-cache-tokens", type=int, default=0, help="コンテキストキャッシュに登録できる最小トークン数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="エラーを返す確率 (0〜1)")
+    parser.add_argument("--error-statuses", type=int, nargs="+", default=[503], help="--error-rate で返すHTTPステータス")
+    parser.add_argument("--seed", type=int, help="--error-rate の乱数の種")
+    args = parser.parse_args()
+    server = GeminiStubServer(
+        args.port,
+        args.latency,
+        args.chunk_delay,
+        args.min_cache_tokens,
+        error_rate=args.error_rate,
+        error_statuses=args.error_statuses,
+        seed=args.seed,
+    )
+    server.fail_with(args.fail)
+    print(f"Gemini stub listening on {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+# Prompt Master: ベンチマーク一式の実行と、結果の保存・比較
+#
+# ローカルのスタブサーバー (gemini_stub.py) を使うため、APIキーもネットワークも不要です。
+# 次の項目を計測し、結果を benchmarks/results/ にJSONで保存します。
+#     api      ApiService の順次呼び出しの所要時間、並行呼び出しのスループット、ストリーミングのTTFB
+#     ui       強化ボタンと同じ経路（RequestScheduler → PromptMasterApp のタスク）の所要時間
+#     storage  PromptStorageManager（操作ログ / SQLite）の起動・追加・お気に入り切り替え・検索（件数ごと）
+#     revisions 版の履歴の保存サイズ（全文で保存した場合との比）と記録・復元の所要時間
+#     similarity 類似検索の索引の構築時間・検索時間・ほぼ重複の再現率・重複レポートの所要時間（件数ごと）
+#     diff     2万文字のプロンプトの差分表示の計算時間（全体の比較と、入力1回ごとの取り直し）
+#     templates テンプレートの一括展開の速度とピークメモリ（件数ごと）
+#     text     10KB〜1MBのテキストの入れ替え・1行変換の所要時間とUIの最長の停止時間（ディスプレイがない場合はスキップ）
+#     dialog   SavedPromptsDialog の表示時間（ディスプレイがない場合はスキップ）
+# --compare に以前の結果を指定すると、項目ごとの変化を表示し、閾値を超えて悪化した項目を報告します。
+#
+# 使い方:
+#     python benchmarks/run_all.py
+#     python benchmarks/run_all.py --quick --suites api ui
+#     python benchmarks/run_all.py --compare benchmarks/results/20261018-120000-306f8cd.json --fail-on-regression
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "PromptMaster"))
+
+from api_service import ApiService  # noqa: E402
+from bench_api import time_calls  # noqa: E402
+from bench_storage import make_prompts, time_ops  # noqa: E402
+from constants import Constants  # noqa: E402
+from gemini_stub import GeminiStubServer  # noqa: E402
+from scheduler import RequestScheduler  # noqa: E402
+from storage import JournalBackend, JsonFileBackend, PromptStorageManager, SqlitePromptStorageManager  # noqa: E402
+
+RESULTS_DIR = BENCH_DIR / "results"
+SUITES = ("api", "ui", "storage", "revisions", "similarity", "diff", "templates", "text", "dialog")
+MODEL = "gemini-2.5-flash"
+SYSTEM_PROMPT = "システムプロンプト"
+
+Metrics = Dict[str, float]
+
+
+def p50(samples: List[float]) -> float:
+    return statistics.median(samples)
+
+
+def p95(samples: List[float]) -> float:
+    ordered = sorted(samples)
+    return ordered[max(int(len(ordered) * 0.95) - 1, 0)]
+
+
+def higher_is_better(name: str) -> bool:
+    """スループット (`_per_s`) と再現率 (`recall`) は大きいほど良く、それ以外の時間・メモリは小さいほど良い項目です。"""
+    return name.endswith(("_per_s", ".recall"))
+
+
+# --- api ---
+def bench_api(calls: int, concurrency: int) -> Metrics:
+    """ApiService の順次呼び出し・並行呼び出し・ストリーミングを計測します。"""
+    metrics: Metrics = {}
+    server = GeminiStubServer().start()
+    try:
+        samples = time_calls(calls, server.endpoint, pooled=True)
+        metrics["api.sequential_p50_ms"] = p50(samples)
+        metrics["api.sequential_p95_ms"] = p95(samples)
+
+        service = ApiService(transport="rest", api_endpoint=server.endpoint)
+        service.improve_prompt("stub-key", MODEL, SYSTEM_PROMPT, "ウォームアップ")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(
+                lambda i: service.improve_prompt("stub-key", MODEL, SYSTEM_PROMPT, f"並行 {i}"), range(calls)
+            ))
+        metrics["api.concurrent_calls_per_s"] = calls / (time.perf_counter() - start)
+
+        ttfbs, totals = [], []
+        for i in range(min(calls, 50)):
+            results = []
+            for _ in service.improve_prompt_stream(
+                "stub-key", MODEL, SYSTEM_PROMPT, f"ストリーミング {i} " * 20, force_refresh=True, on_result=results.append
+            ):
+                pass
+            ttfbs.append(results[0].ttfb_ms)
+            totals.append(results[0].latency_ms)
+        metrics["api.stream_ttfb_p50_ms"] = p50(ttfbs)
+        metrics["api.stream_total_p50_ms"] = p50(totals)
+        service.close()
+    finally:
+        server.stop()
+    return metrics
+
+
+# --- ui ---
+class _FirstChunkList(list):
+    """最初にチャンクが追加された時刻を記録するバッファです。"""
+
+    first_at: Optional[float] = None
+
+    def append(self, item):
+        if self.first_at is None:
+            self.first_at = time.perf_counter()
+        super().append(item)
+
+
+def bench_ui(calls: int) -> Metrics:
+    """強化ボタンと同じく、スケジューラに PromptMasterApp のタスクを投入してから完了するまでを計測します。
+
+    ウィンドウは作らず、タスクが参照する属性だけを持つオブジェクトでアプリの代わりをさせます。
+    """
+    from main import PromptMasterApp
+
+    server = GeminiStubServer(chunk_delay=0.002).start()
+    service = ApiService(transport="rest", api_endpoint=server.endpoint)
+    host = types.SimpleNamespace(api_service=service, _stream_lock=threading.Lock())
+    scheduler = RequestScheduler()
+    metrics: Metrics = {}
+    try:
+        service.improve_prompt("stub-key", MODEL, SYSTEM_PROMPT, "ウォームアップ")
+        blocking, first_chunk, streaming = [], [], []
+        for i in range(calls):
+            done = threading.Event()
+            start = time.perf_counter()
+            scheduler.submit(
+                "bench",
+                lambda job: PromptMasterApp._improve_prompt_task(host, job, "stub-key", MODEL, SYSTEM_PROMPT, f"UI {i}"),
+                on_done=lambda job: done.set(),
+            )
+            done.wait()
+            blocking.append((time.perf_counter() - start) * 1000)
+
+            chunks = _FirstChunkList()
+            done.clear()
+            start = time.perf_counter()
+            scheduler.submit(
+                "bench",
+                lambda job: PromptMasterApp._improve_stream_task(
+                    host, job, chunks, "stub-key", MODEL, SYSTEM_PROMPT, f"UI ストリーミング {i} " * 20
+                ),
+                on_done=lambda job: done.set(),
+            )
+            done.wait()
+            streaming.append((time.perf_counter() - start) * 1000)
+            if chunks.first_at is not None:
+                first_chunk.append((chunks.first_at - start) * 1000)
+        metrics["ui.improve_p50_ms"] = p50(blocking)
+        metrics["ui.improve_p95_ms"] = p95(blocking)
+        metrics["ui.stream_first_chunk_p50_ms"] = p50(first_chunk)
+        metrics["ui.stream_total_p50_ms"] = p50(streaming)
+    finally:
+        scheduler.shutdown()
+        service.close()
+        server.stop()
+    return metrics
+
+
+# --- storage ---
+def _time_each(fn: Callable[[int], Any], count: int) -> List[float]:
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def bench_storage(sizes: List[int], ops: int) -> Metrics:
+    """件数ごとに、操作ログ方式とSQLiteのストレージの起動・追加・お気に入り切り替え・検索を計測します。"""
+    metrics: Metrics = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            json_path = tmp_dir / Constants.PROMPTS_FILE.name
+            journal_path = tmp_dir / Constants.PROMPTS_JOURNAL_FILE.name
+            db_path = tmp_dir / Constants.PROMPTS_DB_FILE.name
+            JsonFileBackend(json_path).compact(make_prompts(size, 500))
+            SqlitePromptStorageManager(tmp_dir, db_path=db_path, legacy_path=json_path).close()
+            factories: Dict[str, Callable[[], Any]] = {
+                "journal": lambda: PromptStorageManager(tmp_dir, backend=JournalBackend(json_path, journal_path)),
+                "sqlite": lambda: SqlitePromptStorageManager(tmp_dir, db_path=db_path, legacy_path=json_path),
+            }
+            for name, factory in factories.items():
+                prefix = f"storage.{name}.{size}"
+                start = time.perf_counter()
+                manager: PromptStorageManager = factory()
+                manager.list_prompts(0, 50)
+                metrics[f"{prefix}.startup_ms"] = (time.perf_counter() - start) * 1000
+                if name == "journal":
+                    start = time.perf_counter()
+                    manager.build_search_index(background=False)
+                    metrics[f"{prefix}.index_build_ms"] = (time.perf_counter() - start) * 1000
+                samples = _time_each(lambda i: manager.search(f"プロンプト {i}", limit=Constants.UI.SEARCH_RESULT_LIMIT), 20)
+                metrics[f"{prefix}.search_p50_ms"] = p50(samples)
+                samples = _time_each(lambda i: manager.add_prompt(f"追加 {i}", f"# 命令書\n追加されたプロンプト {i}"), ops)
+                metrics[f"{prefix}.add_p50_ms"] = p50(samples)
+                samples = time_ops(manager, ops)
+                metrics[f"{prefix}.toggle_p50_ms"] = p50(samples)
+                manager.close()
+    return metrics
+
+
+# --- revisions ---
+def bench_revisions(prompts: int) -> Metrics:
+    """bench_revisions.py と同じ編集ワークロードを既定のスナップショット間隔で記録します。"""
+    import bench_revisions
+
+    result = bench_revisions.measure(
+        bench_revisions.make_workload(prompts, 40, seed=1), Constants.Revisions.SNAPSHOT_INTERVAL
+    )
+    return {
+        "revisions.stored_ratio": result["stored_bytes"] / result["json_bytes"],
+        "revisions.record_ms": result["record_ms"],
+        "revisions.get_p50_ms": result["get_p50_ms"],
+        "revisions.diff_p50_ms": result["diff_p50_ms"],
+    }
+
+
+# --- similarity ---
+def bench_similarity(sizes: List[int]) -> Metrics:
+    """bench_similarity.py と同じ、ほぼ重複を5%含むライブラリで類似検索を計測します。"""
+    import bench_similarity
+
+    metrics: Metrics = {}
+    for size in sizes:
+        result = bench_similarity.measure(bench_similarity.make_library(size, 0.05, seed=1))
+        metrics[f"similarity.{size}.build_s"] = result["build_s"]
+        metrics[f"similarity.{size}.query_p50_ms"] = result["query_p50_ms"]
+        metrics[f"similarity.{size}.query_p95_ms"] = result["query_p95_ms"]
+        metrics[f"similarity.{size}.recall"] = result["recall"]
+        metrics[f"similarity.{size}.report_s"] = result["report_s"]
+    return metrics
+
+
+# --- diff ---
+def bench_diff() -> Metrics:
+    """bench_diff.py と同じ2万文字のプロンプトで、差分表示の計算時間を計測します。"""
+    import bench_diff
+
+    result = bench_diff.measure(20000)
+    return {
+        f"diff.{name}_ms": result[f"{name}_ms"]
+        for name in ("base", "edited", "keystroke", "keystroke_max", "rewrite")
+    }
+
+
+# --- templates ---
+def bench_templates(sizes: List[int]) -> Metrics:
+    """bench_templates.py と同じテンプレートと変数の組で、一括展開を計測します。"""
+    import bench_templates
+
+    metrics: Metrics = {}
+    for size in sizes:
+        result = bench_templates.measure(size)
+        metrics[f"templates.{size}.stream_per_s"] = result["stream_per_s"]
+        metrics[f"templates.{size}.stream_peak_mib"] = result["stream_peak_mib"]
+        metrics[f"templates.{size}.render_per_s"] = result["render_per_s"]
+    return metrics
+
+
+# --- text ---
+def bench_text(sizes: List[int]) -> Metrics:
+    """bench_textbuffer.py と同じ方法で、入れ替えと1行変換を計測します。ディスプレイがなければ空の結果を返します。"""
+    import tkinter
+
+    import customtkinter as ctk
+
+    from bench_textbuffer import measure
+
+    try:
+        app = ctk.CTk()
+    except tkinter.TclError as e:
+        print(f"  text: スキップしました（{str(e).splitlines()[0]}）", file=sys.stderr)
+        return {}
+    metrics: Metrics = {}
+    try:
+        app.geometry(Constants.UI.DEFAULT_GEOMETRY)
+        app.update()
+        for kib in sizes:
+            result = measure(app, kib)
+            for name in ("swap", "oneline_on", "oneline_off"):
+                metrics[f"text.{kib}kib.{name}_ms"] = result[f"{name}.total_ms"]
+                metrics[f"text.{kib}kib.{name}_max_block_ms"] = result[f"{name}.max_block_ms"]
+    finally:
+        app.destroy()
+    return metrics
+
+
+# --- dialog ---
+def bench_dialog(sizes: List[int]) -> Metrics:
+    """SavedPromptsDialog の表示時間を計測します。ディスプレイがなければ空の結果を返します。"""
+    import tkinter
+
+    from bench_dialog import BenchApp, measure_open
+
+    try:
+        app = BenchApp()
+    except tkinter.TclError as e:
+        print(f"  dialog: スキップしました（{str(e).splitlines()[0]}）", file=sys.stderr)
+        return {}
+    metrics: Metrics = {}
+    try:
+        app.update()
+        for size in sizes:
+            open_ms, peak_mib, toggle_ms = measure_open(app, size)
+            metrics[f"dialog.{size}.open_ms"] = open_ms
+            metrics[f"dialog.{size}.peak_mib"] = peak_mib
+            metrics[f"dialog.{size}.toggle_ms"] = toggle_ms
+    finally:
+        app.destroy()
+    return metrics
+
+
+# --- 保存と比較 ---
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(metrics: Metrics, args: argparse.Namespace) -> Path:
+    revision = git_revision()
+    payload = {
+        "revision": revision,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {"suites": args.suites, "sizes": args.sizes, "calls": args.calls},
+        "metrics": metrics,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{revision}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    return output
+
+
+def compare(metrics: Metrics, baseline_path: Path, threshold: float) -> List[str]:
+    """以前の結果と比較して変化を表示し、`threshold` を超えて悪化した項目名を返します。"""
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    print(f"compare with {baseline_path.name} (revision {baseline.get('revision', '?')})")
+    regressions = []
+    for name, value in metrics.items():
+        before = baseline.get("metrics", {}).get(name)
+        if not before:
+            continue
+        change = value / before - 1
+        worse = -change if higher_is_better(name) else change
+        mark = ""
+        if worse > threshold:
+            mark = "  << regression"
+            regressions.append(name)
+        elif worse < -threshold:
+            mark = "  improved"
+        print(f"  {name:<44} {before:12.2f} -> {value:12.2f}  {change:+7.1%}{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク一式を実行し、結果を保存・比較します。")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="ストレージの件数")
+    parser.add_argument("--dialog-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--calls", type=int, default=200, help="API呼び出しの回数")
+    parser.add_argument("--concurrency", type=int, default=Constants.Requests.MAX_WORKERS)
+    parser.add_argument("--ops", type=int, default=200, help="ストレージの操作回数")
+    parser.add_argument("--quick", action="store_true", help="件数と回数を減らして短時間で実行する")
+    parser.add_argument("--output", help="結果の保存先（既定: benchmarks/results/日時-リビジョン.json）")
+    parser.add_argument("--compare", help="比較する以前の結果ファイル")
+    parser.add_argument("--threshold", type=float, default=0.2, help="悪化とみなす変化の割合")
+    parser.add_argument("--fail-on-regression", action="store_true", help="悪化した項目があれば終了コード1で終了する")
+    args = parser.parse_args()
+    if args.quick:
+        args.sizes = [size for size in args.sizes if size <= 10000]
+        args.dialog_sizes = [size for size in args.dialog_sizes if size <= 1000]
+        args.calls = min(args.calls, 50)
+        args.ops = min(args.ops, 50)
+
+    runners: Dict[str, Callable[[], Metrics]] = {
+        "api": lambda: bench_api(args.calls, args.concurrency),
+        "ui": lambda: bench_ui(min(args.calls, 50)),
+        "storage": lambda: bench_storage(args.sizes, args.ops),
+        "revisions": lambda: bench_revisions(10 if args.quick else 30),
+        "similarity": lambda: bench_similarity(args.sizes),
+        "diff": bench_diff,
+        "templates": lambda: bench_templates(args.sizes),
+        "text": lambda: bench_text([10, 100] if args.quick else [10, 100, 1000]),
+        "dialog": lambda: bench_dialog(args.dialog_sizes),
+    }
+    metrics: Metrics = {}
+    for suite in args.suites:
+        start = time.perf_counter()
+        results = runners[suite]()
+        print(f"{suite} ({time.perf_counter() - start:.1f} s)")
+        for name, value in results.items():
+            print(f"  {name:<44} {value:12.2f}")
+        metrics.update(results)
+    print(f"saved to {save_results(metrics, args)}")
+    if args.compare:
+        regressions = compare(metrics, Path(args.compare), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} 項目が {args.threshold:.0%} を超えて悪化しました。")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
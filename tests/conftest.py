@@ -0,0 +1,8 @@
+# Prompt Master: テストの共通設定。アプリのモジュールはPromptMasterディレクトリから直接読み込む。
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "PromptMaster"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
@@ -0,0 +1,98 @@
+# Prompt Master: 疑似モデル (FakeGenerativeModel) を使ったストリーミングと中止のテスト
+
+import logging
+import threading
+
+from api_service import ApiService, FakeGenerativeModel, ResponseCache
+from metrics import MetricsStore
+
+MODEL = "gemini-test"
+SYSTEM_PROMPT = "あなたはプロンプトを強化するアシスタントです。"
+USER_PROMPT = "犬の散歩のコツを教えてください。" * 10
+
+
+def make_service(tmp_path=None) -> ApiService:
+    cache = ResponseCache(tmp_path / "responses.sqlite3") if tmp_path is not None else None
+    return ApiService(
+        model_factory=lambda model_name, system_prompt: FakeGenerativeModel(model_name, system_prompt, chunk_delay=0),
+        response_cache=cache,
+    )
+
+
+def expected_text() -> str:
+    return FakeGenerativeModel(MODEL)._compose([USER_PROMPT]).strip()
+
+
+def test_stream_returns_all_chunks_and_result(tmp_path):
+    service = make_service(tmp_path)
+    results = []
+    chunks = list(service.improve_prompt_stream("key", MODEL, SYSTEM_PROMPT, USER_PROMPT, on_result=results.append))
+    assert len(chunks) > 1
+    assert "".join(chunks).strip() == expected_text()
+    assert results[0].text == expected_text()
+    # 最後まで受信した結果はキャッシュされ、次は1チャンクで返る
+    assert list(service.improve_prompt_stream("key", MODEL, SYSTEM_PROMPT, USER_PROMPT)) == [expected_text()]
+    service.close()
+
+
+def test_stream_stops_when_cancelled(tmp_path):
+    service = make_service(tmp_path)
+    cancel_event = threading.Event()
+    results = []
+    chunks = []
+    for chunk in service.improve_prompt_stream(
+        "key", MODEL, SYSTEM_PROMPT, USER_PROMPT, cancel_event=cancel_event, on_result=results.append
+    ):
+        chunks.append(chunk)
+        if len(chunks) == 2:
+            cancel_event.set()
+    assert len(chunks) == 2
+    assert results == []
+    # 途中で打ち切った結果はキャッシュしない
+    assert service.cached_response(MODEL, SYSTEM_PROMPT, USER_PROMPT) is None
+    service.close()
+
+
+def test_closing_stream_discards_partial_result(tmp_path):
+    service = make_service(tmp_path)
+    results = []
+    stream = service.improve_prompt_stream("key", MODEL, SYSTEM_PROMPT, USER_PROMPT, on_result=results.append)
+    next(stream)
+    stream.close()
+    assert results == []
+    assert service.cached_response(MODEL, SYSTEM_PROMPT, USER_PROMPT) is None
+    service.close()
+
+
+def test_stream_cancelled_from_another_thread():
+    service = ApiService(
+        model_factory=lambda model_name, system_prompt: FakeGenerativeModel(model_name, system_prompt, chunk_delay=0.01)
+    )
+    cancel_event = threading.Event()
+    chunks = []
+
+    def consume():
+        for chunk in service.improve_prompt_stream("key", MODEL, SYSTEM_PROMPT, USER_PROMPT, cancel_event=cancel_event):
+            chunks.append(chunk)
+
+    worker = threading.Thread(target=consume)
+    worker.start()
+    while not chunks and worker.is_alive():
+        worker.join(0.005)
+    cancel_event.set()
+    worker.join(5)
+    assert not worker.is_alive()
+    assert "".join(chunks).strip() != expected_text()
+
+
+def test_metrics_failure_is_logged_without_failing_request(tmp_path, caplog):
+    metrics = MetricsStore(tmp_path / "metrics.sqlite3")
+    service = ApiService(
+        model_factory=lambda model_name, system_prompt: FakeGenerativeModel(model_name, system_prompt, chunk_delay=0),
+        metrics=metrics,
+    )
+    metrics.close()
+    with caplog.at_level(logging.WARNING, logger="api_service"):
+        assert service.improve_prompt("key", MODEL, SYSTEM_PROMPT, USER_PROMPT) == expected_text()
+    assert "計測値の記録に失敗しました" in caplog.text
+    service.close()
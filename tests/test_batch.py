@@ -0,0 +1,145 @@
+# Prompt Master: 一括強化 (batch) のテスト
+
+import time
+
+import pytest
+
+import batch
+from batch import BatchImprover, BatchItem
+
+
+class FakeApiService:
+    """`failing` に含まれるベースプロンプトだけ失敗させ、呼び出された入力を記録します。"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    def improve_prompt(self, api_key, model_name, system_prompt, user_prompt, force_refresh=False, timeout=None, attempt=1):
+        self.calls.append(user_prompt)
+        if user_prompt in self.failing:
+            raise ConnectionError("接続できません")
+        return f"強化: {user_prompt}"
+
+
+class SlowApiService(FakeApiService):
+    """応答に `delay` 秒かかるAPIです。"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def improve_prompt(self, *args, **kwargs):
+        time.sleep(self.delay)
+        return super().improve_prompt(*args, **kwargs)
+
+
+class ApiError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FlakyApiService(FakeApiService):
+    """最初の `failures` 回だけ `code` のエラーで失敗するAPIです。受け取ったタイムアウトと試行回数を記録します。"""
+
+    def __init__(self, failures, code):
+        super().__init__()
+        self.failures = failures
+        self.code = code
+        self.requests = []
+
+    def improve_prompt(self, *args, timeout=None, attempt=1, **kwargs):
+        self.requests.append((timeout, attempt))
+        if len(self.requests) <= self.failures:
+            raise ApiError(self.code)
+        return super().improve_prompt(*args, **kwargs)
+
+
+def make_improver(api_service, state_path, results, **kwargs):
+    kwargs.setdefault("max_retries", 0)
+    return BatchImprover(
+        api_service, "key", "model", "system", lambda item, text: results.append(text), state_path=state_path,
+        **kwargs,
+    )
+
+
+def test_resume_skips_completed_items(tmp_path):
+    state_path = tmp_path / "batch_state.jsonl"
+    items = [BatchItem(f"A{i}") for i in range(3)]
+    report = make_improver(FakeApiService(failing={"A1"}), state_path, []).run(items)
+    assert (report.succeeded, len(report.failures)) == (2, 1)
+
+    api_service = FakeApiService()
+    report = make_improver(api_service, state_path, []).run(items)
+    assert (report.succeeded, report.skipped) == (1, 2)
+    assert api_service.calls == ["A1"]
+    assert not state_path.exists()
+
+
+def test_successful_batch_keeps_progress_of_another_interrupted_batch(tmp_path):
+    state_path = tmp_path / "batch_state.jsonl"
+    interrupted = [BatchItem(f"A{i}") for i in range(3)]
+    make_improver(FakeApiService(failing={"A2"}), state_path, []).run(interrupted)
+
+    # 別の入力の一括強化が全件成功しても、中断した入力の記録は残る
+    report = make_improver(FakeApiService(), state_path, []).run([BatchItem("B0"), BatchItem("B1")])
+    assert report.succeeded == 2
+    assert state_path.exists()
+
+    api_service = FakeApiService()
+    report = make_improver(api_service, state_path, []).run(interrupted)
+    assert report.skipped == 2
+    assert api_service.calls == ["A2"]
+    assert not state_path.exists()
+
+
+def test_interrupt_stops_pending_items(tmp_path):
+    state_path = tmp_path / "batch_state.jsonl"
+    api_service = SlowApiService(0.05)
+    results = []
+
+    def interrupt(report):
+        raise KeyboardInterrupt
+
+    improver = BatchImprover(
+        api_service, "key", "model", "system", lambda item, text: results.append(text), state_path=state_path,
+        max_workers=2,
+    )
+    items = [BatchItem(f"A{i}") for i in range(20)]
+    started = time.perf_counter()
+    with pytest.raises(KeyboardInterrupt):
+        improver.run(items, on_progress=interrupt)
+    assert time.perf_counter() - started < 0.5
+    assert improver.cancel_event.is_set()
+    time.sleep(0.2)
+    # 実行中だった呼び出しを除き、残りの項目はAPIを呼び出さない
+    assert len(api_service.calls) <= 2 * improver.max_workers
+    # 保存済みの1件は記録され、再開時にスキップされる
+    assert len(results) == 1
+    report = make_improver(FakeApiService(), state_path, []).run(items)
+    assert report.skipped == 1
+
+
+def test_retries_rate_limit_and_server_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "backoff_delay", lambda attempt: 0)
+    api_service = FlakyApiService(failures=2, code=429)
+    results = []
+    report = make_improver(api_service, None, results, timeout=30, max_retries=2).run([BatchItem("A0")])
+    assert report.succeeded == 1
+    assert results == ["強化: A0"]
+    assert api_service.requests == [(30, 1), (30, 2), (30, 3)]
+
+    # 再試行回数を使い切ったら失敗として記録する
+    api_service = FlakyApiService(failures=3, code=503)
+    report = make_improver(api_service, None, [], max_retries=2).run([BatchItem("A0")])
+    assert [error for _, error in report.failures] == ["HTTP 503"]
+    assert len(api_service.requests) == 3
+
+
+def test_does_not_retry_client_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "backoff_delay", lambda attempt: 0)
+    api_service = FlakyApiService(failures=1, code=400)
+    report = make_improver(api_service, None, [], max_retries=3).run([BatchItem("A0")])
+    assert [error for _, error in report.failures] == ["HTTP 400"]
+    assert len(api_service.requests) == 1
@@ -0,0 +1,49 @@
+# Prompt Master: モデルの比較 (comparison) のテスト
+
+import threading
+import time
+
+from comparison import ModelComparison
+from scheduler import JobStatus, RequestScheduler
+
+
+class GatedApiService:
+    """"fast" はすぐに、それ以外のモデルは `release` が設定されるまで待ってから応答します。"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def improve_prompt_detailed(self, api_key, model_name, system_prompt, user_prompt, **kwargs):
+        if model_name != "fast":
+            self.release.wait(5)
+        return f"{model_name}: {user_prompt}"
+
+
+class SlowSubmitScheduler(RequestScheduler):
+    """2件目以降のジョブを、直前のジョブが完了してから投入します（キャッシュから即座に返る場合の再現）。"""
+
+    def submit(self, *args, **kwargs):
+        previous = self.jobs()
+        if previous:
+            job = previous[-1]
+            for _ in range(500):
+                if job.finished:
+                    break
+                time.sleep(0.01)
+        return super().submit(*args, **kwargs)
+
+
+def test_comparison_waits_for_jobs_submitted_after_an_instant_result():
+    scheduler = SlowSubmitScheduler(max_workers=2, timeout=None)
+    api_service = GatedApiService()
+    comparison = ModelComparison(scheduler, api_service)
+    try:
+        comparison.start("key", ["fast", "slow"], "system", "prompt")
+        assert comparison.jobs["fast"].finished
+        assert not comparison.wait(0.2)
+        api_service.release.set()
+        assert comparison.wait(5)
+        assert [job.status for job in comparison.jobs.values()] == [JobStatus.DONE, JobStatus.DONE]
+    finally:
+        api_service.release.set()
+        scheduler.shutdown()
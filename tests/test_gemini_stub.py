@@ -0,0 +1,83 @@
+# Prompt Master: ローカルのスタブサーバー (benchmarks/gemini_stub.py) のテスト
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from gemini_stub import GeminiStubServer
+
+
+@pytest.fixture
+def server():
+    server = GeminiStubServer().start()
+    yield server
+    server.stop()
+
+
+def post(server: GeminiStubServer, path: str, body: dict):
+    request = urllib.request.Request(
+        server.endpoint + path, data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.read().decode("utf-8")
+
+
+def chat_body(stream: bool = False) -> dict:
+    return {
+        "model": "stub-model",
+        "stream": stream,
+        "messages": [{"role": "system", "content": "system"}, {"role": "user", "content": "こんにちは"}],
+    }
+
+
+def test_generate_content_returns_usage(server):
+    body = {"contents": [{"role": "user", "parts": [{"text": "こんにちは"}]}]}
+    payload = json.loads(post(server, "/v1beta/models/stub-model:generateContent", body))
+    assert "こんにちは" in payload["candidates"][0]["content"]["parts"][0]["text"]
+    assert payload["usageMetadata"]["candidatesTokenCount"] > 0
+
+
+def test_chat_completions(server):
+    payload = json.loads(post(server, "/v1/chat/completions", chat_body()))
+    assert payload["object"] == "chat.completion"
+    assert "こんにちは" in payload["choices"][0]["message"]["content"]
+    assert payload["usage"]["total_tokens"] == payload["usage"]["prompt_tokens"] + payload["usage"]["completion_tokens"]
+
+
+def test_chat_completions_stream_sends_server_sent_events(server):
+    body = dict(chat_body(stream=True), stream_options={"include_usage": True})
+    events = [line[len("data: "):] for line in post(server, "/v1/chat/completions", body).splitlines() if line]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    text = "".join(c["choices"][0]["delta"].get("content", "") for c in chunks if c["choices"])
+    full = json.loads(post(server, "/v1/chat/completions", chat_body()))["choices"][0]["message"]["content"]
+    assert text == full
+    assert chunks[-1]["usage"]["completion_tokens"] > 0
+
+
+def test_injected_failures_are_returned_in_order(server):
+    server.fail_with([429, 503])
+    codes = []
+    for _ in range(3):
+        try:
+            post(server, "/v1/chat/completions", chat_body())
+            codes.append(200)
+        except urllib.error.HTTPError as e:
+            assert json.loads(e.read())["error"]["code"] == e.code
+            codes.append(e.code)
+    assert codes == [429, 503, 200]
+
+
+def test_error_rate_is_reproducible_with_seed():
+    def statuses(seed: int):
+        server = GeminiStubServer(error_rate=0.5, error_statuses=(500, 503), seed=seed)
+        try:
+            return [server.next_failure() for _ in range(50)]
+        finally:
+            server.server_close()
+
+    first = statuses(1)
+    assert first == statuses(1)
+    assert {500, 503, None} == set(first)
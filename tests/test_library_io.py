@@ -0,0 +1,91 @@
+# Prompt Master: ライブラリのエクスポートとインポート (library_io) のテスト
+
+import gzip
+
+import pytest
+
+from library_io import FORMAT_JSON, FORMAT_JSONL, detect_format, export_library, import_library
+from storage import JournalBackend, PromptStorageManager, SqlitePromptStorageManager
+
+FIELDS = ("id", "timestamp", "title", "original", "improved", "favorite", "content_hash")
+
+
+def open_journal(directory):
+    directory.mkdir(exist_ok=True)
+    path = directory / "saved_prompts.json"
+    return PromptStorageManager(directory, backend=JournalBackend(path, directory / "saved_prompts.journal"))
+
+
+def snapshot(manager):
+    return sorted(tuple(prompt[field] for field in FIELDS) for prompt in manager.iter_prompts())
+
+
+@pytest.mark.parametrize(
+    "name, fmt",
+    [
+        ("library.jsonl", FORMAT_JSONL),
+        ("library.jsonl.gz", FORMAT_JSONL),
+        ("LIBRARY.JSON.GZ", FORMAT_JSON),
+        ("saved_prompts.json", FORMAT_JSON),
+        ("library.txt.zst", FORMAT_JSONL),
+    ],
+)
+def test_detect_format(name, fmt):
+    assert detect_format(name) == fmt
+
+
+@pytest.mark.parametrize("name", ["library.jsonl.gz", "library.json"])
+def test_round_trip_keeps_every_field(tmp_path, name):
+    source = SqlitePromptStorageManager(
+        tmp_path, db_path=tmp_path / "prompts.sqlite3", legacy_path=tmp_path / "saved_prompts.json"
+    )
+    for i in range(30):
+        source.add_prompt(f"元 {i}", f"強化後 {i}\n2行目")
+    source.toggle_favorite(source.find_by_content("強化後 3\n2行目")["id"])
+    path = str(tmp_path / name)
+    assert export_library(source, path) == 30
+    if name.endswith(".gz"):
+        with open(path, "rb") as f:
+            assert f.read(2) == b"\x1f\x8b"
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            assert sum(1 for _ in f) == 30
+
+    target = open_journal(tmp_path / "target")
+    report = import_library(target, path)
+    assert (report.added, report.merged, report.skipped, report.invalid) == (30, 0, 0, 0)
+    assert snapshot(target) == snapshot(source)
+    # 同じファイルをもう一度取り込んでも重複しない
+    report = import_library(target, path)
+    assert (report.added, report.skipped) == (0, 30)
+    source.close()
+    target.close()
+
+
+def test_import_counts_malformed_lines(tmp_path):
+    path = tmp_path / "library.jsonl.gz"
+    lines = [
+        '{"original": "元", "improved": "有効な1件目"}',
+        "{壊れた行",
+        "",
+        '{"original": "強化後がない"}',
+        '"文字列だけ"',
+        '{"improved": "有効な2件目", "favorite": true}',
+    ]
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+    manager = open_journal(tmp_path / "target")
+    report = import_library(manager, str(path))
+    # 空行は数えず、解釈できない行と強化後のプロンプトを持たないレコードを不正な形式として数える
+    assert (report.added, report.invalid) == (2, 3)
+    assert manager.find_by_content("有効な2件目")["favorite"]
+    manager.close()
+
+
+def test_import_rejects_non_library_json(tmp_path):
+    path = tmp_path / "other.json"
+    path.write_text('{"prompts": []}', encoding="utf-8")
+    manager = open_journal(tmp_path / "target")
+    with pytest.raises(ValueError):
+        import_library(manager, str(path))
+    manager.close()
@@ -0,0 +1,40 @@
+# Prompt Master: API呼び出しの計測値 (metrics) のテスト
+
+from metrics import CallStatus, MetricsStore
+
+
+class FakeConfigManager:
+    def __init__(self, metrics_settings):
+        self.config = {"metrics_settings": metrics_settings}
+
+
+def record_calls(store: MetricsStore, count: int):
+    for i in range(count):
+        store.record("model", CallStatus.OK, latency_ms=float(i))
+
+
+def test_opening_a_store_does_not_delete_records(tmp_path):
+    db_path = tmp_path / "metrics.sqlite3"
+    store = MetricsStore(db_path, max_records=100)
+    record_calls(store, 5)
+    store.close()
+
+    # 上限の小さい設定で開いても、集計するだけなら記録は残る
+    store = MetricsStore(db_path, max_records=2)
+    assert store.count() == 5
+    assert store.model_stats()[0].calls == 5
+
+    # 最初の記録で上限を超えた古い記録が削除される
+    record_calls(store, 1)
+    assert store.count() == 2
+    store.close()
+
+
+def test_from_config_uses_metrics_settings(tmp_path):
+    assert MetricsStore.from_config(FakeConfigManager({"enabled": False}), tmp_path / "metrics.sqlite3") is None
+
+    store = MetricsStore.from_config(
+        FakeConfigManager({"retention_days": 7, "max_records": 3}), tmp_path / "metrics.sqlite3"
+    )
+    assert (store.retention_days, store.max_records) == (7, 3)
+    store.close()
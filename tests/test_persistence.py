@@ -0,0 +1,124 @@
+# Prompt Master: ファイルへの安全な書き込み (persistence) のテスト
+
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+import pytest
+
+from persistence import WriteBehindQueue, atomic_open, atomic_write_text
+
+PROMPTMASTER_DIR = Path(__file__).resolve().parent.parent / "PromptMaster"
+
+
+def run_child(code: str) -> subprocess.CompletedProcess:
+    """PromptMasterのモジュールを読み込める子プロセスでコードを実行します。"""
+    script = f"import sys\nsys.path.insert(0, {str(PROMPTMASTER_DIR)!r})\n" + textwrap.dedent(code)
+    return subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=30)
+
+
+def test_atomic_open_keeps_original_on_exception(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text("original", encoding="utf-8")
+    with pytest.raises(RuntimeError):
+        with atomic_open(path) as f:
+            f.write("partial")
+            raise RuntimeError("書き込み中の失敗")
+    assert path.read_text(encoding="utf-8") == "original"
+    # 一時ファイルは削除される
+    assert [p.name for p in tmp_path.iterdir()] == ["config.json"]
+
+
+def test_atomic_write_text_replaces_content(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text("original", encoding="utf-8")
+    atomic_write_text(path, "updated")
+    assert path.read_text(encoding="utf-8") == "updated"
+
+
+def test_process_exit_during_queued_write_keeps_original(tmp_path):
+    path = tmp_path / "saved_prompts.json"
+    path.write_text("original", encoding="utf-8")
+    result = run_child(
+        f"""
+        import os
+        from pathlib import Path
+        from persistence import WriteBehindQueue, atomic_open
+
+        path = Path({str(path)!r})
+
+        def write():
+            with atomic_open(path) as f:
+                f.write("partial")
+                f.flush()
+                os._exit(3)
+
+        queue = WriteBehindQueue(delay=60, max_delay=60)
+        queue.schedule(path, write)
+        queue.flush()
+        """
+    )
+    assert result.returncode == 3, result.stderr
+    assert path.read_text(encoding="utf-8") == "original"
+
+
+def test_pending_writes_are_flushed_at_exit(tmp_path):
+    path = tmp_path / "config.json"
+    result = run_child(
+        f"""
+        from pathlib import Path
+        from persistence import WriteBehindQueue, atomic_write_text
+
+        path = Path({str(path)!r})
+        queue = WriteBehindQueue(delay=60, max_delay=60)
+        queue.schedule(path, lambda: atomic_write_text(path, "flushed at exit"))
+        """
+    )
+    assert result.returncode == 0, result.stderr
+    assert path.read_text(encoding="utf-8") == "flushed at exit"
+
+
+def test_schedules_for_one_key_coalesce_into_one_write(tmp_path):
+    path = tmp_path / "config.json"
+    queue = WriteBehindQueue(delay=60, max_delay=60)
+    try:
+        for i in range(100):
+            queue.schedule(path, lambda i=i: atomic_write_text(path, str(i)))
+        assert queue.pending_count() == 1
+        queue.flush()
+        assert queue.writes_executed == 1
+        assert path.read_text(encoding="utf-8") == "99"
+    finally:
+        queue.close()
+
+
+def test_background_write_runs_after_delay(tmp_path):
+    path = tmp_path / "config.json"
+    queue = WriteBehindQueue(delay=0.05, max_delay=1)
+    try:
+        queue.schedule(path, lambda: atomic_write_text(path, "written"))
+        deadline = time.monotonic() + 5
+        while queue.writes_executed == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert path.read_text(encoding="utf-8") == "written"
+        assert queue.pending_count() == 0
+    finally:
+        queue.close()
+
+
+def test_failed_write_is_reported_and_later_writes_continue(tmp_path):
+    errors = []
+    path = tmp_path / "config.json"
+    queue = WriteBehindQueue(delay=60, max_delay=60, on_error=errors.append)
+
+    def fail():
+        raise OSError("ディスクがいっぱいです")
+
+    queue.schedule("broken", fail)
+    queue.schedule(path, lambda: atomic_write_text(path, "written"))
+    queue.close()
+    assert [str(e) for e in errors] == ["ディスクがいっぱいです"]
+    assert queue.last_error is errors[0]
+    assert path.read_text(encoding="utf-8") == "written"
@@ -0,0 +1,74 @@
+# Prompt Master: 版の履歴 (revisions) のテスト
+
+import random
+
+import pytest
+
+from revisions import RevisionStore, apply_delta, encode_delta
+
+
+def make_text(seed: int, lines: int = 40) -> str:
+    rng = random.Random(seed)
+    return "".join(f"{i}行目: {'あいうえおかきくけこ'[rng.randrange(10)] * rng.randrange(1, 20)}\n" for i in range(lines))
+
+
+def edit(text: str, seed: int) -> str:
+    """行の書き換え・挿入・削除を少しずつ加えたテキストを返します。"""
+    rng = random.Random(seed)
+    lines = text.splitlines(keepends=True)
+    for _ in range(3):
+        i = rng.randrange(len(lines) + 1)
+        action = rng.choice(("replace", "insert", "delete"))
+        if action == "insert" or not lines:
+            lines.insert(i, f"追加 {seed}-{i}\n")
+        elif i < len(lines):
+            if action == "replace":
+                lines[i] = f"書き換え {seed}-{i}\n"
+            else:
+                del lines[i]
+    return "".join(lines)
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [
+        (("", ""), ("新しい本文", "強化後\n")),
+        (("本文\n", "強化後\n"), ("", "")),
+        (("1\n2\n3", "a\r\nb\r\n"), ("1\n2\n3\n4", "a\r\nx\r\nb\r\n")),
+        (("末尾に改行なし", "同じ"), ("末尾に改行なし。追記", "同じ")),
+        ((make_text(1), make_text(2)), (edit(make_text(1), 3), edit(make_text(2), 4))),
+    ],
+)
+def test_delta_round_trip(old, new):
+    assert apply_delta(old, encode_delta(old, new)) == new
+
+
+def test_delta_chain_round_trip():
+    fields = (make_text(10), make_text(11))
+    for seed in range(30):
+        new = (edit(fields[0], seed), edit(fields[1], seed + 100))
+        assert apply_delta(fields, encode_delta(fields, new)) == new
+        fields = new
+
+
+def test_prune_replaces_oldest_kept_delta_with_snapshot(tmp_path):
+    db_path = tmp_path / "revisions.sqlite3"
+    store = RevisionStore(db_path, max_revisions=3, snapshot_interval=10)
+    versions = [(make_text(20), make_text(21))]
+    for seed in range(5):
+        versions.append((edit(versions[-1][0], seed), edit(versions[-1][1], seed + 50)))
+    for original, improved in versions:
+        store.record("p1", original, improved)
+    store.close()
+
+    # 新しく開いたストアで、保存されている内容だけから復元する
+    store = RevisionStore(db_path, max_revisions=3, snapshot_interval=10)
+    infos = {info.number: info for info in store.list_revisions("p1")}
+    assert sorted(infos) == [4, 5, 6]
+    # 残る最古の版は、削除した版に依存しないようスナップショットになる
+    assert infos[4].snapshot
+    assert not infos[5].snapshot and not infos[6].snapshot
+    for number in (4, 5, 6):
+        assert store.get("p1", number).fields == versions[number - 1]
+    assert store.get("p1", 3) is None
+    store.close()
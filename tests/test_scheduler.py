@@ -0,0 +1,147 @@
+# Prompt Master: ローカルのスタブサーバー (benchmarks/gemini_stub.py) を使ったスケジューラのテスト
+
+import threading
+
+import pytest
+
+from api_service import ApiService
+from gemini_stub import GeminiStubServer
+from scheduler import Job, JobStatus, RequestScheduler
+
+MODEL = "gemini-test"
+SYSTEM_PROMPT = "あなたはプロンプトを強化するアシスタントです。"
+
+
+@pytest.fixture
+def server():
+    server = GeminiStubServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def service(server):
+    service = ApiService(transport="rest", api_endpoint=server.endpoint)
+    yield service
+    service.close()
+
+
+def make_scheduler(**kwargs) -> RequestScheduler:
+    options = {"max_workers": 2, "timeout": 5, "max_retries": 3, "backoff_base": 0.01, "backoff_max": 0.05}
+    options.update(kwargs)
+    return RequestScheduler(**options)
+
+
+def run_job(scheduler: RequestScheduler, fn) -> Job:
+    done = threading.Event()
+    job = scheduler.submit("test", fn, on_done=lambda job: done.set())
+    assert done.wait(10)
+    return job
+
+
+def improve(service: ApiService, user_prompt: str = "テスト"):
+    return lambda job: service.improve_prompt("stub-key", MODEL, SYSTEM_PROMPT, user_prompt, timeout=job.remaining())
+
+
+@pytest.mark.parametrize("statuses", [[429], [500], [503, 504]])
+def test_retries_rate_limit_and_server_errors(server, service, statuses):
+    scheduler = make_scheduler()
+    try:
+        server.fail_with(statuses)
+        job = run_job(scheduler, improve(service))
+        assert job.status == JobStatus.DONE
+        assert job.attempts == len(statuses) + 1
+        assert "テスト" in job.result
+    finally:
+        scheduler.shutdown()
+
+
+def test_does_not_retry_client_errors(server, service):
+    scheduler = make_scheduler()
+    try:
+        server.fail_with([400])
+        job = run_job(scheduler, improve(service))
+        assert job.status == JobStatus.FAILED
+        assert job.attempts == 1
+        assert getattr(job.error, "code", None) == 400
+    finally:
+        scheduler.shutdown()
+
+
+def test_gives_up_after_max_retries(server, service):
+    scheduler = make_scheduler(max_retries=2)
+    try:
+        server.fail_with([503, 503, 503, 503])
+        job = run_job(scheduler, improve(service))
+        assert job.status == JobStatus.FAILED
+        assert job.attempts == 3
+        assert server.requests == 3
+    finally:
+        scheduler.shutdown()
+
+
+def test_backoff_grows_and_is_capped():
+    scheduler = make_scheduler(backoff_base=1.0, backoff_max=4.0)
+    try:
+        for attempt, upper in ((1, 1.0), (2, 2.0), (3, 4.0), (10, 4.0)):
+            delay = scheduler.backoff_delay(attempt)
+            assert upper / 2 <= delay <= upper
+    finally:
+        scheduler.shutdown()
+
+
+def test_times_out_slow_responses(server, service):
+    server.latency = 2.0
+    scheduler = make_scheduler(timeout=0.2, max_retries=0)
+    try:
+        job = run_job(scheduler, improve(service))
+        assert job.status == JobStatus.TIMED_OUT
+        assert job.elapsed() < 1.5
+        assert job.cancel_event.is_set()
+    finally:
+        scheduler.shutdown()
+
+
+def test_cancel_stops_a_running_stream(server, service):
+    server.chunk_delay = 0.05
+    scheduler = make_scheduler()
+    chunks = []
+    first_chunk = threading.Event()
+
+    def stream(job: Job):
+        for chunk in service.improve_prompt_stream(
+            "stub-key", MODEL, SYSTEM_PROMPT, "ストリーミングのテスト " * 20, job.cancel_event, force_refresh=True
+        ):
+            chunks.append(chunk)
+            first_chunk.set()
+        return "".join(chunks)
+
+    try:
+        done = threading.Event()
+        job = scheduler.submit("stream", stream, on_done=lambda job: done.set())
+        assert first_chunk.wait(10)
+        assert scheduler.cancel(job)
+        assert done.wait(1)
+        assert job.status == JobStatus.CANCELLED
+        assert job.result is None
+        assert job.cancel_event.is_set()
+    finally:
+        scheduler.shutdown()
+
+
+def test_cancel_pending_job_never_runs():
+    scheduler = make_scheduler(max_workers=1)
+    release = threading.Event()
+    started = []
+    try:
+        blocker = scheduler.submit("blocker", lambda job: release.wait(5))
+        pending = scheduler.submit("pending", lambda job: started.append(job))
+        assert scheduler.cancel(pending)
+        release.set()
+        assert run_job(scheduler, lambda job: "after").result == "after"
+        assert blocker.status == JobStatus.DONE
+        assert pending.status == JobStatus.CANCELLED
+        assert started == []
+    finally:
+        release.set()
+        scheduler.shutdown()
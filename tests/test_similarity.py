@@ -0,0 +1,107 @@
+# Prompt Master: 類似検索の索引 (similarity) のテスト
+
+import random
+import threading
+
+import pytest
+
+from constants import Constants
+from similarity import SimilarityIndex
+
+
+def make_prompt(i: int, version: int = 0):
+    rng = random.Random(i * 1000 + version)
+    words = ["記事", "要約", "翻訳", "説明", "比較", "分析", "提案", "手順", "例文", "注意"]
+    body = "、".join(rng.choice(words) + str(rng.randrange(100)) for _ in range(12))
+    return {"id": f"p{i}", "original": f"依頼 {i}-{version}", "improved": f"## 指示\n{body}"}
+
+
+def assert_consistent(index: SimilarityIndex, expected):
+    """索引の内容が `expected` (ID -> プロンプト) と一致し、バケットに古い登録が残っていないことを確かめます。"""
+    assert set(index._signatures) == set(expected)
+    for prompt_id, prompt in expected.items():
+        assert list(index._signatures[prompt_id]) == list(index.signature_of(prompt["original"], prompt["improved"]))
+    registered = []
+    for buckets in index._buckets:
+        for members in buckets.values():
+            registered.extend(members if isinstance(members, list) else [members])
+    assert sorted(registered) == sorted(list(expected) * index.bands)
+
+
+@pytest.fixture
+def small_build(monkeypatch):
+    # 見本と登録の単位を小さくし、構築の途中で変更が起きる場合を少ない件数で再現する
+    monkeypatch.setattr(Constants.Similarity, "STOP_SAMPLE", 5)
+    monkeypatch.setattr(Constants.Storage, "SEARCH_INDEX_BUILD_CHUNK", 3)
+
+
+def test_changes_during_build_win_over_built_contents(small_build):
+    index = SimilarityIndex()
+    prompts = [make_prompt(i) for i in range(20)]
+    expected = {p["id"]: p for p in prompts}
+
+    # 除外するシングルが決まる前の追加は保留され、構築後に新しい内容で登録される
+    index.add(make_prompt(2, version=1))
+    expected["p2"] = make_prompt(2, version=1)
+
+    def source():
+        for i, prompt in enumerate(prompts):
+            if i == 8:
+                # 構築済みのプロンプトの削除と、これから構築されるプロンプトの削除・更新
+                index.remove("p1")
+                index.remove("p15")
+                index.add(make_prompt(12, version=1))
+                del expected["p1"], expected["p15"]
+                expected["p12"] = make_prompt(12, version=1)
+            yield prompt
+
+    index.build(source())
+    assert index.ready and index.wait(0)
+    assert_consistent(index, expected)
+
+    # 構築後の変更はそのまま反映される
+    index.add(make_prompt(15, version=2))
+    index.remove("p3")
+    expected["p15"] = make_prompt(15, version=2)
+    del expected["p3"]
+    assert_consistent(index, expected)
+
+
+def test_concurrent_changes_during_background_build(small_build):
+    index = SimilarityIndex()
+    prompts = [make_prompt(i) for i in range(300)]
+    expected = {p["id"]: p for p in prompts}
+    halfway = threading.Event()
+
+    def source():
+        # 構築の途中で止め、変更と確実に重なるようにする
+        yield from prompts[:100]
+        halfway.wait(5)
+        yield from prompts[100:]
+
+    builder = threading.Thread(target=index.build, args=(source(),))
+    builder.start()
+    rng = random.Random(1)
+    for step in range(200):
+        if step == 100:
+            halfway.set()
+        i = rng.randrange(350)
+        if rng.random() < 0.4:
+            index.remove(f"p{i}")
+            expected.pop(f"p{i}", None)
+        else:
+            prompt = make_prompt(i, version=step + 1)
+            index.add(prompt)
+            expected[prompt["id"]] = prompt
+    builder.join()
+    assert index.ready
+    assert_consistent(index, expected)
+
+
+def test_similar_finds_near_duplicates():
+    index = SimilarityIndex()
+    base = make_prompt(1)
+    near = dict(base, id="near", improved=base["improved"] + "。")
+    index.build([base, near, make_prompt(2), make_prompt(3)])
+    assert [prompt_id for prompt_id, _ in index.similar("p1")] == ["near"]
+    assert [sorted(group) for group in index.duplicate_groups()] == [["near", "p1"]]
@@ -0,0 +1,166 @@
+# Prompt Master: プロンプトの保存 (storage) のテスト
+
+import json
+import logging
+
+import pytest
+
+from revisions import RevisionStore
+from storage import JournalBackend, PromptId, PromptStorageManager, SqlitePromptStorageManager
+
+LEGACY_PROMPTS = [
+    {"id": "2024-01-01T10:00:00", "timestamp": "2024-01-01 10:00", "title": "a", "original": "", "improved": "A"},
+    {"id": "2024-01-01T10:00:00", "timestamp": "2024-01-01 10:00", "title": "b", "original": "", "improved": "B"},
+    {"timestamp": "2024-01-01 10:01", "title": "c", "original": "", "improved": "C"},
+]
+
+
+def write_legacy(tmp_path):
+    path = tmp_path / "saved_prompts.json"
+    path.write_text(json.dumps({"saved_prompts": LEGACY_PROMPTS}), encoding="utf-8")
+    return path
+
+
+def test_journal_load_keeps_duplicate_ids(tmp_path):
+    path = write_legacy(tmp_path)
+
+    def open_manager():
+        return PromptStorageManager(tmp_path, backend=JournalBackend(path, tmp_path / "saved_prompts.journal"))
+
+    manager = open_manager()
+    manager.close()
+    # 新しいIDを割り当てた結果が書き戻され、開き直しても3件とも残る
+    manager = open_manager()
+    assert sorted(p["improved"] for p in manager.prompts) == ["A", "B", "C"]
+    assert all(PromptId.is_valid(p["id"]) for p in manager.prompts)
+    assert len({p["id"] for p in manager.prompts}) == 3
+    manager.close()
+
+
+def test_sqlite_migration_keeps_duplicate_ids(tmp_path):
+    path = write_legacy(tmp_path)
+    manager = SqlitePromptStorageManager(tmp_path, db_path=tmp_path / "prompts.sqlite3", legacy_path=path)
+    try:
+        prompts = manager.list_prompts()
+        assert sorted(p["improved"] for p in prompts) == ["A", "B", "C"]
+        assert len({p["id"] for p in prompts}) == 3
+    finally:
+        manager.close()
+
+
+def test_search_matches_terms_across_fields(tmp_path):
+    path = tmp_path / "saved_prompts.json"
+    manager = PromptStorageManager(tmp_path, backend=JournalBackend(path, tmp_path / "saved_prompts.journal"))
+    manager.add_prompt("foo について書いて", "alpha の記事を書いてください")
+    manager.add_prompt("foo alpha を比べて", "二つを比較してください")
+    manager.add_prompt("bar", "alpha だけ")
+    # 索引の構築前に使う全件走査と同じプロンプトが見つかる
+    scanned = {p["id"] for p in manager.prompts if manager._contains_terms(p, ["foo", "alpha"])}
+    assert manager.build_search_index(background=False).ready
+    indexed = [p["original"] for p in manager.search("foo alpha")]
+    assert {p["id"] for p in manager.search("foo alpha")} == scanned
+    # 全ての語を1つのフィールドに含むものが先に並ぶ
+    assert indexed == ["foo alpha を比べて", "foo について書いて"]
+    assert manager.search("foo 存在しない") == []
+    manager.close()
+
+
+def test_content_hash_index_follows_changes(tmp_path):
+    path = tmp_path / "saved_prompts.json"
+    # 旧データには同じ内容のプロンプトが複数ある場合がある
+    duplicates = [{"timestamp": "2024-01-01 10:00", "title": t, "original": "", "improved": "同じ内容"} for t in "ab"]
+    path.write_text(json.dumps({"saved_prompts": duplicates}), encoding="utf-8")
+    manager = PromptStorageManager(tmp_path, backend=JournalBackend(path, tmp_path / "saved_prompts.journal"))
+    first, second = list(manager.prompts)
+
+    assert manager.is_saved("同じ内容")
+    assert not manager.add_prompt("", "同じ内容")
+    # 同じ内容の一方を削除しても、もう一方が残っていればセーブ済みのまま
+    manager.delete_prompt(first["id"])
+    assert manager.find_by_content("同じ内容")["id"] == second["id"]
+    # 内容を更新すると、古い内容のハッシュは索引から外れる
+    manager.update_prompt(second["id"], "", "新しい内容")
+    assert not manager.is_saved("同じ内容")
+    assert manager.find_by_content("新しい内容")["id"] == second["id"]
+    assert manager.add_prompt("", "同じ内容")
+    manager.delete_prompt(second["id"])
+    assert not manager.is_saved("新しい内容")
+    manager.close()
+
+
+def open_sqlite(tmp_path) -> SqlitePromptStorageManager:
+    return SqlitePromptStorageManager(
+        tmp_path, db_path=tmp_path / "prompts.sqlite3", legacy_path=tmp_path / "saved_prompts.json"
+    )
+
+
+def test_sqlite_lists_prompts_page_by_page(tmp_path):
+    manager = open_sqlite(tmp_path)
+    for i in range(25):
+        manager.add_prompt(f"元 {i}", f"p{i:02d}")
+    favorite = manager.find_by_content("p07")
+    manager.toggle_favorite(favorite["id"])
+
+    assert [p["title"] for p in manager.list_prompts(10, 5, order="title")] == ["p10", "p11", "p12", "p13", "p14"]
+    # 既定の並び順ではお気に入りが先頭に来る
+    assert manager.list_prompts(0, 1)[0]["id"] == favorite["id"]
+    with pytest.raises(ValueError):
+        manager.list_prompts(order="unknown")
+
+    # 一覧のビューはページ単位で取得した結果を、全件の取得と同じ順に返す
+    view = manager.prompts
+    view.PAGE_SIZE = 4
+    assert len(view) == 25
+    assert [p["id"] for p in view] == [p["id"] for p in manager.list_prompts()]
+    assert view[-1]["id"] == manager.list_prompts()[-1]["id"]
+    assert [p["id"] for p in view[3:9]] == [p["id"] for p in manager.list_prompts(3, 6)]
+    # 変更するとキャッシュ済みのページは破棄される
+    manager.delete_prompt(favorite["id"])
+    assert len(view) == 24
+    assert view[0]["id"] != favorite["id"]
+    manager.close()
+
+
+def test_sqlite_full_text_search_follows_changes(tmp_path):
+    manager = open_sqlite(tmp_path)
+    if not manager._fts_enabled:
+        manager.close()
+        pytest.skip("FTS5が使えないSQLiteです")
+    manager.add_prompt("英語の記事", "記事を日本語に翻訳してください")
+    manager.add_prompt("翻訳して要約", "次の文章を要約してください")
+    manager.add_prompt("100% の確率", "割合を計算してください")
+
+    # タイトル（強化後の1行目）にも一致するものが、ベースプロンプトだけに一致するものより先に並ぶ
+    assert [p["original"] for p in manager.search("翻訳して")] == ["英語の記事", "翻訳して要約"]
+    assert [p["original"] for p in manager.search("翻訳して 要約して")] == ["翻訳して要約"]
+    assert len(manager.search("してください", limit=2)) == 2
+
+    # 更新・削除した内容は索引にも反映される
+    summary = manager.search("要約して")[0]
+    manager.update_prompt(summary["id"], "言い換え", "次の文章を言い換えてください")
+    assert manager.search("要約して") == []
+    assert [p["id"] for p in manager.search("言い換え")] == [summary["id"]]
+    manager.delete_prompt(summary["id"])
+    assert manager.search("言い換え") == []
+
+    # 2文字以下の語は部分一致で探し、% などの記号はそのままの文字として扱う
+    assert [p["original"] for p in manager.search("記事")] == ["英語の記事"]
+    assert [p["original"] for p in manager.search("0%")] == ["100% の確率"]
+    assert manager.search("_") == []
+    manager.close()
+
+
+def test_revision_failure_is_logged_without_failing_update(tmp_path, caplog):
+    revisions = RevisionStore(tmp_path / "revisions.sqlite3")
+    path = tmp_path / "saved_prompts.json"
+    manager = PromptStorageManager(
+        tmp_path, backend=JournalBackend(path, tmp_path / "saved_prompts.journal"), revisions=revisions
+    )
+    manager.add_prompt("元", "強化後")
+    prompt_id = manager.find_by_content("強化後")["id"]
+    revisions.close()
+    with caplog.at_level(logging.WARNING, logger="storage"):
+        assert manager.update_prompt(prompt_id, "元", "更新後")
+    assert manager.get_prompt_by_id(prompt_id)["improved"] == "更新後"
+    assert "版の履歴の記録に失敗しました" in caplog.text
+    manager.close()
@@ -0,0 +1,57 @@
+# Prompt Master: テンプレート (templates) のテスト
+
+import io
+
+import pytest
+
+from templates import FORMAT_CSV, FORMAT_JSONL, FORMAT_TSV, TemplateError, compile_template, read_variable_sets, render_all
+
+TEMPLATE = "Write about {{topic}} for {{audience}}"
+
+
+def test_render_and_extract_round_trip():
+    template = compile_template(TEMPLATE)
+    assert template.variables == ("topic", "audience")
+    text = template.render({"topic": "AI", "audience": "students"})
+    assert text == "Write about AI for students"
+    assert template.extract(text) == {"topic": "AI", "audience": "students"}
+    with pytest.raises(TemplateError):
+        template.render({"topic": "AI"})
+
+
+@pytest.mark.parametrize("row", ["AI", "AI,students,extra"])
+def test_csv_row_with_wrong_field_count_is_rejected(row):
+    f = io.StringIO(f"topic,audience\nAI,students\n{row}\n")
+    rows = read_variable_sets(f, FORMAT_CSV)
+    assert next(rows) == {"topic": "AI", "audience": "students"}
+    with pytest.raises(TemplateError, match="3 行目"):
+        next(rows)
+
+
+def test_csv_empty_field_is_kept():
+    rows = list(read_variable_sets(io.StringIO("topic\taudience\nAI\t\n"), FORMAT_TSV))
+    assert rows == [{"topic": "AI", "audience": ""}]
+
+
+def test_invalid_rows_are_reported_and_skipped():
+    errors = []
+    f = io.StringIO("topic,audience\nAI\nML,kids\nDL,a,b\n")
+    rows = list(read_variable_sets(f, FORMAT_CSV, lambda number, error: errors.append(number)))
+    assert rows == [{"topic": "ML", "audience": "kids"}]
+    assert errors == [2, 4]
+
+    errors.clear()
+    f = io.StringIO('{"topic": "AI", "audience": "kids"}\n[1]\n{bad\n')
+    rows = list(read_variable_sets(f, FORMAT_JSONL, lambda number, error: errors.append(number)))
+    assert rows == [{"topic": "AI", "audience": "kids"}]
+    assert errors == [2, 3]
+
+
+def test_render_all_skips_missing_variables():
+    template = compile_template(TEMPLATE)
+    skipped = []
+    rendered = list(
+        render_all(template, [{"topic": "AI", "audience": "kids"}, {"topic": "ML"}], lambda n, e: skipped.append(n))
+    )
+    assert [text for _, _, text in rendered] == ["Write about AI for kids"]
+    assert skipped == [2]
@@ -0,0 +1,147 @@
+# Prompt Master: テキストボックスへの分割書き込み (textbuffer) のテスト
+
+import itertools
+
+from textbuffer import TextBuffer
+
+
+class FakeTextbox:
+    """テキストボックスの代わりです。after の予約は `run_next()` で1件ずつ実行します。
+
+    Tkと同じく、編集不可 (disabled) の間は挿入を無視し、挿入・削除で modified フラグが立ちます。
+    """
+
+    def __init__(self):
+        self.content = ""
+        self.state = "normal"
+        self.modified = False
+        self.inserts = []
+        self.reads = 0
+        self.scheduled = {}
+        self._ids = itertools.count(1)
+
+    def configure(self, state):
+        self.state = state
+
+    def cget(self, option):
+        assert option == "state"
+        return self.state
+
+    def insert(self, index, text):
+        assert index == "end"
+        if self.state == "normal":
+            self.content += text
+            self.inserts.append(text)
+            self.modified = True
+
+    def delete(self, start, end):
+        assert (start, end) == ("1.0", "end")
+        if self.state == "normal":
+            self.content = ""
+            self.modified = True
+
+    def get(self, start, end):
+        assert (start, end) == ("1.0", "end-1c")
+        self.reads += 1
+        return self.content
+
+    def edit_modified(self, value=None):
+        if value is None:
+            return self.modified
+        self.modified = value
+
+    def after(self, ms, callback):
+        after_id = f"after#{next(self._ids)}"
+        self.scheduled[after_id] = callback
+        return after_id
+
+    def after_cancel(self, after_id):
+        self.scheduled.pop(after_id, None)
+
+    def run_next(self) -> bool:
+        if not self.scheduled:
+            return False
+        after_id = next(iter(self.scheduled))
+        self.scheduled.pop(after_id)()
+        return True
+
+
+def make_text(lines: int, width: int = 30) -> str:
+    return "".join(f"{i:04d}" + "あ" * width + "\n" for i in range(lines))
+
+
+def test_small_text_is_written_at_once():
+    textbox = FakeTextbox()
+    buffer = TextBuffer(textbox, chunk_chars=100)
+    done = []
+    buffer.set_text("短い", on_done=lambda: done.append(True))
+    assert textbox.content == "短い" and not buffer.busy
+    assert done == [True]
+
+
+def test_large_text_is_written_in_line_aligned_chunks():
+    textbox = FakeTextbox()
+    buffer = TextBuffer(textbox, chunk_chars=100)
+    text = make_text(20)
+    done = []
+    buffer.set_text(text, editable=False, on_done=lambda: done.append(True))
+    assert buffer.busy and textbox.state == "disabled"
+    # 書き込み中も、書き込みを終えた後の内容を返す
+    assert buffer.get() == text
+    while textbox.run_next():
+        assert not done or not buffer.busy
+    assert textbox.content == text
+    assert done == [True]
+    assert textbox.state == "disabled"
+    # 最後以外の区切りは改行の直後に置かれ、1回の挿入は chunk_chars を超えない
+    assert all(chunk.endswith("\n") and len(chunk) <= 100 for chunk in textbox.inserts)
+    assert len(textbox.inserts) > 1
+
+
+def test_chunks_split_long_lines_at_chunk_size():
+    textbox = FakeTextbox()
+    buffer = TextBuffer(textbox, chunk_chars=50)
+    text = "い" * 120
+    buffer.set_text(text)
+    buffer.flush()
+    assert textbox.content == text
+    assert [len(chunk) for chunk in textbox.inserts] == [50, 50, 20]
+    assert textbox.state == "normal"
+
+
+def test_append_while_writing_is_queued():
+    textbox = FakeTextbox()
+    buffer = TextBuffer(textbox, chunk_chars=100)
+    text = make_text(10)
+    buffer.set_text(text)
+    buffer.append("追記")
+    while textbox.run_next():
+        pass
+    assert textbox.content == text + "追記"
+    buffer.append("さらに追記")
+    assert textbox.content == text + "追記さらに追記"
+
+
+def test_cancel_keeps_written_part():
+    textbox = FakeTextbox()
+    buffer = TextBuffer(textbox, chunk_chars=100)
+    buffer.set_text(make_text(10))
+    textbox.run_next()
+    buffer.cancel()
+    assert not buffer.busy and not textbox.scheduled
+    assert buffer.get() == textbox.content
+    assert textbox.state == "normal"
+
+
+def test_get_reads_textbox_only_after_user_edits():
+    textbox = FakeTextbox()
+    buffer = TextBuffer(textbox, chunk_chars=100)
+    buffer.set_text("保存済み")
+    assert buffer.get() == "保存済み"
+    assert textbox.reads == 0
+    # 利用者の編集（modified フラグ）があれば読み直す
+    textbox.insert("end", "と編集")
+    assert buffer.get() == "保存済みと編集"
+    assert textbox.reads == 1
+    assert buffer.get() == "保存済みと編集"
+    assert textbox.reads == 1
@@ -0,0 +1,67 @@
+# Prompt Master: 語・文字単位の差分 (textdiff) のテスト
+
+import random
+
+from textdiff import TextDiffer, matching_blocks, myers_blocks
+
+
+def lcs_length(a, b) -> int:
+    """動的計画法で求めた最長共通部分列の長さです。"""
+    row = [0] * (len(b) + 1)
+    for x in a:
+        previous_diagonal = 0
+        for j, y in enumerate(b):
+            current = row[j + 1]
+            row[j + 1] = previous_diagonal + 1 if x == y else max(row[j + 1], row[j])
+            previous_diagonal = current
+    return row[-1]
+
+
+def assert_valid_blocks(blocks, a, b):
+    """一致ブロックが前から順に並び、重ならず、実際に一致していることを確かめます。"""
+    i = j = 0
+    for block_i, block_j, size in blocks:
+        assert size > 0
+        assert block_i >= i and block_j >= j
+        assert a[block_i:block_i + size] == b[block_j:block_j + size]
+        i, j = block_i + size, block_j + size
+
+
+def random_pairs(count: int):
+    rng = random.Random(0)
+    for _ in range(count):
+        a = "".join(rng.choice("abc") for _ in range(rng.randrange(0, 25)))
+        b = "".join(rng.choice("abc") for _ in range(rng.randrange(0, 25)))
+        yield a, b
+
+
+def test_myers_blocks_are_minimal():
+    for a, b in random_pairs(500):
+        blocks = myers_blocks(a, b)
+        assert_valid_blocks(blocks, a, b)
+        assert sum(size for _, _, size in blocks) == lcs_length(a, b), (a, b)
+
+
+def test_max_edits_stops_exactly_at_the_edit_distance():
+    for a, b in random_pairs(200):
+        edits = len(a) + len(b) - 2 * lcs_length(a, b)
+        blocks = myers_blocks(a, b, max_edits=edits)
+        assert sum(size for _, _, size in blocks) == lcs_length(a, b)
+        if edits:
+            assert myers_blocks(a, b, max_edits=edits - 1) is None
+
+
+def test_matching_blocks_falls_back_when_edits_exceed_limit():
+    a, b = "abcabba" * 3, "cbabac" * 3
+    assert myers_blocks(a, b, max_edits=2) is None
+    blocks = matching_blocks(a, b, max_edits=2)
+    assert blocks
+    assert_valid_blocks(blocks, a, b)
+
+
+def test_text_differ_marks_changed_words():
+    a = "Write a short poem.\n季節は春です。\n"
+    b = "Write a long poem.\n季節は夏です。\n"
+    diff = TextDiffer().diff(a, b)
+    assert [a[start:end] for start, end in diff.removed] == ["short", "春"]
+    assert [b[start:end] for start, end in diff.added] == ["long", "夏"]